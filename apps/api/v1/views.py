@@ -1,17 +1,20 @@
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, parser_classes
+from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from rest_framework import status, viewsets
+from django.conf import settings
 from django.contrib.auth import authenticate
-from django.contrib.auth.models import User
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from django.db.models import Q
+from django.core.exceptions import ValidationError
+from django.core.validators import URLValidator
 from apps.users.models import User as CustomUser, Agent, AgentTier
-from apps.digital.models import DigitalProduct, Transaction, APIKey, Order, Payment
+from apps.digital.models import DigitalProduct, DigitalTransaction, APIKey, Order, Payment, BulkOrder, WebhookSubscription
 from apps.wallets.models import Wallet, Transaction as WalletTransaction
-from apps.digital.serializers import DigitalProductSerializer, TransactionSerializer, OrderSerializer, PaymentSerializer, APIKeySerializer
-from apps.users.serializers import UserSerializer, UserCreateSerializer, AgentApplicationSerializer, AgentSerializer, AgentTierSerializer
+from apps.digital.serializers import DigitalProductSerializer, TransactionSerializer, APIKeySerializer
+from apps.users.serializers import UserSerializer, AgentApplicationSerializer, AgentSerializer, AgentTierSerializer
 from apps.wallets.serializers import WalletSerializer, WalletTransactionSerializer
 from apps.users.permissions import (
     IsAdmin, IsEmployee, IsAgent, IsDeveloper, IsAdminOrEmployee,
@@ -23,9 +26,15 @@ from apps.users.permissions import (
 )
 from apps.digital.permissions import IsAPIKeyValid, IsEmployeeOrAdmin
 from apps.digital.services.digital_service import DigitalService
+from apps.digital.services.idempotency_service import idempotent, keep_idempotency_key
+from apps.digital.services.bulk_order_service import BulkOrderService
+from apps.digital.services.customer_webhook_service import WEBHOOK_EVENTS
+from apps.digital.validators import validate_webhook_url
+from core.exceptions import BaseAPIException, InsufficientFundsException
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.db import transaction
 from decimal import Decimal
+import secrets
 import uuid
 
 
@@ -84,7 +93,7 @@ def register(request):
             'first_name': user.first_name,
             'last_name': user.last_name,
             'phone_number': user.phone_number,
-            'role': user.user_type,
+            'role': user.role,
             'tokens': {
                 'access': str(refresh.access_token),
                 'refresh': str(refresh)
@@ -129,7 +138,7 @@ def login(request):
                 'email': user.email,
                 'first_name': user.first_name,
                 'last_name': user.last_name,
-                'role': user.user_type
+                'role': user.role
             }
         }, status=status.HTTP_200_OK)
     else:
@@ -407,6 +416,7 @@ def list_data_bundles(request):
 # Orders endpoints
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent('orders.create')
 def create_order(request):
     """
     Create a new order.
@@ -415,6 +425,7 @@ def create_order(request):
     quantity = request.data.get('quantity', 1)
     recipient_phone = request.data.get('recipient_phone')
     payment_method = request.data.get('payment_method', 'wallet')
+    priority = request.data.get('priority', 'normal')
     
     if not all([product_id, recipient_phone]):
         return Response({
@@ -432,6 +443,14 @@ def create_order(request):
             }
         }, status=status.HTTP_400_BAD_REQUEST)
     
+    if priority not in settings.DIGITAL_PRIORITY_QUEUES:
+        return Response({
+            'error': {
+                'code': 'VALIDATION_ERROR',
+                'message': 'Invalid priority'
+            }
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
     try:
         product = DigitalProduct.objects.get(id=product_id, is_active=True)
     except DigitalProduct.DoesNotExist:
@@ -442,53 +461,83 @@ def create_order(request):
             }
         }, status=status.HTTP_404_NOT_FOUND)
     
+    # Use DigitalService to create transaction
+    digital_service = DigitalService()
+    purchase_args = {
+        'user': request.user,
+        'product_id': product_id,
+        'phone_number': recipient_phone,
+        'quantity': quantity,
+        'priority': priority
+    }
+    transaction = None
+    
     try:
-        # Use DigitalService to create transaction
-        digital_service = DigitalService()
-        transaction = digital_service.initiate_purchase(
-            user=request.user,
-            product_id=product_id,
-            phone_number=recipient_phone,
-            quantity=quantity
-        )
+        if settings.DIGITAL_ASYNC_PURCHASES:
+            # Queue the transaction and let the client poll or receive a webhook
+            transaction = digital_service.initiate_purchase(**purchase_args)
+            digital_service.dispatch_transaction(transaction)
+            response_status = status.HTTP_202_ACCEPTED
+        else:
+            # Process the transaction inline
+            transaction = digital_service.purchase(**purchase_args)
+            response_status = status.HTTP_201_CREATED
+    except Exception as e:
+        # A retry must not buy again once the transaction row exists
+        if transaction is not None or getattr(e, 'transaction', None) is not None:
+            keep_idempotency_key(request)
         
-        # Process the transaction
-        result = digital_service.process_transaction(transaction.id)
+        if isinstance(e, InsufficientFundsException):
+            return Response({
+                'error': {
+                    'code': 'INSUFFICIENT_FUNDS',
+                    'message': str(e.detail)
+                }
+            }, status=status.HTTP_402_PAYMENT_REQUIRED)
         
-        # Return order details
-        return Response({
-            'id': transaction.id,
-            'order_number': transaction.reference,
-            'product': {
-                'id': str(product.id),
-                'name': product.name
-            },
-            'quantity': quantity,
-            'unit_price': float(transaction.price),
-            'total_amount': float(transaction.amount),
-            'status': transaction.status,
-            'recipient_phone': recipient_phone,
-            'payment_method': payment_method,
-            'created_at': transaction.created_at.isoformat()
-        }, status=status.HTTP_201_CREATED)
+        if isinstance(e, BaseAPIException):
+            return Response({
+                'error': {
+                    'code': e.default_code.upper(),
+                    'message': str(e.detail)
+                }
+            }, status=e.status_code)
         
-    except Exception as e:
         return Response({
             'error': {
                 'code': 'SERVER_ERROR',
                 'message': str(e)
             }
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    # Return order details
+    return Response({
+        'id': transaction.id,
+        'order_number': transaction.reference,
+        'product': {
+            'id': str(product.id),
+            'name': product.name
+        },
+        'quantity': quantity,
+        'unit_price': float(transaction.price),
+        'total_amount': float(transaction.amount),
+        'status': transaction.status,
+        'recipient_phone': recipient_phone,
+        'payment_method': payment_method,
+        'priority': transaction.priority,
+        'created_at': transaction.created_at.isoformat()
+    }, status=response_status)
 
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent('orders.bulk_create')
 def create_bulk_order(request):
     """
     Create a bulk order (agents only).
     """
     # Check if user is an agent
-    if request.user.user_type != 'agent':
+    if request.user.role != 'agent':
         return Response({
             'error': {
                 'code': 'PERMISSION_DENIED',
@@ -517,52 +566,133 @@ def create_bulk_order(request):
         }, status=status.HTTP_400_BAD_REQUEST)
     
     try:
-        product = DigitalProduct.objects.get(id=product_id, is_active=True)
-    except DigitalProduct.DoesNotExist:
+        result = BulkOrderService().create_bulk_order(
+            user=request.user,
+            product_id=product_id,
+            recipients=recipients
+        )
+    except InsufficientFundsException as e:
         return Response({
             'error': {
-                'code': 'NOT_FOUND',
-                'message': 'Product not found'
+                'code': 'INSUFFICIENT_FUNDS',
+                'message': str(e.detail)
             }
-        }, status=status.HTTP_404_NOT_FOUND)
+        }, status=status.HTTP_402_PAYMENT_REQUIRED)
+    except BaseAPIException as e:
+        return Response({
+            'error': {
+                'code': e.default_code.upper(),
+                'message': str(e.detail)
+            }
+        }, status=e.status_code)
+    except Exception as e:
+        return Response({
+            'error': {
+                'code': 'SERVER_ERROR',
+                'message': str(e)
+            }
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
-    # Process bulk order - for now, just return a success message
-    # In a real implementation, you would process each recipient separately
-    order_results = []
+    bulk_order = result['bulk_order']
     
-    for phone_number in recipients:
-        try:
-            digital_service = DigitalService()
-            transaction = digital_service.initiate_purchase(
-                user=request.user,
-                product_id=product_id,
-                phone_number=phone_number,
-                quantity=1  # For bulk orders, each recipient gets 1 unit
-            )
-            
-            result = digital_service.process_transaction(transaction.id)
-            
-            order_results.append({
-                'recipient': phone_number,
-                'transaction_id': transaction.id,
-                'status': transaction.status,
-                'message': result.get('message', 'Order processed successfully')
-            })
-        except Exception as e:
-            order_results.append({
-                'recipient': phone_number,
-                'status': 'failed',
+    return Response({
+        **BulkOrderService().get_summary(bulk_order),
+        'rejected_recipients': [
+            {'recipient': recipient, 'message': message}
+            for recipient, message in result['rejected'].items()
+        ]
+    }, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@parser_classes([MultiPartParser])
+def upload_bulk_order(request):
+    """
+    Create a bulk order from an uploaded CSV of recipients (agents only).
+    """
+    if request.user.role != 'agent':
+        return Response({
+            'error': {
+                'code': 'PERMISSION_DENIED',
+                'message': 'Only agents can create bulk orders'
+            }
+        }, status=status.HTTP_403_FORBIDDEN)
+    
+    product_id = request.data.get('product_id')
+    upload = request.FILES.get('file')
+    
+    if not all([product_id, upload]):
+        return Response({
+            'error': {
+                'code': 'VALIDATION_ERROR',
+                'message': 'Product ID and file are required'
+            }
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    if not upload.name.lower().endswith('.csv'):
+        return Response({
+            'error': {
+                'code': 'VALIDATION_ERROR',
+                'message': 'Recipients file must be a CSV'
+            }
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        result = BulkOrderService().create_bulk_order_from_csv(
+            user=request.user,
+            product_id=product_id,
+            csv_file=upload.file
+        )
+    except InsufficientFundsException as e:
+        return Response({
+            'error': {
+                'code': 'INSUFFICIENT_FUNDS',
+                'message': str(e.detail)
+            }
+        }, status=status.HTTP_402_PAYMENT_REQUIRED)
+    except BaseAPIException as e:
+        return Response({
+            'error': {
+                'code': e.default_code.upper(),
+                'message': str(e.detail)
+            }
+        }, status=e.status_code)
+    except UnicodeDecodeError:
+        return Response({
+            'error': {
+                'code': 'VALIDATION_ERROR',
+                'message': 'Recipients file must be UTF-8 encoded'
+            }
+        }, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        return Response({
+            'error': {
+                'code': 'SERVER_ERROR',
                 'message': str(e)
-            })
+            }
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
     return Response({
-        'order_results': order_results,
-        'summary': {
-            'total_orders': len(recipients),
-            'successful_orders': len([r for r in order_results if r['status'] != 'failed']),
-            'failed_orders': len([r for r in order_results if r['status'] == 'failed'])
-        }
-    }, status=status.HTTP_201_CREATED)
+        **BulkOrderService().get_summary(result['bulk_order']),
+        'upload': result['stats']
+    }, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_bulk_order(request, bulk_order_id):
+    """
+    Get bulk order progress by ID.
+    """
+    bulk_order = get_object_or_404(
+        BulkOrder.objects.select_related('product'), id=bulk_order_id, user=request.user
+    )
+    
+    return Response({
+        **BulkOrderService().get_summary(bulk_order),
+        'failed_recipients': bulk_order.results
+    }, status=status.HTTP_200_OK)
 
 
 @api_view(['GET'])
@@ -571,7 +701,7 @@ def list_orders(request):
     """
     List user orders with optional filters.
     """
-    transactions = Transaction.objects.filter(user=request.user)
+    transactions = DigitalTransaction.objects.filter(user=request.user)
     
     # Apply filters
     status_filter = request.query_params.get('status')
@@ -618,7 +748,7 @@ def get_order_details(request, order_id):
     """
     Get order details by ID.
     """
-    transaction = get_object_or_404(Transaction, id=order_id, user=request.user)
+    transaction = get_object_or_404(DigitalTransaction, id=order_id, user=request.user)
     serializer = TransactionSerializer(transaction)
     
     return Response(serializer.data, status=status.HTTP_200_OK)
@@ -961,7 +1091,7 @@ def list_transactions(request):
     """
     List transactions with optional filters.
     """
-    transactions = Transaction.objects.filter(user=request.user)
+    transactions = DigitalTransaction.objects.filter(user=request.user)
     
     # Apply filters
     transaction_type = request.query_params.get('transaction_type')
@@ -1011,7 +1141,7 @@ def get_transaction_details(request, transaction_id):
     """
     Get transaction details by ID.
     """
-    transaction = get_object_or_404(Transaction, id=transaction_id, user=request.user)
+    transaction = get_object_or_404(DigitalTransaction, id=transaction_id, user=request.user)
     serializer = TransactionSerializer(transaction)
     
     return Response(serializer.data, status=status.HTTP_200_OK)
@@ -1101,16 +1231,16 @@ def dashboard_overview(request):
     user = request.user
     wallet, created = Wallet.objects.get_or_create(user=user)
     
-    if user.user_type == 'admin':
+    if user.role == 'admin':
         # Admin dashboard data
         return Response({
             'total_users': CustomUser.objects.count(),
-            'total_agents': CustomUser.objects.filter(user_type='agent').count(),
+            'total_agents': CustomUser.objects.filter(role='agent').count(),
             'total_revenue': '50000.00',
             'pending_agents': 5,
             'system_health': {'status': 'operational'}
         }, status=status.HTTP_200_OK)
-    elif user.user_type == 'agent':
+    elif user.role == 'agent':
         # Agent dashboard data
         return Response({
             'wallet_balance': float(wallet.balance),
@@ -1123,9 +1253,9 @@ def dashboard_overview(request):
         # Regular user dashboard data
         return Response({
             'wallet_balance': float(wallet.balance),
-            'total_orders': Transaction.objects.filter(user=user).count(),
+            'total_orders': DigitalTransaction.objects.filter(user=user).count(),
             'recent_transactions': [],
-            'pending_orders': Transaction.objects.filter(user=user, status='pending').count()
+            'pending_orders': DigitalTransaction.objects.filter(user=user, status='pending').count()
         }, status=status.HTTP_200_OK)
 
 
@@ -1264,23 +1394,30 @@ def api_key_usage_statistics(request, key_id):
     }, status=status.HTTP_200_OK)
 
 
-@api_view(['GET'])
+@api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
-def list_webhooks(request):
+def webhooks(request):
     """
-    List webhooks for the user.
+    List webhooks for the user, or create one.
+    
+    The signing secret is only returned on creation. Deliveries carry an
+    X-Webhook-Signature header: the hex HMAC-SHA256, keyed with the secret,
+    of the X-Webhook-Timestamp header, a '.', and the raw body.
     """
-    # This requires a Webhook model which may not exist yet
-    return Response({'count': 0, 'results': []}, status=status.HTTP_200_OK)
+    if request.method == 'POST':
+        return _create_webhook(request)
+    
+    subscriptions = WebhookSubscription.objects.filter(user=request.user).order_by('-created_at')
+    
+    results = [_webhook_data(subscription) for subscription in subscriptions]
+    
+    return Response({'count': len(results), 'results': results}, status=status.HTTP_200_OK)
 
 
-@api_view(['POST'])
-@permission_classes([IsAuthenticated])
-def create_webhook(request):
+def _create_webhook(request):
     """
-    Create a webhook.
+    Validate and create a webhook subscription.
     """
-    # This requires a Webhook model which may not exist yet
     url = request.data.get('url')
     events = request.data.get('events', [])
     
@@ -1292,27 +1429,121 @@ def create_webhook(request):
             }
         }, status=status.HTTP_400_BAD_REQUEST)
     
+    try:
+        URLValidator(schemes=['http', 'https'] if settings.DEBUG else ['https'])(url)
+    except ValidationError:
+        return Response({
+            'error': {
+                'code': 'VALIDATION_ERROR',
+                'message': 'URL must be a valid https URL'
+            }
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        validate_webhook_url(url)
+    except ValidationError as e:
+        return Response({
+            'error': {
+                'code': 'VALIDATION_ERROR',
+                'message': e.messages[0]
+            }
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    if not isinstance(events, list) or any(event not in WEBHOOK_EVENTS for event in events):
+        return Response({
+            'error': {
+                'code': 'VALIDATION_ERROR',
+                'message': 'Events must be a list of available webhook events',
+                'details': {
+                    'available_events': list(WEBHOOK_EVENTS)
+                }
+            }
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    subscription = WebhookSubscription.objects.create(
+        user=request.user,
+        url=url,
+        events=events,
+        secret=secrets.token_hex(32)
+    )
+    
     return Response({
-        'id': str(uuid.uuid4()),
-        'url': url,
-        'events': events,
-        'status': 'active'
+        **_webhook_data(subscription),
+        'secret': subscription.secret,
+        'message': 'Store this signing secret securely. It will not be shown again.'
     }, status=status.HTTP_201_CREATED)
 
 
+@api_view(['DELETE'])
+@permission_classes([IsAuthenticated])
+def delete_webhook(request, webhook_id):
+    """
+    Delete a webhook and its pending deliveries.
+    """
+    subscription = get_object_or_404(WebhookSubscription, id=webhook_id, user=request.user)
+    subscription.delete()
+    
+    return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def list_webhook_deliveries(request, webhook_id):
+    """
+    List the deliveries of a webhook, newest first.
+    """
+    subscription = get_object_or_404(WebhookSubscription, id=webhook_id, user=request.user)
+    deliveries = subscription.deliveries.order_by('-created_at')
+    
+    status_filter = request.query_params.get('status')
+    if status_filter:
+        deliveries = deliveries.filter(status=status_filter)
+    
+    # Pagination
+    page = int(request.query_params.get('page', 1))
+    page_size = int(request.query_params.get('page_size', 20))
+    if page_size > 100:
+        page_size = 100
+    
+    start = (page - 1) * page_size
+    
+    results = [{
+        'id': delivery.id,
+        'event_id': str(delivery.event_id),
+        'event': delivery.event,
+        'status': delivery.status,
+        'attempts': delivery.attempts,
+        'response_status': delivery.response_status,
+        'error': delivery.error,
+        'next_attempt_at': delivery.next_attempt_at.isoformat() if delivery.status == 'pending' else None,
+        'created_at': delivery.created_at.isoformat(),
+        'delivered_at': delivery.delivered_at.isoformat() if delivery.delivered_at else None
+    } for delivery in deliveries[start:start + page_size]]
+    
+    return Response({
+        'page': page,
+        'page_size': page_size,
+        'results': results
+    }, status=status.HTTP_200_OK)
+
+
+def _webhook_data(subscription):
+    """
+    Serialize a webhook subscription, without its secret.
+    """
+    return {
+        'id': str(subscription.id),
+        'url': subscription.url,
+        'events': subscription.events,
+        'status': 'active' if subscription.is_active else 'inactive',
+        'created_at': subscription.created_at.isoformat()
+    }
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def list_webhook_events(request):
     """
     List available webhook events.
     """
-    events = [
-        'order.completed',
-        'order.failed',
-        'payment.success',
-        'payment.failed',
-        'wallet.funded',
-        'wallet.withdrawn'
-    ]
-    
-    return Response(events, status=status.HTTP_200_OK)
\ No newline at end of file
+    return Response(list(WEBHOOK_EVENTS), status=status.HTTP_200_OK)
\ No newline at end of file
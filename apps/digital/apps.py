@@ -6,4 +6,9 @@ class DigitalConfig(AppConfig):
     name = 'apps.digital'
     
     def ready(self):
-        import apps.digital.signals
\ No newline at end of file
+        import apps.digital.signals
+        from django.conf import settings
+        
+        if settings.PROVIDER_SIMULATOR_ENABLED:
+            from apps.digital.providers.simulator_provider import register_simulator
+            register_simulator()
\ No newline at end of file
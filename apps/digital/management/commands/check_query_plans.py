@@ -0,0 +1,296 @@
+import random
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction as db_transaction
+from django.db.models import F
+from django.utils import timezone
+from apps.digital.models import (
+    DigitalProduct, DigitalTransaction, NetworkProvider, Order, Product, ServiceType, WebhookInbox
+)
+from apps.digital.services.digital_service import DigitalService
+from apps.users.models import User
+
+
+# Share of seeded transactions in each status
+STATUS_WEIGHTS = {
+    'completed': 90,
+    'failed': 6,
+    'processing': 2,
+    'pending': 1,
+    'refunded': 1,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Check that the hot transaction, order and webhook queries use their indexes. '
+        'Seeds realistic data in a transaction that is rolled back, runs EXPLAIN on each '
+        'query and fails if a plan does not use the expected index.'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=50000,
+                            help='Transactions to seed before checking; 0 checks against the existing data')
+        parser.add_argument('--users', type=int, default=500, help='Users the seeded transactions belong to')
+        parser.add_argument('--show-plans', action='store_true', help='Print every plan, not only failing ones')
+
+    def handle(self, *args, **options):
+        with db_transaction.atomic():
+            if options['seed']:
+                fixtures = self._seed(options['seed'], options['users'])
+            else:
+                fixtures = self._existing_fixtures()
+            
+            self._analyze()
+            failures = self._check(fixtures, options['show_plans'])
+            
+            # Seeded rows never outlive the check
+            db_transaction.set_rollback(True)
+        
+        if failures:
+            raise CommandError(f"{len(failures)} queries do not use their index: {', '.join(failures)}")
+        
+        self.stdout.write(self.style.SUCCESS('All hot queries use their indexes'))
+
+    def hot_queries(self, fixtures):
+        """
+        Get the hot queries and the index each one must use.
+        
+        Args:
+            fixtures: Values to filter on, from _seed() or _existing_fixtures()
+        
+        Returns:
+            List of (name, queryset, index name)
+        """
+        now = timezone.now()
+        provider_ids = fixtures['provider_transaction_ids']
+        transactions = DigitalTransaction.objects.all()
+        
+        return [
+            ('webhook_provider_id_lookup',
+             transactions.filter(provider_transaction_id__in=provider_ids[:500]),
+             'digital_txn_provider_txn_id'),
+            ('settlement_provider_id_lookup',
+             transactions.filter(provider=fixtures['provider'], provider_transaction_id__in=provider_ids),
+             'digital_txn_provider_txn_id'),
+            ('fraud_user_velocity',
+             transactions.filter(user=fixtures['user'], bulk_order__isnull=True, created_at__gte=now - timedelta(hours=24)),
+             'digital_txn_user_created'),
+            ('user_transaction_listing',
+             transactions.filter(user=fixtures['user']).order_by('-created_at')[:20],
+             'digital_txn_user_created'),
+            ('admin_listing_by_status',
+             transactions.filter(status='failed').order_by('-created_at')[:20],
+             'digital_txn_status_created'),
+            ('admin_listing_by_service_type',
+             transactions.filter(service_type__code=fixtures['service_type_code']).order_by('-created_at')[:20],
+             'digital_txn_service_created'),
+            ('cleanup_failed',
+             transactions.filter(status='failed', created_at__lt=now - timedelta(days=30)),
+             'digital_txn_status_created'),
+            ('stuck_transaction_sweep',
+             transactions.filter(status='processing', updated_at__lt=now - timedelta(minutes=5), id__gt='')
+             .order_by('id')[:500],
+             'digital_txn_processing'),
+            ('settlement_unsettled',
+             transactions.filter(
+                 provider=fixtures['provider'],
+                 status='completed',
+                 completed_at__gte=now - timedelta(days=2),
+                 completed_at__lt=now - timedelta(days=1),
+                 settled_at__isnull=True
+             ).order_by('id'),
+             'digital_txn_unsettled'),
+            ('order_listing_by_date',
+             Order.objects.filter(user=fixtures['user'], created_at__gte=now - timedelta(days=30))
+             .order_by('-created_at')[:20],
+             'digital_order_user_created'),
+            ('webhook_inbox_drain',
+             WebhookInbox.objects.filter(status='pending', id__gt=0).order_by('id')[:500],
+             'digital_webhook_inbox_pending'),
+        ]
+
+    def _check(self, fixtures, show_plans):
+        """
+        EXPLAIN each hot query and collect the ones not using their index.
+        """
+        failures = []
+        
+        for name, queryset, index in self.hot_queries(fixtures):
+            plan = queryset.explain()
+            ok = index in plan
+            
+            if ok:
+                self.stdout.write(f"ok    {name} ({index})")
+            else:
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(f"FAIL  {name}: expected {index}"))
+            
+            if show_plans or not ok:
+                self.stdout.write('\n'.join(f"      {line}" for line in plan.splitlines()))
+        
+        return failures
+
+    def _analyze(self):
+        """
+        Refresh planner statistics so plans reflect the seeded rows.
+        """
+        tables = [model._meta.db_table for model in (DigitalTransaction, Order, WebhookInbox)]
+        
+        with connection.cursor() as cursor:
+            for table in tables:
+                cursor.execute(f"ANALYZE {connection.ops.quote_name(table)}")
+
+    def _existing_fixtures(self):
+        """
+        Pick filter values from the existing data.
+        """
+        latest = DigitalTransaction.objects.select_related('user', 'service_type').order_by('-created_at').first()
+        
+        if latest is None:
+            raise CommandError('No transactions to check against; run with --seed')
+        
+        provider_ids = list(
+            DigitalTransaction.objects.filter(provider=latest.provider)
+            .exclude(provider_transaction_id='')
+            .values_list('provider_transaction_id', flat=True)[:2000]
+        )
+        
+        return {
+            'user': latest.user,
+            'provider': latest.provider,
+            'service_type_code': latest.service_type.code,
+            'provider_transaction_ids': provider_ids or ['none'],
+        }
+
+    def _seed(self, count, user_count):
+        """
+        Seed a year of transactions, orders and webhooks with production-like skew.
+        
+        A few heavy users own most transactions, nearly all are completed and
+        settled, and only a small tail is pending or processing.
+        """
+        now = timezone.now()
+        tag = uuid.uuid4().hex[:8]
+        
+        users = User.objects.bulk_create([
+            User(username=f"plan-{tag}-{i}", email=f"plan-{tag}-{i}@example.com", role='agent' if i % 10 else 'user')
+            for i in range(user_count)
+        ])
+        # Zipf-like: the i-th user is 1/(i+1) as active as the first
+        user_weights = [1 / (i + 1) for i in range(user_count)]
+        
+        network = NetworkProvider.objects.create(name=f"Plan {tag}", code=f"PLAN-{tag}")
+        service_types = [
+            ServiceType.objects.create(name=f"{name} {tag}", code=f"{name.upper()}-{tag}")
+            for name in ('Data', 'Airtime', 'Voucher')
+        ]
+        products = [
+            DigitalProduct.objects.create(
+                service_type=service_type,
+                network_provider=network,
+                name=f"{service_type.name} product",
+                code=f"{service_type.code}-P",
+                denomination=Decimal('5.00')
+            )
+            for service_type in service_types
+        ]
+        
+        statuses = list(STATUS_WEIGHTS)
+        status_weights = list(STATUS_WEIGHTS.values())
+        settled_before = now - timedelta(days=1)
+        provider_ids = []
+        batch = []
+        
+        for i in range(count):
+            transaction_id, reference = DigitalService.generate_transaction_ids()
+            product = random.choice(products)
+            status = random.choices(statuses, status_weights)[0]
+            created_at = now - timedelta(seconds=random.randint(0, 365 * 24 * 3600))
+            provider_id = f"PLAN{tag}{i}" if status != 'pending' else ''
+            completed_at = created_at + timedelta(seconds=random.randint(1, 120)) if status in ('completed', 'refunded') else None
+            
+            if provider_id:
+                provider_ids.append(provider_id)
+            
+            batch.append(DigitalTransaction(
+                id=transaction_id,
+                reference=reference,
+                user=random.choices(users, user_weights)[0],
+                product=product,
+                network_provider=network,
+                service_type=product.service_type,
+                phone_number='0244000000',
+                amount=Decimal('5.00'),
+                price=Decimal('5.00'),
+                status=status,
+                provider='mtn',
+                provider_transaction_id=provider_id,
+                initiated_at=created_at,
+                completed_at=completed_at,
+                failed_at=created_at if status == 'failed' else None,
+                settled_at=completed_at if completed_at and completed_at < settled_before else None
+            ))
+            
+            if len(batch) >= 5000:
+                DigitalTransaction.objects.bulk_create(batch)
+                batch = []
+        
+        if batch:
+            DigitalTransaction.objects.bulk_create(batch)
+        
+        # auto_now_add ignores the value given, so spread the creation dates afterwards
+        DigitalTransaction.objects.filter(product__in=products).update(created_at=F('initiated_at'))
+        
+        self._seed_orders(users, user_weights, count // 10, tag)
+        self._seed_webhooks(count // 5, tag)
+        
+        self.stdout.write(f"Seeded {count} transactions for {user_count} users")
+        
+        return {
+            'user': users[0],
+            'provider': 'mtn',
+            'service_type_code': service_types[0].code,
+            'provider_transaction_ids': random.sample(provider_ids, min(2000, len(provider_ids))),
+        }
+
+    def _seed_orders(self, users, user_weights, count, tag):
+        """
+        Seed orders spread over a year, with the same user skew as transactions.
+        """
+        now = timezone.now()
+        product = Product.objects.create(
+            name=f"Plan {tag}", slug=f"plan-{tag}", category='data', network='mtn', price=Decimal('5.00')
+        )
+        
+        Order.objects.bulk_create([
+            Order(
+                order_number=f"PLAN-{tag}-{i}",
+                user=random.choices(users, user_weights)[0],
+                product=product,
+                unit_price=Decimal('5.00'),
+                total_amount=Decimal('5.00'),
+                status='completed',
+                recipient_phone='0244000000',
+                payment_method='wallet',
+                created_at=now - timedelta(seconds=random.randint(0, 365 * 24 * 3600))
+            )
+            for i in range(count)
+        ], batch_size=5000)
+
+    def _seed_webhooks(self, count, tag):
+        """
+        Seed an inbox where all but a handful of webhooks are already processed.
+        """
+        WebhookInbox.objects.bulk_create([
+            WebhookInbox(
+                provider='mtn',
+                event_id=f"plan-{tag}-{i}",
+                body='{}',
+                status='pending' if i % 200 == 0 else 'processed',
+                attempts=1
+            )
+            for i in range(count)
+        ], batch_size=5000)
@@ -0,0 +1,43 @@
+import sys
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from apps.digital.services.settlement_service import SettlementReconciliationService
+
+
+class Command(BaseCommand):
+    help = (
+        'Reconcile a provider settlement file (CSV with a header row, or JSONL) '
+        'with our transactions and write a CSV discrepancy report.'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Settlement file')
+        parser.add_argument('--provider', required=True, help='Provider the file comes from, e.g. mtn')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='File format, defaults to the file extension')
+        parser.add_argument('--date', help='Settlement date (YYYY-MM-DD); reports completed transactions missing from the file')
+        parser.add_argument('--report', help='Discrepancy report path, defaults to stdout')
+        parser.add_argument('--batch-size', type=int, help='Lines matched per database lookup')
+
+    def handle(self, *args, **options):
+        try:
+            settlement_date = date.fromisoformat(options['date']) if options['date'] else None
+        except ValueError:
+            raise CommandError(f"Invalid --date: {options['date']}")
+        
+        service = SettlementReconciliationService(options['provider'], batch_size=options['batch_size'])
+        lines = service.read_lines(options['path'], options['format'])
+        
+        try:
+            if options['report']:
+                with open(options['report'], 'w', newline='') as report:
+                    stats = service.reconcile(lines, report, settlement_date)
+            else:
+                stats = service.reconcile(lines, self.stdout, settlement_date)
+        except FileNotFoundError as e:
+            raise CommandError(str(e))
+        
+        discrepancies = ', '.join(f"{name}={count}" for name, count in sorted(stats['discrepancies'].items()))
+        sys.stderr.write(
+            f"Reconciled {stats['lines']} lines: {stats['matched']} matched, "
+            f"settled amount {stats['settled_amount']}, discrepancies: {discrepancies or 'none'}\n"
+        )
@@ -0,0 +1,116 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from apps.digital.models import DigitalTransaction, DigitalProduct
+from apps.users.models import User
+from apps.digital.providers.simulator_provider import register_simulator
+from apps.digital.services.digital_service import DigitalService
+from apps.wallets.services.wallet_service import WalletService
+from core.identifiers import ulid
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the purchase path against the provider simulator: create '
+        'pending transactions and run them through DigitalService.process_transaction.'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--user', required=True, help='Email of the purchasing user')
+        parser.add_argument('--product', required=True, help='ID of the digital product to buy')
+        parser.add_argument('--count', type=int, default=1000, help='Number of transactions')
+        parser.add_argument('--concurrency', type=int, default=100, help='Transactions processed in parallel')
+        parser.add_argument('--fund', action='store_true', help="Credit the user's wallet with the total first")
+
+    def handle(self, *args, **options):
+        # Never let a benchmark reach a real provider
+        register_simulator()
+        
+        try:
+            user = User.objects.get(email=options['user'])
+            product = DigitalProduct.objects.select_related(
+                'service_type', 'network_provider'
+            ).get(id=options['product'])
+        except (User.DoesNotExist, DigitalProduct.DoesNotExist) as e:
+            raise CommandError(str(e))
+        
+        service = DigitalService()
+        price = service.pricing_service.get_user_price(user, product)
+        count = options['count']
+        
+        if options['fund']:
+            WalletService().credit(
+                user, price * count, reference=f"SIM{ulid()}", description='Simulator benchmark funding'
+            )
+        
+        transaction_ids = self._create_transactions(service, user, product, price, count)
+        self.stdout.write(f"Created {count} pending transactions, processing with concurrency {options['concurrency']}")
+        
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            results = list(executor.map(lambda transaction_id: self._process(service, transaction_id), transaction_ids))
+        elapsed = time.monotonic() - started
+        
+        latencies = sorted(latency for latency, _ in results)
+        outcomes = {}
+        for _, outcome in results:
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        
+        self.stdout.write(f"Processed {count} transactions in {elapsed:.2f}s ({count / elapsed:.1f}/s)")
+        self.stdout.write('Outcomes: ' + ', '.join(f"{name}={total}" for name, total in sorted(outcomes.items())))
+        self.stdout.write('Latency: ' + ', '.join(
+            f"p{percentile}={self._percentile(latencies, percentile) * 1000:.0f}ms"
+            for percentile in (50, 95, 99)
+        ))
+
+    def _create_transactions(self, service: DigitalService, user, product: DigitalProduct,
+                             price: Decimal, count: int):
+        """
+        Insert pending transactions directly, bypassing fraud velocity checks.
+        """
+        transactions = []
+        for index in range(count):
+            transaction_id, reference = service.generate_transaction_ids()
+            transactions.append(DigitalTransaction(
+                id=transaction_id,
+                reference=reference,
+                user=user,
+                product=product,
+                service_type=product.service_type,
+                network_provider=product.network_provider,
+                phone_number=f"024{index:07d}",
+                amount=price,
+                price=price,
+                provider=product.network_provider.code.lower() if product.network_provider else 'general'
+            ))
+        
+        DigitalTransaction.objects.bulk_create(transactions, batch_size=1000)
+        return [transaction.id for transaction in transactions]
+
+    @staticmethod
+    def _process(service: DigitalService, transaction_id: str):
+        """
+        Process one transaction, returning its latency and outcome.
+        """
+        started = time.monotonic()
+        try:
+            result = service.process_transaction(transaction_id)
+            outcome = result.get('status', 'unknown')
+        except Exception as e:
+            outcome = type(e).__name__
+        finally:
+            # Worker threads each hold their own database connection
+            connection.close()
+        return time.monotonic() - started, outcome
+
+    @staticmethod
+    def _percentile(values, percentile: float) -> float:
+        """
+        Nearest-rank percentile of sorted values.
+        """
+        if not values:
+            return 0.0
+        index = min(len(values) - 1, int(round(percentile / 100 * len(values))) - 1)
+        return values[max(index, 0)]
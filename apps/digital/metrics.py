@@ -0,0 +1,87 @@
+import functools
+import time
+import redis
+from django.conf import settings
+from core.metrics import Counter, Gauge, Histogram, configure_shared_store
+
+
+PROVIDER_CALL_DURATION = Histogram(
+    'provider_call_duration_seconds',
+    'Latency of provider calls',
+    ('provider', 'operation')
+)
+PROVIDER_CALLS = Counter(
+    'provider_calls_total',
+    'Provider call results by outcome (success, failed, error, rejected, rate_limited)',
+    ('provider', 'operation', 'outcome')
+)
+PROVIDER_CALLS_IN_FLIGHT = Gauge(
+    'provider_calls_in_flight',
+    'Provider calls currently waiting on the provider',
+    ('provider', 'operation')
+)
+PROVIDER_RATE_LIMIT_WAIT = Histogram(
+    'provider_rate_limit_wait_seconds',
+    'Time provider calls waited for rate limit tokens',
+    ('provider', 'operation')
+)
+
+WEBHOOK_DURATION = Histogram(
+    'webhook_request_duration_seconds',
+    'Time spent handling provider webhooks',
+    ('provider',)
+)
+WEBHOOK_REQUESTS = Counter(
+    'webhook_requests_total',
+    'Provider webhooks handled by response status code',
+    ('provider', 'status_code')
+)
+WEBHOOK_DUPLICATES = Counter(
+    'webhook_duplicates_total',
+    'Provider webhook redeliveries dropped by event ID',
+    ('provider',)
+)
+CUSTOMER_WEBHOOK_DELIVERIES = Counter(
+    'customer_webhook_deliveries_total',
+    'Customer webhook delivery attempts by outcome (delivered, retried, failed)',
+    ('event', 'outcome')
+)
+
+
+if settings.METRICS_SHARED:
+    # Celery workers make most provider calls; aggregate them with the web processes
+    configure_shared_store(
+        redis.Redis.from_url(
+            settings.REDIS_URL,
+            socket_timeout=settings.METRICS_REDIS_TIMEOUT,
+            socket_connect_timeout=settings.METRICS_REDIS_TIMEOUT
+        ),
+        settings.METRICS_FLUSH_SECONDS
+    )
+
+
+def track_webhook(provider: str = None):
+    """
+    Decorator recording the duration and response status of a webhook view.
+    
+    Args:
+        provider: Provider name used as the metric label, defaults to the
+            view's `provider` argument
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            started = time.monotonic()
+            status_code = 500
+            try:
+                response = view(request, *args, **kwargs)
+                status_code = response.status_code
+                return response
+            finally:
+                label = provider or kwargs.get('provider', 'unknown')
+                WEBHOOK_DURATION.observe(time.monotonic() - started, provider=label)
+                WEBHOOK_REQUESTS.inc(provider=label, status_code=status_code)
+        
+        return wrapper
+    
+    return decorator
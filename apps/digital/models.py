@@ -1,9 +1,11 @@
 import uuid
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
 from decimal import Decimal
 from apps.users.models import User
+from core.identifiers import uuid7
 
 
 class Product(models.Model):
@@ -66,7 +68,7 @@ class Order(models.Model):
         ('card', 'Card'),
     ]
     
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     order_number = models.CharField(max_length=50, unique=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='orders')
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='orders')
@@ -78,7 +80,7 @@ class Order(models.Model):
     recipient_phone = models.CharField(max_length=20)
     payment_method = models.CharField(max_length=20, choices=PAYMENT_METHOD_CHOICES)
     payment = models.ForeignKey('Payment', on_delete=models.SET_NULL, null=True, blank=True, related_name='orders')
-    transaction = models.ForeignKey('WalletTransaction', on_delete=models.SET_NULL, null=True, blank=True, related_name='orders')
+    transaction = models.ForeignKey('wallets.Transaction', on_delete=models.SET_NULL, null=True, blank=True, related_name='orders')
     api_response = models.JSONField(null=True, blank=True)
     notes = models.TextField(null=True, blank=True)
     processed_at = models.DateTimeField(null=True, blank=True)
@@ -86,6 +88,12 @@ class Order(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [
+            # A user's orders by date range, newest first
+            models.Index(fields=['user', 'created_at'], name='digital_order_user_created'),
+        ]
+
     def save(self, *args, **kwargs):
         if not self.id:
             self.created_at = timezone.now()
@@ -108,20 +116,34 @@ class BulkOrder(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     batch_number = models.CharField(max_length=50, unique=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='bulk_orders')
-    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='bulk_orders')
+    product = models.ForeignKey('DigitalProduct', on_delete=models.CASCADE, related_name='bulk_orders')
     total_recipients = models.IntegerField()
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     successful_count = models.IntegerField(default=0)
     failed_count = models.IntegerField(default=0)
     total_amount = models.DecimalField(max_digits=15, decimal_places=2)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     recipients = models.JSONField()
-    results = models.JSONField(default=list)
+    results = models.JSONField(default=list)  # Failed recipients and their errors
     created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
     completed_at = models.DateTimeField(null=True, blank=True)
 
+    @property
+    def processed_count(self):
+        return self.successful_count + self.failed_count
+
     def __str__(self):
         return self.batch_number
 
+    def settled_status(self):
+        """Final status for the current counters; 'partial' while outcomes are unknown"""
+        if self.successful_count == self.total_recipients:
+            return 'completed'
+        if self.failed_count == self.total_recipients:
+            return 'failed'
+        return 'partial'
+
 
 class Payment(models.Model):
     STATUS_CHOICES = [
@@ -235,6 +257,16 @@ class DigitalTransaction(models.Model):
         ('refunded', 'Refunded'),
     ]
     
+    # Statuses only move forward: completed and failed are final, and only
+    # a completed or failed purchase can be refunded
+    STATUS_ORDER = {
+        'pending': 0,
+        'processing': 1,
+        'completed': 2,
+        'failed': 2,
+        'refunded': 3,
+    }
+    
     PRIORITY_CHOICES = [
         ('low', 'Low'),
         ('normal', 'Normal'),
@@ -257,17 +289,74 @@ class DigitalTransaction(models.Model):
     provider_response = models.JSONField(default=dict, blank=True)  # Raw response from provider
     provider_transaction_id = models.CharField(max_length=100, blank=True)  # Transaction ID from provider
     provider = models.CharField(max_length=100)  # Provider name
+    bulk_order = models.ForeignKey(BulkOrder, on_delete=models.SET_NULL, null=True, blank=True, related_name='transactions')
     retry_count = models.IntegerField(default=0)
     max_retries = models.IntegerField(default=3)
     initiated_at = models.DateTimeField(default=timezone.now)
     completed_at = models.DateTimeField(null=True, blank=True)
     failed_at = models.DateTimeField(null=True, blank=True)
+    settled_at = models.DateTimeField(null=True, blank=True)  # Matched to a provider settlement line
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Stale 'processing' transactions for the recovery sweep, paged
+            # by ID; only the few in-flight rows are indexed
+            models.Index(
+                fields=['id', 'updated_at'],
+                name='digital_txn_processing',
+                condition=models.Q(status='processing')
+            ),
+            # Webhook and settlement lookups. Not partial on non-empty IDs:
+            # Postgres cannot prove a partial index predicate from an IN list
+            # of more than 100 values, which every batched lookup is
+            models.Index(fields=['provider_transaction_id'], name='digital_txn_provider_txn_id'),
+            # A user's transactions newest first, and fraud velocity counts
+            models.Index(fields=['user', 'created_at'], name='digital_txn_user_created'),
+            # Admin listing and cleanup by status and age
+            models.Index(fields=['status', 'created_at'], name='digital_txn_status_created'),
+            # Admin and user listing by service type
+            models.Index(fields=['service_type', 'created_at'], name='digital_txn_service_created'),
+            # Completed transactions no settlement line has matched yet
+            models.Index(
+                fields=['provider', 'completed_at'],
+                name='digital_txn_unsettled',
+                condition=models.Q(status='completed', settled_at__isnull=True)
+            ),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - {self.product.name} - {self.status}"
 
+    def can_transition_to(self, status):
+        """Whether moving to `status` goes forward, per STATUS_ORDER"""
+        return self.STATUS_ORDER.get(status, -1) > self.STATUS_ORDER.get(self.status, -1)
+
+
+class IdempotencyKey(models.Model):
+    """Client-supplied Idempotency-Key and the response it produced"""
+    STATUS_CHOICES = [
+        ('processing', 'Processing'),
+        ('completed', 'Completed'),
+    ]
+
+    user = models.ForeignKey('users.User', on_delete=models.CASCADE, related_name='idempotency_keys')
+    scope = models.CharField(max_length=100)  # Endpoint the key applies to, e.g. 'orders.create'
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)  # SHA256 of the request payload
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='processing')
+    response_status = models.IntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)  # Purged by cleanup_idempotency_keys
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('user', 'scope', 'key')
+
+    def __str__(self):
+        return f"{self.scope} - {self.key} ({self.status})"
+
 
 class APIKey(models.Model):
     """API keys for resellers and external integrations"""
@@ -305,6 +394,110 @@ class TransactionLog(models.Model):
         return f"{self.transaction.id} - {self.action}"
 
 
+class WebhookInbox(models.Model):
+    """Provider webhook accepted by the webhook endpoint, awaiting processing"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processed', 'Processed'),
+        ('failed', 'Failed'),
+    ]
+
+    provider = models.CharField(max_length=100)
+    event_id = models.CharField(max_length=255)  # Provider event ID, or a hash of the body
+    body = models.TextField()  # Raw request body, as signed by the provider
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.IntegerField(default=0)
+    error = models.TextField(blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        # Redeliveries of an event are rejected by this index on insert
+        unique_together = ('provider', 'event_id')
+        indexes = [
+            # Oldest pending webhooks first for the drain task; processed rows
+            # are the vast majority and stay out of the index
+            models.Index(fields=['id'], name='digital_webhook_inbox_pending', condition=models.Q(status='pending')),
+        ]
+
+    def __str__(self):
+        return f"{self.provider} webhook {self.id} ({self.status})"
+
+
+class WebhookSubscription(models.Model):
+    """Customer endpoint that receives account events"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey('users.User', on_delete=models.CASCADE, related_name='webhook_subscriptions')
+    url = models.URLField(max_length=500)
+    events = models.JSONField(default=list)  # Event types, e.g. ['order.completed']; empty means all
+    secret = models.CharField(max_length=64)  # Signs deliveries with HMAC-SHA256
+    max_concurrency = models.IntegerField(default=4)  # Deliveries in flight to this endpoint at once
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def subscribes_to(self, event):
+        """Whether the subscription wants `event`"""
+        return not self.events or event in self.events
+
+    def __str__(self):
+        return f"{self.user.email} - {self.url}"
+
+
+class WebhookDelivery(models.Model):
+    """One event to deliver to one customer endpoint"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('delivered', 'Delivered'),
+        ('failed', 'Failed'),
+    ]
+
+    subscription = models.ForeignKey(WebhookSubscription, on_delete=models.CASCADE, related_name='deliveries')
+    event_id = models.UUIDField(default=uuid7)  # Same for every subscription the event goes to
+    event = models.CharField(max_length=50)
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    response_status = models.IntegerField(null=True, blank=True)  # Of the last attempt
+    error = models.TextField(blank=True)  # Of the last attempt
+    created_at = models.DateTimeField(auto_now_add=True)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Due deliveries for the delivery task; only pending rows are indexed
+            models.Index(
+                fields=['next_attempt_at'],
+                name='digital_webhook_delivery_due',
+                condition=models.Q(status='pending')
+            ),
+            # A subscription's delivery log, newest first
+            models.Index(fields=['subscription', 'created_at'], name='digital_webhook_delivery_sub'),
+        ]
+
+    def __str__(self):
+        return f"{self.event} to {self.subscription_id} ({self.status})"
+
+
+class PortedNumber(models.Model):
+    """Number that moved network, overriding its prefix's network"""
+    NETWORK_CHOICES = [
+        ('mtn', 'MTN'),
+        ('telecel', 'Telecel'),
+        ('airteltigo', 'AirtelTigo'),
+    ]
+
+    phone_number = models.CharField(max_length=20, unique=True)  # E.164, e.g. +233244123456
+    network = models.CharField(max_length=50, choices=NETWORK_CHOICES)
+    ported_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.phone_number} - {self.network}"
+
+
 class Notification(models.Model):
     NOTIFICATION_TYPE_CHOICES = [
         ('order', 'Order'),
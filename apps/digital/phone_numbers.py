@@ -0,0 +1,217 @@
+import re
+import threading
+import time
+from typing import Dict, Iterable, NamedTuple, Optional
+from django.conf import settings
+
+
+COUNTRY_CODE = '233'
+
+# Mobile prefixes of the national significant number (the 9 digits after 0 or 233)
+NETWORK_PREFIXES = {
+    'mtn': ('24', '25', '53', '54', '55', '59'),
+    'telecel': ('20', '50'),
+    'airteltigo': ('26', '27', '56', '57'),
+}
+
+# NetworkProvider codes and provider names that refer to the same network
+NETWORK_ALIASES = {
+    'vodafone': 'telecel',
+    'airtel': 'airteltigo',
+    'tigo': 'airteltigo',
+}
+
+_NON_DIGITS = re.compile(r'\D')
+
+# Trie key holding the network of the prefix ending at a node
+_NETWORK = 'network'
+
+
+class PhoneNumber(NamedTuple):
+    """A parsed Ghanaian mobile number."""
+    national: str  # 9-digit national significant number
+    network: Optional[str]  # None when no network prefix matches
+    
+    @property
+    def e164(self) -> str:
+        return f"+{COUNTRY_CODE}{self.national}"
+
+    @property
+    def local(self) -> str:
+        return f"0{self.national}"
+
+
+def canonical_network(name: Optional[str]) -> Optional[str]:
+    """
+    Map a network provider code or provider name to a network of NETWORK_PREFIXES.
+    """
+    if not name:
+        return None
+    name = name.lower()
+    return NETWORK_ALIASES.get(name, name)
+
+
+def network_matches(phone_number: 'PhoneNumber', product) -> bool:
+    """
+    Check that a number can receive a product of its network provider.
+    
+    Products without a mobile network (or numbers of unknown network) match
+    any number.
+    """
+    if product.network_provider is None or phone_number.network is None:
+        return True
+    
+    network = canonical_network(product.network_provider.code)
+    return network not in NETWORK_PREFIXES or network == phone_number.network
+
+
+class PhoneNumberEngine:
+    """
+    Offline phone number normalization and network detection.
+    
+    Local (0241234567), international (233241234567, +233 24 123 4567,
+    00233241234567) and short (241234567) formats are reduced to the 9-digit
+    national number, whose network is found by walking a prefix trie. Ported
+    numbers are looked up first in an override table keyed by national number.
+    Parsing does no I/O, so it can run on every recipient of a bulk order.
+    """
+    
+    def __init__(self, prefixes: Dict[str, Iterable[str]] = None, ported: Dict[str, str] = None):
+        """
+        Args:
+            prefixes: Network -> national number prefixes; defaults to NETWORK_PREFIXES
+            ported: Phone number (any supported format) -> network overrides
+        """
+        self._trie = {}
+        self._ported = {}
+        
+        for network, network_prefixes in (prefixes or NETWORK_PREFIXES).items():
+            for prefix in network_prefixes:
+                self.add_prefix(prefix, network)
+        
+        for phone_number, network in (ported or {}).items():
+            national = self.national_number(phone_number)
+            if national:
+                self._ported[national] = canonical_network(network)
+
+    def add_prefix(self, prefix: str, network: str):
+        """
+        Route numbers starting with a national number prefix to a network.
+        """
+        node = self._trie
+        for digit in prefix:
+            node = node.setdefault(digit, {})
+        node[_NETWORK] = canonical_network(network)
+
+    def parse(self, value: str) -> Optional[PhoneNumber]:
+        """
+        Normalize a phone number and detect its network.
+        
+        Args:
+            value: Phone number in local, international or short format
+        
+        Returns:
+            The PhoneNumber, or None if the value is not a Ghanaian mobile number format
+        """
+        national = self.national_number(value)
+        
+        if national is None:
+            return None
+        
+        return PhoneNumber(national, self._ported.get(national) or self._lookup(national))
+
+    def to_e164(self, value: str) -> Optional[str]:
+        """
+        Get a phone number in E.164 format, or None if it cannot be parsed.
+        """
+        national = self.national_number(value)
+        return f"+{COUNTRY_CODE}{national}" if national else None
+
+    def detect_network(self, value: str) -> Optional[str]:
+        """
+        Get the network of a phone number, or None if unknown.
+        """
+        parsed = self.parse(value)
+        return parsed.network if parsed else None
+
+    @staticmethod
+    def national_number(value: str) -> Optional[str]:
+        """
+        Reduce a phone number to its 9-digit national significant number.
+        """
+        if not value:
+            return None
+        
+        digits = _NON_DIGITS.sub('', value)
+        length = len(digits)
+        
+        if length == 9 and digits[0] != '0':
+            return digits
+        if length == 10 and digits[0] == '0':
+            return digits[1:]
+        if length == 12 and digits.startswith(COUNTRY_CODE):
+            return digits[3:]
+        if length == 14 and digits.startswith('00' + COUNTRY_CODE):
+            return digits[5:]
+        
+        return None
+
+    def _lookup(self, national: str) -> Optional[str]:
+        """
+        Find the network of the longest matching prefix.
+        """
+        node = self._trie
+        network = None
+        
+        for digit in national:
+            node = node.get(digit)
+            if node is None:
+                break
+            network = node.get(_NETWORK, network)
+        
+        return network
+
+
+_engine = None
+_engine_loaded_at = 0.0
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> PhoneNumberEngine:
+    """
+    Get the shared engine, with ported numbers loaded from the PortedNumber table.
+    
+    The engine is rebuilt every PHONE_PORTED_NUMBERS_REFRESH_SECONDS and
+    whenever this process changes a PortedNumber.
+    """
+    global _engine, _engine_loaded_at
+    
+    engine = _engine
+    if engine is not None and time.monotonic() - _engine_loaded_at < settings.PHONE_PORTED_NUMBERS_REFRESH_SECONDS:
+        return engine
+    
+    with _engine_lock:
+        if _engine is None or time.monotonic() - _engine_loaded_at >= settings.PHONE_PORTED_NUMBERS_REFRESH_SECONDS:
+            from apps.digital.models import PortedNumber
+            
+            _engine = PhoneNumberEngine(ported=dict(
+                PortedNumber.objects.values_list('phone_number', 'network')
+            ))
+            _engine_loaded_at = time.monotonic()
+        
+        return _engine
+
+
+def invalidate_engine():
+    """
+    Rebuild the shared engine on next use.
+    """
+    global _engine
+    _engine = None
+
+
+def parse_phone_number(value: str) -> Optional[PhoneNumber]:
+    """
+    Parse a phone number with the shared engine.
+    """
+    return get_engine().parse(value)
@@ -1,16 +1,175 @@
+import asyncio
+import contextvars
+import functools
+import math
+import threading
+import time
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional
-from apps.digital.models import Transaction
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError, as_completed
+from typing import Dict, Any, List, Optional
+from django.conf import settings
+from apps.digital.metrics import (
+    PROVIDER_CALL_DURATION, PROVIDER_CALLS, PROVIDER_CALLS_IN_FLIGHT, PROVIDER_RATE_LIMIT_WAIT
+)
+from apps.digital.models import DigitalTransaction
+from apps.digital.providers.circuit_breaker import get_breaker
+from apps.digital.providers.latency import current_call, get_latency_tracker
+from apps.digital.providers.rate_limiter import get_bucket
+
+
+# Provider operations that go through the circuit breaker
+INSTRUMENTED_OPERATIONS = (
+    'purchase', 'purchase_batch', 'validate_phone_number', 'get_balance', 'verify_transaction'
+)
+ASYNC_INSTRUMENTED_OPERATIONS = ('apurchase', 'averify_transaction', 'aget_balance')
+
+# Idempotent operations that may be hedged with a second request
+HEDGED_OPERATIONS = ('verify_transaction', 'get_balance')
+
+_hedge_executor = None
+_hedge_executor_lock = threading.Lock()
+
+
+def _get_hedge_executor() -> ThreadPoolExecutor:
+    """
+    Get the thread pool running hedged provider calls, creating it on first use.
+    """
+    global _hedge_executor
+    
+    if _hedge_executor is None:
+        with _hedge_executor_lock:
+            if _hedge_executor is None:
+                _hedge_executor = ThreadPoolExecutor(
+                    max_workers=settings.PROVIDER_HEDGE_MAX_WORKERS,
+                    thread_name_prefix='provider-hedge'
+                )
+    
+    return _hedge_executor
+
+
+def _sync_operation(operation: str) -> str:
+    """
+    Map an async operation to its blocking counterpart, e.g. 'aget_balance'
+    to 'get_balance', so both share latency samples and timeouts.
+    """
+    if operation in ASYNC_INSTRUMENTED_OPERATIONS:
+        return operation[1:]
+    return operation
+
+
+def _instrument(operation: str, method):
+    """
+    Wrap a provider operation with the provider's before/after call hooks.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        wait = self._quota_wait(operation, args)
+        if wait is None:
+            return self._rate_limited_result(operation, args)
+        if wait:
+            time.sleep(wait)
+        
+        rejected = self._before_call(operation, args)
+        if rejected is not None:
+            return rejected
+        
+        in_flight = {'provider': self.name, 'operation': _sync_operation(operation)}
+        started = time.monotonic()
+        try:
+            with PROVIDER_CALLS_IN_FLIGHT.track_inprogress(**in_flight):
+                result = self._invoke(operation, method, args, kwargs)
+        except Exception as e:
+            self._after_call(operation, self.handle_error(e), time.monotonic() - started)
+            raise
+        
+        self._after_call(operation, result, time.monotonic() - started)
+        return result
+    
+    wrapper._instrumented = True
+    return wrapper
+
+
+def _instrument_async(operation: str, method):
+    """
+    Wrap an async provider operation with the provider's before/after call hooks.
+    """
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        wait = 0
+        if self._rate_limited(operation):
+            # The Redis round trip blocks, so keep it off the event loop
+            wait = await asyncio.to_thread(self._quota_wait, operation, args)
+        if wait is None:
+            return self._rate_limited_result(operation, args)
+        if wait:
+            await asyncio.sleep(wait)
+        
+        rejected = self._before_call(operation, args)
+        if rejected is not None:
+            return rejected
+        
+        in_flight = {'provider': self.name, 'operation': _sync_operation(operation)}
+        started = time.monotonic()
+        try:
+            with PROVIDER_CALLS_IN_FLIGHT.track_inprogress(**in_flight):
+                result = await self._ainvoke(operation, method, args, kwargs)
+        except Exception as e:
+            self._after_call(operation, self.handle_error(e), time.monotonic() - started)
+            raise
+        
+        self._after_call(operation, result, time.monotonic() - started)
+        return result
+    
+    wrapper._instrumented = True
+    return wrapper
 
 
 class BaseProvider(ABC):
     """
     Abstract base class for all digital service providers.
     All providers must implement these methods.
+    
+    The provider operations implemented by subclasses are wrapped so every
+    call first waits for its share of the provider's rate limit, then goes
+    through _before_call/_after_call, where the provider's circuit
+    breaker rejects calls while it is open and records each outcome,
+    successful call latencies feed adaptive timeouts and hedging, and latency,
+    outcome and in-flight metrics are recorded.
     """
     
+    # Registered name, set by ProviderFactory; names the circuit breaker and
+    # latency trackers. Defaults to the class name without 'Provider'.
+    name = None
+    
+    # Maximum recipients sent in one bulk request by providers with a bulk endpoint
+    max_batch_size = 100
+    
+    # Concurrent single purchases used by the default purchase_batch
+    batch_concurrency = 10
+    
+    # Set by providers whose async methods do non-blocking I/O rather than
+    # running the blocking methods in threads
+    supports_async = False
+    
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        
+        if cls.name is None:
+            cls.name = cls.__name__.lower().replace('provider', '')
+        
+        for operation in INSTRUMENTED_OPERATIONS + ASYNC_INSTRUMENTED_OPERATIONS:
+            method = cls.__dict__.get(operation)
+            
+            if method is None or getattr(method, '_instrumented', False):
+                continue
+            
+            if operation in ASYNC_INSTRUMENTED_OPERATIONS:
+                setattr(cls, operation, _instrument_async(operation, method))
+            else:
+                setattr(cls, operation, _instrument(operation, method))
+
     @abstractmethod
-    def purchase(self, transaction: Transaction) -> Dict[str, Any]:
+    def purchase(self, transaction: DigitalTransaction) -> Dict[str, Any]:
         """
         Execute a purchase transaction with the provider.
         
@@ -22,6 +181,115 @@ class BaseProvider(ABC):
         """
         pass
 
+    def purchase_batch(self,
+                       transactions: List[DigitalTransaction],
+                       max_workers: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Execute several purchase transactions with the provider.
+        
+        The default implementation makes concurrent single purchase calls.
+        Providers with a bulk endpoint should override this to send one request
+        per max_batch_size recipients.
+        
+        Args:
+            transactions: The transactions to purchase
+            max_workers: Maximum concurrent calls, defaults to batch_concurrency
+            
+        Returns:
+            List of provider responses, in the same order as transactions
+        """
+        if not transactions:
+            return []
+        
+        def purchase_one(transaction):
+            try:
+                return self.purchase(transaction)
+            except Exception as e:
+                return self.handle_error(e)
+        
+        workers = min(max_workers or self.batch_concurrency, len(transactions))
+        
+        if self.supports_async:
+            async def run():
+                try:
+                    return await self.apurchase_batch(transactions, workers)
+                finally:
+                    await self.aclose()
+            
+            return asyncio.run(run())
+        
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(purchase_one, transactions))
+
+    async def apurchase(self, transaction: DigitalTransaction) -> Dict[str, Any]:
+        """
+        Execute a purchase transaction with the provider without blocking the
+        event loop. Defaults to running purchase() in a thread.
+        
+        Related objects used in the payload (transaction.product) must already
+        be loaded, as the ORM cannot lazy-load them from async code.
+        
+        Args:
+            transaction: The transaction object containing purchase details
+            
+        Returns:
+            Dict containing provider response
+        """
+        return await asyncio.to_thread(self.purchase, transaction)
+
+    async def apurchase_batch(self,
+                              transactions: List[DigitalTransaction],
+                              max_concurrency: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Execute several purchases concurrently on the running event loop.
+        
+        Args:
+            transactions: The transactions to purchase
+            max_concurrency: Maximum in-flight calls, defaults to batch_concurrency
+            
+        Returns:
+            List of provider responses, in the same order as transactions
+        """
+        semaphore = asyncio.Semaphore(max_concurrency or self.batch_concurrency)
+        
+        async def purchase_one(transaction):
+            async with semaphore:
+                try:
+                    return await self.apurchase(transaction)
+                except Exception as e:
+                    return self.handle_error(e)
+        
+        return list(await asyncio.gather(*(purchase_one(t) for t in transactions)))
+
+    async def averify_transaction(self, transaction_id: str) -> Dict[str, Any]:
+        """
+        Verify a transaction with the provider without blocking the event loop.
+        Defaults to running verify_transaction() in a thread.
+        
+        Args:
+            transaction_id: The transaction ID to verify
+            
+        Returns:
+            Dict containing verification response
+        """
+        return await asyncio.to_thread(self.verify_transaction, transaction_id)
+
+    async def aget_balance(self) -> Dict[str, Any]:
+        """
+        Get the provider account balance without blocking the event loop.
+        Defaults to running get_balance() in a thread.
+        
+        Returns:
+            Dict containing balance information
+        """
+        return await asyncio.to_thread(self.get_balance)
+
+    async def aclose(self):
+        """
+        Release async resources held for the running event loop.
+        """
+        pass
+
     @abstractmethod
     def validate_phone_number(self, phone_number: str, network_provider_code: str) -> Dict[str, Any]:
         """
@@ -86,4 +354,222 @@ class BaseProvider(ABC):
             'message': str(error),
             'provider_response': None,
             'transaction_id': None,
-        }
\ No newline at end of file
+        }
+
+    @property
+    def breaker(self):
+        """
+        The circuit breaker tracking this provider's health.
+        """
+        return get_breaker(self.name)
+
+    def _invoke(self, operation: str, method, args: tuple, kwargs: dict) -> Any:
+        """
+        Call a wrapped operation, hedging idempotent ones.
+        
+        A hedged call fires a second identical request once the first has
+        taken longer than the operation's PROVIDER_HEDGE_PERCENTILE latency,
+        and returns whichever successful answer arrives first.
+        """
+        token = current_call.set((self.name, operation))
+        try:
+            delay = self._hedge_delay(operation)
+            
+            if delay is None:
+                return method(self, *args, **kwargs)
+            
+            executor = _get_hedge_executor()
+            
+            def submit():
+                # Each thread needs its own copy of the context carrying current_call
+                return executor.submit(contextvars.copy_context().run, method, self, *args, **kwargs)
+            
+            first = submit()
+            try:
+                return first.result(timeout=delay)
+            except FutureTimeoutError:
+                pass
+            
+            result = None
+            for future in as_completed([first, submit()]):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = self.handle_error(e)
+                
+                if result.get('status') != 'error':
+                    return result
+            
+            return result
+        finally:
+            current_call.reset(token)
+
+    async def _ainvoke(self, operation: str, method, args: tuple, kwargs: dict) -> Any:
+        """
+        Await a wrapped async operation, hedging idempotent ones. The slower
+        request is cancelled once an answer is taken.
+        """
+        token = current_call.set((self.name, _sync_operation(operation)))
+        try:
+            delay = self._hedge_delay(_sync_operation(operation))
+            
+            if delay is None:
+                return await method(self, *args, **kwargs)
+            
+            first = asyncio.ensure_future(method(self, *args, **kwargs))
+            done, _ = await asyncio.wait({first}, timeout=delay)
+            
+            if done:
+                return first.result()
+            
+            pending = {first, asyncio.ensure_future(method(self, *args, **kwargs))}
+            result = None
+            try:
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    
+                    for task in done:
+                        try:
+                            result = task.result()
+                        except Exception as e:
+                            result = self.handle_error(e)
+                        
+                        if result.get('status') != 'error':
+                            return result
+                
+                return result
+            finally:
+                for task in pending:
+                    task.cancel()
+        finally:
+            current_call.reset(token)
+
+    def _hedge_delay(self, operation: str) -> Optional[float]:
+        """
+        Get how long to wait before hedging an operation.
+        
+        Returns:
+            Delay in seconds, or None if the operation should not be hedged
+        """
+        if not settings.PROVIDER_HEDGING or operation not in HEDGED_OPERATIONS:
+            return None
+        
+        return get_latency_tracker(self.name, operation).percentile(
+            settings.PROVIDER_HEDGE_PERCENTILE
+        )
+
+    def _before_call(self, operation: str, args: tuple) -> Optional[Any]:
+        """
+        Run before a provider operation.
+        
+        Args:
+            operation: Name of the operation being called
+            args: Positional arguments of the call
+            
+        Returns:
+            None to let the call through, or the result to return instead
+        """
+        if self.breaker.allow_request():
+            return None
+        
+        return self._rejected_result(
+            operation, args, f"Provider {self.name} is unavailable (circuit open)", 'rejected'
+        )
+
+    def _rate_limited(self, operation: str) -> bool:
+        """
+        Check whether an operation has a rate limit in PROVIDER_RATE_LIMITS.
+        """
+        return get_bucket(self.name, _sync_operation(operation)) is not None
+
+    def _quota_wait(self, operation: str, args: tuple) -> Optional[float]:
+        """
+        Reserve the requests of an operation from its provider's rate limit.
+        
+        Args:
+            operation: Name of the operation being called
+            args: Positional arguments of the call
+            
+        Returns:
+            Seconds to wait before calling the provider, or None if the wait
+            would exceed PROVIDER_RATE_LIMIT_MAX_WAIT
+        """
+        bucket = get_bucket(self.name, _sync_operation(operation))
+        
+        if bucket is None:
+            return 0
+        
+        # Bulk endpoints take max_batch_size recipients per request
+        cost = math.ceil(len(args[0]) / self.max_batch_size) if operation == 'purchase_batch' else 1
+        wait = bucket.reserve(max(cost, 1))
+        
+        if wait is not None:
+            PROVIDER_RATE_LIMIT_WAIT.observe(wait, provider=self.name, operation=_sync_operation(operation))
+        
+        return wait
+
+    def _rate_limited_result(self, operation: str, args: tuple) -> Any:
+        """
+        Result returned for a call refused by the provider's rate limit.
+        """
+        return self._rejected_result(
+            operation, args, f"Provider {self.name} rate limit exceeded", 'rate_limited'
+        )
+
+    def _rejected_result(self, operation: str, args: tuple, message: str, outcome: str) -> Any:
+        """
+        Count a call refused before reaching the provider and build its result.
+        
+        Args:
+            operation: Name of the operation being called
+            args: Positional arguments of the call
+            message: Error message of the result
+            outcome: Outcome label of the provider_calls_total metric
+            
+        Returns:
+            An error response, or one per transaction for purchase_batch.
+            'rejected' is set because, unlike other errors, the request is
+            known not to have reached the provider.
+        """
+        PROVIDER_CALLS.inc(
+            len(args[0]) if operation == 'purchase_batch' else 1,
+            provider=self.name, operation=_sync_operation(operation), outcome=outcome
+        )
+        
+        rejected = {
+            'status': 'error',
+            'message': message,
+            'provider_response': None,
+            'transaction_id': None,
+            'rejected': True,
+        }
+        
+        if operation == 'purchase_batch':
+            return [dict(rejected) for _ in args[0]]
+        return rejected
+
+    def _after_call(self, operation: str, result: Any, latency: float):
+        """
+        Run after a provider operation that was let through.
+        
+        Args:
+            operation: Name of the operation that was called
+            result: The operation's response (a list for purchase_batch)
+            latency: Call duration in seconds
+        """
+        labels = {'provider': self.name, 'operation': _sync_operation(operation)}
+        outcomes = [item.get('status') for item in (result if isinstance(result, list) else [result])]
+        
+        for outcome in outcomes:
+            PROVIDER_CALLS.inc(
+                outcome=outcome if outcome in ('success', 'failed') else 'error', **labels
+            )
+        PROVIDER_CALL_DURATION.observe(latency, **labels)
+        
+        errors = outcomes.count('error')
+        failed = bool(outcomes) and errors * 2 > len(outcomes)
+        
+        self.breaker.record(failed, latency)
+        
+        if not failed and operation != 'purchase_batch':
+            get_latency_tracker(self.name, _sync_operation(operation)).record(latency)
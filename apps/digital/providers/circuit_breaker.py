@@ -0,0 +1,176 @@
+import threading
+import time
+from collections import deque
+from typing import Dict
+from django.conf import settings
+
+
+class CircuitBreaker:
+    """
+    Per-provider circuit breaker over a rolling window of call outcomes.
+    
+    The circuit opens when either the error rate or the share of slow calls in
+    the window crosses its threshold, after which calls are rejected without
+    touching the provider. Once OPEN_SECONDS have passed a single probe call
+    is let through (half-open); its outcome closes or re-opens the circuit.
+    
+    State is kept per process, so every worker stops calling a failing
+    provider after its own first few failures, without a shared-store round
+    trip on every call.
+    """
+    
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+    
+    def __init__(self, name: str):
+        self.name = name
+        self.window_seconds = settings.PROVIDER_BREAKER_WINDOW_SECONDS
+        self.min_calls = settings.PROVIDER_BREAKER_MIN_CALLS
+        self.error_rate_threshold = settings.PROVIDER_BREAKER_ERROR_RATE
+        self.slow_call_seconds = settings.PROVIDER_BREAKER_SLOW_CALL_SECONDS
+        self.slow_call_rate_threshold = settings.PROVIDER_BREAKER_SLOW_CALL_RATE
+        self.open_seconds = settings.PROVIDER_BREAKER_OPEN_SECONDS
+        
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._calls = deque()  # (timestamp, failed, slow)
+        self._lock = threading.Lock()
+
+    def is_available(self) -> bool:
+        """
+        Whether a call would currently be allowed, without reserving it.
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                return time.monotonic() - self.opened_at >= self.open_seconds
+            return not self._probe_in_flight
+
+    def allow_request(self) -> bool:
+        """
+        Reserve a call. In the half-open state only one probe is allowed.
+        
+        Returns:
+            True if the call may go to the provider
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.open_seconds:
+                    return False
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            
+            if self._probe_in_flight:
+                return False
+            
+            self._probe_in_flight = True
+            return True
+
+    def record(self, failed: bool, latency: float):
+        """
+        Record the outcome of a call that was allowed through.
+        
+        Args:
+            failed: Whether the call failed (transport error or timeout)
+            latency: Call duration in seconds
+        """
+        now = time.monotonic()
+        slow = latency >= self.slow_call_seconds
+        
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probe_in_flight = False
+                
+                if failed or slow:
+                    self._open(now)
+                else:
+                    self.state = self.CLOSED
+                    self._calls.clear()
+                return
+            
+            self._calls.append((now, failed, slow))
+            self._trim(now)
+            
+            if self.state == self.CLOSED and self._should_open():
+                self._open(now)
+
+    def health_score(self) -> float:
+        """
+        Score the provider between 0 (unusable) and 1 (healthy) from its
+        rolling error and slow call rates. Until the window holds min_calls
+        calls there is too little evidence and the provider scores 1.
+        """
+        if not self.is_available():
+            return 0.0
+        
+        with self._lock:
+            self._trim(time.monotonic())
+            total = len(self._calls)
+            
+            if total < self.min_calls:
+                return 1.0
+            
+            failures = sum(1 for _, failed, _ in self._calls if failed)
+            slow_calls = sum(1 for _, _, slow in self._calls if slow)
+        
+        return (1 - failures / total) * (1 - 0.5 * slow_calls / total)
+
+    def _should_open(self) -> bool:
+        """
+        Whether the window holds enough calls and crosses a threshold.
+        """
+        total = len(self._calls)
+        
+        if total < self.min_calls:
+            return False
+        
+        failures = sum(1 for _, failed, _ in self._calls if failed)
+        slow_calls = sum(1 for _, _, slow in self._calls if slow)
+        
+        return (failures / total >= self.error_rate_threshold
+                or slow_calls / total >= self.slow_call_rate_threshold)
+
+    def _open(self, now: float):
+        """
+        Open the circuit and start a fresh window for after it closes.
+        """
+        self.state = self.OPEN
+        self.opened_at = now
+        self._calls.clear()
+
+    def _trim(self, now: float):
+        """
+        Drop calls older than the rolling window.
+        """
+        cutoff = now - self.window_seconds
+        while self._calls and self._calls[0][0] < cutoff:
+            self._calls.popleft()
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """
+    Get the circuit breaker of a provider, creating it on first use.
+    
+    Args:
+        name: Provider name
+    
+    Returns:
+        The provider's CircuitBreaker
+    """
+    breaker = _breakers.get(name)
+    
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.setdefault(name, CircuitBreaker(name))
+    
+    return breaker
@@ -0,0 +1,106 @@
+import threading
+from collections import deque
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+from django.conf import settings
+
+
+# (provider name, operation) of the provider call running in this context,
+# set by BaseProvider so the transport can pick that operation's timeout
+current_call: ContextVar[Optional[Tuple[str, str]]] = ContextVar('provider_call', default=None)
+
+# Read-only operations whose timeout may adapt to observed latency. A purchase
+# that times out early may still be applied by the provider, so it keeps the
+# static read timeout.
+ADAPTIVE_TIMEOUT_OPERATIONS = ('verify_transaction', 'get_balance', 'validate_phone_number')
+
+
+class LatencyTracker:
+    """
+    Rolling sample of successful call latencies for one provider operation.
+    """
+    
+    def __init__(self, sample_size: int):
+        self._samples = deque(maxlen=sample_size)
+        self._lock = threading.Lock()
+
+    def record(self, latency: float):
+        """
+        Add a latency sample in seconds.
+        """
+        with self._lock:
+            self._samples.append(latency)
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        """
+        Get a latency percentile.
+        
+        Args:
+            percentile: Percentile between 0 and 100
+        
+        Returns:
+            Latency in seconds, or None until PROVIDER_LATENCY_MIN_SAMPLES
+            samples have been recorded
+        """
+        with self._lock:
+            if len(self._samples) < settings.PROVIDER_LATENCY_MIN_SAMPLES:
+                return None
+            samples = sorted(self._samples)
+        
+        index = min(len(samples) - 1, int(len(samples) * percentile / 100))
+        return samples[index]
+
+
+_trackers: Dict[Tuple[str, str], LatencyTracker] = {}
+_trackers_lock = threading.Lock()
+
+
+def get_latency_tracker(provider_name: str, operation: str) -> LatencyTracker:
+    """
+    Get the latency tracker of a provider operation, creating it on first use.
+    
+    Args:
+        provider_name: Provider name
+        operation: Provider operation, e.g. 'purchase'
+    
+    Returns:
+        The operation's LatencyTracker
+    """
+    key = (provider_name, operation)
+    tracker = _trackers.get(key)
+    
+    if tracker is None:
+        with _trackers_lock:
+            tracker = _trackers.setdefault(
+                key, LatencyTracker(settings.PROVIDER_LATENCY_SAMPLE_SIZE)
+            )
+    
+    return tracker
+
+
+def adaptive_read_timeout(provider_name: str, operation: str) -> Optional[float]:
+    """
+    Derive a read timeout from an operation's observed p99 latency.
+    
+    The p99 is scaled by PROVIDER_ADAPTIVE_TIMEOUT_MULTIPLIER and kept between
+    PROVIDER_ADAPTIVE_TIMEOUT_MIN and the static PROVIDER_HTTP_READ_TIMEOUT.
+    
+    Args:
+        provider_name: Provider name
+        operation: Provider operation
+    
+    Returns:
+        Timeout in seconds, or None when adaptive timeouts are disabled, the
+        operation is not in ADAPTIVE_TIMEOUT_OPERATIONS or there are not
+        enough samples yet
+    """
+    if not settings.PROVIDER_ADAPTIVE_TIMEOUTS or operation not in ADAPTIVE_TIMEOUT_OPERATIONS:
+        return None
+    
+    p99 = get_latency_tracker(provider_name, operation).percentile(99)
+    
+    if p99 is None:
+        return None
+    
+    timeout = p99 * settings.PROVIDER_ADAPTIVE_TIMEOUT_MULTIPLIER
+    return min(max(timeout, settings.PROVIDER_ADAPTIVE_TIMEOUT_MIN), settings.PROVIDER_HTTP_READ_TIMEOUT)
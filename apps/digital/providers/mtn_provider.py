@@ -1,8 +1,10 @@
+import httpx
 import requests
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 from apps.digital.providers.base_provider import BaseProvider
-from apps.digital.models import Transaction
+from apps.digital.providers.transport import ProviderTransport
+from apps.digital.models import DigitalTransaction
 from core.exceptions import ProviderException
 
 
@@ -14,6 +16,8 @@ class MTNProvider(BaseProvider):
     MTN Provider Implementation
     """
     
+    supports_async = True
+    
     def __init__(self):
         self.base_url = "https://api.mtn.com/v1"  # Placeholder URL
         self.api_key = None  # Will be set from settings
@@ -21,8 +25,9 @@ class MTNProvider(BaseProvider):
             'Content-Type': 'application/json',
             'Authorization': f'Bearer {self.api_key}'
         }
+        self.transport = ProviderTransport('mtn')
 
-    def purchase(self, transaction: Transaction) -> Dict[str, Any]:
+    def purchase(self, transaction: DigitalTransaction) -> Dict[str, Any]:
         """
         Execute a purchase transaction with MTN.
         """
@@ -37,7 +42,7 @@ class MTNProvider(BaseProvider):
             }
             
             # Make API call to MTN
-            response = requests.post(
+            response = self.transport.post(
                 f"{self.base_url}/data-purchase",  # Placeholder endpoint
                 json=payload,
                 headers=self.headers
@@ -63,6 +68,97 @@ class MTNProvider(BaseProvider):
             logger.error(f"MTN Provider unexpected error: {str(e)}")
             return self.handle_error(e)
 
+    def purchase_batch(self,
+                       transactions: List[DigitalTransaction],
+                       max_workers: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Execute purchase transactions with MTN's bulk endpoint, one request per
+        max_batch_size recipients.
+        """
+        responses = []
+        
+        for start in range(0, len(transactions), self.max_batch_size):
+            batch = transactions[start:start + self.max_batch_size]
+            responses.extend(self._purchase_bulk(batch))
+        
+        return responses
+
+    def _purchase_bulk(self, transactions: List[DigitalTransaction]) -> List[Dict[str, Any]]:
+        """
+        Send one bulk purchase request and match the results back by reference.
+        """
+        try:
+            payload = {
+                'items': [
+                    {
+                        'recipient_phone': transaction.phone_number,
+                        'product_code': transaction.product.code,
+                        'amount': float(transaction.amount),
+                        'reference': transaction.reference,
+                        'customer_reference': str(transaction.id)
+                    }
+                    for transaction in transactions
+                ]
+            }
+            
+            response = self.transport.post(
+                f"{self.base_url}/data-purchase/bulk",  # Placeholder endpoint
+                json=payload,
+                headers=self.headers
+            )
+            
+            response_data = response.json()
+            
+            if response.status_code != 200:
+                message = response_data.get('message', 'Bulk purchase rejected')
+                return [
+                    {
+                        'status': 'failed',
+                        'provider_response': self.format_response(response_data),
+                        'transaction_id': None,
+                        'message': message,
+                        'provider': 'MTN'
+                    }
+                    for _ in transactions
+                ]
+            
+            results = {
+                item.get('reference'): item
+                for item in response_data.get('results', [])
+            }
+            
+            responses = []
+            for transaction in transactions:
+                item = results.get(transaction.reference)
+                
+                if item is None:
+                    responses.append({
+                        'status': 'failed',
+                        'provider_response': None,
+                        'transaction_id': None,
+                        'message': 'Missing from bulk purchase response',
+                        'provider': 'MTN'
+                    })
+                    continue
+                
+                formatted_response = self.format_response(item)
+                responses.append({
+                    'status': 'success' if item.get('status') == 'success' else 'failed',
+                    'provider_response': formatted_response,
+                    'transaction_id': formatted_response.get('transaction_id'),
+                    'message': formatted_response.get('message', 'Transaction processed'),
+                    'provider': 'MTN'
+                })
+            
+            return responses
+            
+        except requests.exceptions.RequestException as e:
+            logger.error(f"MTN Provider bulk API error: {str(e)}")
+            return [self.handle_error(e) for _ in transactions]
+        except Exception as e:
+            logger.error(f"MTN Provider bulk unexpected error: {str(e)}")
+            return [self.handle_error(e) for _ in transactions]
+
     def validate_phone_number(self, phone_number: str, network_provider_code: str) -> Dict[str, Any]:
         """
         Validate a phone number with MTN.
@@ -73,7 +169,7 @@ class MTNProvider(BaseProvider):
                 'network_code': network_provider_code
             }
             
-            response = requests.post(
+            response = self.transport.post(
                 f"{self.base_url}/validate-phone",
                 json=payload,
                 headers=self.headers
@@ -100,7 +196,7 @@ class MTNProvider(BaseProvider):
         Get MTN provider account balance.
         """
         try:
-            response = requests.get(
+            response = self.transport.get(
                 f"{self.base_url}/balance",
                 headers=self.headers
             )
@@ -126,7 +222,7 @@ class MTNProvider(BaseProvider):
         Verify a transaction with MTN.
         """
         try:
-            response = requests.get(
+            response = self.transport.get(
                 f"{self.base_url}/verify-transaction/{transaction_id}",
                 headers=self.headers
             )
@@ -147,6 +243,102 @@ class MTNProvider(BaseProvider):
             logger.error(f"MTN Transaction verification unexpected error: {str(e)}")
             return self.handle_error(e)
 
+    async def apurchase(self, transaction: DigitalTransaction) -> Dict[str, Any]:
+        """
+        Execute a purchase transaction with MTN without blocking the event loop.
+        """
+        try:
+            payload = {
+                'recipient_phone': transaction.phone_number,
+                'product_code': transaction.product.code,
+                'amount': float(transaction.amount),
+                'reference': transaction.reference,
+                'customer_reference': str(transaction.id)
+            }
+            
+            response = await self.transport.apost(
+                f"{self.base_url}/data-purchase",  # Placeholder endpoint
+                json=payload,
+                headers=self.headers
+            )
+            
+            response_data = response.json()
+            
+            formatted_response = self.format_response(response_data)
+            
+            return {
+                'status': 'success' if response.status_code == 200 else 'failed',
+                'provider_response': formatted_response,
+                'transaction_id': formatted_response.get('transaction_id'),
+                'message': formatted_response.get('message', 'Transaction processed'),
+                'provider': 'MTN'
+            }
+            
+        except httpx.HTTPError as e:
+            logger.error(f"MTN Provider API error: {str(e)}")
+            return self.handle_error(e)
+        except Exception as e:
+            logger.error(f"MTN Provider unexpected error: {str(e)}")
+            return self.handle_error(e)
+
+    async def aget_balance(self) -> Dict[str, Any]:
+        """
+        Get MTN provider account balance without blocking the event loop.
+        """
+        try:
+            response = await self.transport.aget(
+                f"{self.base_url}/balance",
+                headers=self.headers
+            )
+            
+            response_data = response.json()
+            
+            return {
+                'status': 'success' if response.status_code == 200 else 'failed',
+                'balance': response_data.get('balance'),
+                'currency': response_data.get('currency', 'GHS'),
+                'provider_response': response_data
+            }
+            
+        except httpx.HTTPError as e:
+            logger.error(f"MTN Balance check error: {str(e)}")
+            return self.handle_error(e)
+        except Exception as e:
+            logger.error(f"MTN Balance check unexpected error: {str(e)}")
+            return self.handle_error(e)
+
+    async def averify_transaction(self, transaction_id: str) -> Dict[str, Any]:
+        """
+        Verify a transaction with MTN without blocking the event loop.
+        """
+        try:
+            response = await self.transport.aget(
+                f"{self.base_url}/verify-transaction/{transaction_id}",
+                headers=self.headers
+            )
+            
+            response_data = response.json()
+            
+            return {
+                'status': 'success' if response.status_code == 200 else 'failed',
+                'verified': response_data.get('verified', False),
+                'status_message': response_data.get('status'),
+                'provider_response': response_data
+            }
+            
+        except httpx.HTTPError as e:
+            logger.error(f"MTN Transaction verification error: {str(e)}")
+            return self.handle_error(e)
+        except Exception as e:
+            logger.error(f"MTN Transaction verification unexpected error: {str(e)}")
+            return self.handle_error(e)
+
+    async def aclose(self):
+        """
+        Close the async HTTP client of the running event loop.
+        """
+        await self.transport.aclose()
+
     def format_response(self, response: Dict[str, Any]) -> Dict[str, Any]:
         """
         Format MTN provider response to standard format.
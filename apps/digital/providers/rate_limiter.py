@@ -0,0 +1,136 @@
+import logging
+import threading
+from typing import Dict, Optional
+import redis
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+# Reserve `cost` tokens from a bucket refilled at `rate` tokens per second up
+# to `capacity`. The reservation may drive the bucket negative, which queues
+# callers in arrival order: the returned wait is how long this caller must
+# sleep before its tokens exist. Reservations waiting longer than `max_wait`
+# are not taken and the wait is returned negated. Time comes from the Redis
+# server so workers with skewed clocks share one bucket correctly.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local max_wait = tonumber(ARGV[4])
+
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(state[1]) or capacity
+local updated_at = tonumber(state[2]) or now
+
+tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * rate)
+tokens = tokens - cost
+
+local wait = 0
+if tokens < 0 then
+    wait = -tokens / rate
+end
+
+if wait > max_wait then
+    return tostring(-wait)
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated_at', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil((capacity / rate + wait) * 1000) + 1000)
+return tostring(wait)
+"""
+
+_client = None
+_script = None
+_client_lock = threading.Lock()
+
+
+def _get_script():
+    """
+    Get the registered token bucket script, connecting to Redis on first use.
+    """
+    global _client, _script
+    
+    if _script is None:
+        with _client_lock:
+            if _script is None:
+                _client = redis.Redis.from_url(
+                    settings.REDIS_URL,
+                    socket_timeout=settings.PROVIDER_RATE_LIMIT_REDIS_TIMEOUT,
+                    socket_connect_timeout=settings.PROVIDER_RATE_LIMIT_REDIS_TIMEOUT
+                )
+                _script = _client.register_script(TOKEN_BUCKET_SCRIPT)
+    
+    return _script
+
+
+class TokenBucket:
+    """
+    Token bucket shared by every process through Redis.
+    
+    One bucket exists per provider operation with a limit in
+    PROVIDER_RATE_LIMITS. It refills at the configured requests per second
+    and holds PROVIDER_RATE_LIMIT_BURST_SECONDS worth of tokens, so callers
+    over the quota wait their turn instead of reaching the provider and
+    getting 429s.
+    
+    If Redis cannot be reached calls are let through unthrottled.
+    """
+    
+    def __init__(self, provider: str, operation: str, rate: float):
+        self.key = f"provider_rate:{provider}:{operation}"
+        self.rate = float(rate)
+        self.capacity = max(1.0, self.rate * settings.PROVIDER_RATE_LIMIT_BURST_SECONDS)
+
+    def reserve(self, cost: float = 1, max_wait: Optional[float] = None) -> Optional[float]:
+        """
+        Take tokens from the bucket.
+        
+        Args:
+            cost: Number of requests the call will make
+            max_wait: Longest acceptable wait in seconds, defaults to
+                PROVIDER_RATE_LIMIT_MAX_WAIT
+        
+        Returns:
+            Seconds to wait before calling the provider, or None if the wait
+            would exceed max_wait and nothing was reserved
+        """
+        if max_wait is None:
+            max_wait = settings.PROVIDER_RATE_LIMIT_MAX_WAIT
+        
+        try:
+            wait = float(_get_script()(keys=[self.key], args=[self.rate, self.capacity, cost, max_wait]))
+        except redis.RedisError as e:
+            logger.warning(f"Rate limiter unavailable for {self.key}, not throttling: {str(e)}")
+            return 0.0
+        
+        return None if wait < 0 else wait
+
+
+_buckets: Dict[tuple, Optional[TokenBucket]] = {}
+_buckets_lock = threading.Lock()
+
+
+def get_bucket(provider: str, operation: str) -> Optional[TokenBucket]:
+    """
+    Get the token bucket of a provider operation.
+    
+    PROVIDER_RATE_LIMITS maps provider names to requests per second by
+    operation, with '*' applying to operations not listed.
+    
+    Returns:
+        The bucket, or None if the operation is not rate limited
+    """
+    key = (provider, operation)
+    
+    if key not in _buckets:
+        with _buckets_lock:
+            if key not in _buckets:
+                limits = settings.PROVIDER_RATE_LIMITS.get(provider, {})
+                rate = limits.get(operation, limits.get('*'))
+                _buckets[key] = TokenBucket(provider, operation, rate) if rate else None
+    
+    return _buckets[key]
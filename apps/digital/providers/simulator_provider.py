@@ -0,0 +1,284 @@
+import asyncio
+import hashlib
+import heapq
+import hmac
+import json
+import logging
+import math
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any
+from django.conf import settings
+from apps.digital.providers.base_provider import BaseProvider
+from apps.digital.providers.transport import ProviderTransport
+from apps.digital.models import DigitalTransaction
+from core.identifiers import ulid
+
+
+logger = logging.getLogger(__name__)
+
+
+class SimulatorProvider(BaseProvider):
+    """
+    Offline stand-in for a real provider, for load tests and CI.
+    
+    Calls take a log-normally distributed time (PROVIDER_SIMULATOR_LATENCY_MS
+    median, PROVIDER_SIMULATOR_LATENCY_SIGMA spread), fail with
+    PROVIDER_SIMULATOR_FAILURE_RATE and hang until the transport read timeout
+    with PROVIDER_SIMULATOR_TIMEOUT_RATE. Successful purchases are confirmed
+    with a signed webhook POSTed to PROVIDER_SIMULATOR_WEBHOOK_URL after
+    PROVIDER_SIMULATOR_WEBHOOK_DELAY_MS.
+    
+    Enable with PROVIDER_SIMULATOR_ENABLED; the simulator is then registered
+    in place of every provider listed in PROVIDER_SIMULATOR_NETWORKS.
+    """
+    
+    supports_async = True
+    
+    def __init__(self):
+        self.transport = ProviderTransport('simulator')
+        self.latency_mu = math.log(settings.PROVIDER_SIMULATOR_LATENCY_MS / 1000)
+        self.latency_sigma = settings.PROVIDER_SIMULATOR_LATENCY_SIGMA
+        self.failure_rate = settings.PROVIDER_SIMULATOR_FAILURE_RATE
+        self.timeout_rate = settings.PROVIDER_SIMULATOR_TIMEOUT_RATE
+
+    def purchase(self, transaction: DigitalTransaction) -> Dict[str, Any]:
+        """
+        Simulate a purchase, blocking for the simulated latency.
+        """
+        outcome, delay = self._draw()
+        time.sleep(delay)
+        return self._purchase_response(transaction, outcome)
+
+    async def apurchase(self, transaction: DigitalTransaction) -> Dict[str, Any]:
+        """
+        Simulate a purchase without blocking the event loop.
+        """
+        outcome, delay = self._draw()
+        await asyncio.sleep(delay)
+        return self._purchase_response(transaction, outcome)
+
+    def validate_phone_number(self, phone_number: str, network_provider_code: str) -> Dict[str, Any]:
+        """
+        Simulate a phone number validation.
+        """
+        outcome, delay = self._draw()
+        time.sleep(delay)
+        
+        if outcome != 'success':
+            return self._error_response(outcome)
+        
+        return {
+            'status': 'success',
+            'valid': True,
+            'message': 'Phone number validation completed',
+            'provider_response': {'phone_number': phone_number, 'network_code': network_provider_code}
+        }
+
+    def get_balance(self) -> Dict[str, Any]:
+        """
+        Simulate a balance check.
+        """
+        outcome, delay = self._draw()
+        time.sleep(delay)
+        return self._balance_response(outcome)
+
+    async def aget_balance(self) -> Dict[str, Any]:
+        """
+        Simulate a balance check without blocking the event loop.
+        """
+        outcome, delay = self._draw()
+        await asyncio.sleep(delay)
+        return self._balance_response(outcome)
+
+    def verify_transaction(self, transaction_id: str) -> Dict[str, Any]:
+        """
+        Simulate a transaction verification.
+        """
+        outcome, delay = self._draw()
+        time.sleep(delay)
+        return self._verify_response(transaction_id, outcome)
+
+    async def averify_transaction(self, transaction_id: str) -> Dict[str, Any]:
+        """
+        Simulate a transaction verification without blocking the event loop.
+        """
+        outcome, delay = self._draw()
+        await asyncio.sleep(delay)
+        return self._verify_response(transaction_id, outcome)
+
+    async def aclose(self):
+        """
+        Close the async HTTP client of the running event loop.
+        """
+        await self.transport.aclose()
+
+    def _draw(self):
+        """
+        Draw the outcome ('success', 'failed' or 'timeout') and duration of a call.
+        """
+        roll = random.random()
+        
+        if roll < self.timeout_rate:
+            return 'timeout', self.transport.current_timeout()[1]
+        
+        delay = random.lognormvariate(self.latency_mu, self.latency_sigma)
+        
+        if roll < self.timeout_rate + self.failure_rate:
+            return 'failed', delay
+        
+        return 'success', delay
+
+    def _purchase_response(self, transaction: DigitalTransaction, outcome: str) -> Dict[str, Any]:
+        """
+        Build a purchase response and schedule its webhook.
+        """
+        if outcome == 'timeout':
+            return self._error_response(outcome)
+        
+        provider_transaction_id = f"SIM{ulid()}"
+        status = 'success' if outcome == 'success' else 'failed'
+        message = 'Transaction processed' if outcome == 'success' else 'Simulated provider failure'
+        
+        provider_response = {
+            'transaction_id': provider_transaction_id,
+            'reference': transaction.reference,
+            'message': message,
+        }
+        
+        if outcome == 'success':
+            _callbacks.schedule(self, {
+                'transaction_id': provider_transaction_id,
+                'status': 'success',
+                'provider_response': provider_response,
+            })
+        
+        return {
+            'status': status,
+            'provider_response': provider_response,
+            'transaction_id': provider_transaction_id,
+            'message': message,
+            'provider': 'Simulator'
+        }
+
+    def _balance_response(self, outcome: str) -> Dict[str, Any]:
+        """
+        Build a balance response.
+        """
+        if outcome != 'success':
+            return self._error_response(outcome)
+        
+        return {
+            'status': 'success',
+            'balance': str(settings.PROVIDER_SIMULATOR_BALANCE),
+            'currency': 'GHS',
+            'provider_response': {}
+        }
+
+    def _verify_response(self, transaction_id: str, outcome: str) -> Dict[str, Any]:
+        """
+        Build a verification response.
+        """
+        if outcome != 'success':
+            return self._error_response(outcome)
+        
+        return {
+            'status': 'success',
+            'verified': True,
+            'status_message': 'success',
+            'provider_response': {'transaction_id': transaction_id}
+        }
+
+    def _error_response(self, outcome: str) -> Dict[str, Any]:
+        """
+        Build the response of a simulated failure or timeout.
+        """
+        if outcome == 'timeout':
+            return self.handle_error(TimeoutError('Simulated provider timeout'))
+        return self.handle_error(RuntimeError('Simulated provider failure'))
+
+
+class _CallbackDispatcher:
+    """
+    Sends simulated webhooks once they are due.
+    
+    A single timer thread keeps due times in a heap and hands due callbacks to
+    a small thread pool, so thousands of pending callbacks cost no threads.
+    """
+    
+    def __init__(self):
+        self._heap = []
+        self._condition = threading.Condition()
+        self._executor = None
+        self._thread = None
+        self._sequence = 0
+
+    def schedule(self, provider: SimulatorProvider, payload: Dict[str, Any]):
+        """
+        Queue a webhook for delivery after PROVIDER_SIMULATOR_WEBHOOK_DELAY_MS.
+        """
+        if not settings.PROVIDER_SIMULATOR_WEBHOOK_URL:
+            return
+        
+        due = time.monotonic() + settings.PROVIDER_SIMULATOR_WEBHOOK_DELAY_MS / 1000
+        
+        with self._condition:
+            if self._thread is None:
+                self._executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='simulator-webhook')
+                self._thread = threading.Thread(target=self._run, name='simulator-webhooks', daemon=True)
+                self._thread.start()
+            
+            # The sequence number keeps heap entries comparable for equal due times
+            self._sequence += 1
+            heapq.heappush(self._heap, (due, self._sequence, provider, payload))
+            self._condition.notify()
+
+    def _run(self):
+        """
+        Wait for the next due callback and submit it.
+        """
+        while True:
+            with self._condition:
+                while not self._heap or self._heap[0][0] > time.monotonic():
+                    timeout = self._heap[0][0] - time.monotonic() if self._heap else None
+                    self._condition.wait(timeout)
+                
+                _, _, provider, payload = heapq.heappop(self._heap)
+            
+            self._executor.submit(self._send, provider, payload)
+
+    @staticmethod
+    def _send(provider: SimulatorProvider, payload: Dict[str, Any]):
+        """
+        POST a webhook, signed like the real provider would sign it.
+        """
+        body = json.dumps(payload).encode('utf-8')
+        headers = {'Content-Type': 'application/json'}
+        
+        secret = getattr(settings, f'{provider.name.upper()}_WEBHOOK_SECRET', None)
+        if secret:
+            headers['X-Signature'] = hmac.new(secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+        
+        url = settings.PROVIDER_SIMULATOR_WEBHOOK_URL.format(provider=provider.name)
+        
+        try:
+            provider.transport.post(url, data=body, headers=headers)
+        except Exception as e:
+            logger.warning(f"Simulator webhook to {url} failed: {str(e)}")
+
+
+_callbacks = _CallbackDispatcher()
+
+
+def register_simulator():
+    """
+    Register the simulator in place of the providers in PROVIDER_SIMULATOR_NETWORKS.
+    """
+    from apps.digital.services.provider_factory import ProviderFactory
+    
+    for name in settings.PROVIDER_SIMULATOR_NETWORKS:
+        ProviderFactory.register_provider(name, SimulatorProvider)
+    
+    logger.warning(f"Provider simulator registered for: {', '.join(settings.PROVIDER_SIMULATOR_NETWORKS)}")
@@ -0,0 +1,155 @@
+import asyncio
+import threading
+import weakref
+from typing import Optional
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from apps.digital.providers.latency import adaptive_read_timeout, current_call
+
+
+class ProviderTransport:
+    """
+    HTTP transport shared by all calls to one provider.
+    
+    Wraps a requests.Session with its own keep-alive connection pool, so
+    purchases reuse open TCP/TLS connections instead of handshaking on every
+    call, and applies connect/read timeouts to every request so a hung
+    provider cannot pin a worker. Once enough latency samples exist for the
+    calling operation the read timeout adapts to its observed p99.
+    
+    The async methods use an httpx.AsyncClient with the same pool size and
+    timeouts. Async clients are bound to an event loop, so one is kept per
+    running loop and should be closed with aclose() before the loop ends.
+    """
+    
+    def __init__(self,
+                 name: str,
+                 connect_timeout: Optional[float] = None,
+                 read_timeout: Optional[float] = None,
+                 pool_size: Optional[int] = None):
+        self.name = name
+        self.timeout = (
+            connect_timeout or settings.PROVIDER_HTTP_CONNECT_TIMEOUT,
+            read_timeout or settings.PROVIDER_HTTP_READ_TIMEOUT,
+        )
+        
+        pool_size = pool_size or settings.PROVIDER_HTTP_POOL_SIZE
+        
+        # Retries are left to the caller: a replayed purchase could be charged twice
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        
+        self.pool_size = pool_size
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Send a request through the provider's connection pool.
+        
+        Args:
+            method: HTTP method
+            url: Absolute URL to call
+            **kwargs: Passed to requests; timeout defaults to the transport timeouts
+        
+        Returns:
+            The HTTP response
+        """
+        kwargs.setdefault('timeout', self.current_timeout())
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """
+        Send a GET request.
+        """
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        """
+        Send a POST request.
+        """
+        return self.request('POST', url, **kwargs)
+
+    def close(self):
+        """
+        Close all pooled connections.
+        """
+        self.session.close()
+
+    def current_timeout(self) -> tuple:
+        """
+        Get the (connect, read) timeouts for the provider call in progress.
+        
+        The read timeout of read-only operations adapts to their observed
+        latency, but never exceeds the transport's static read timeout.
+        """
+        call = current_call.get()
+        read_timeout = adaptive_read_timeout(*call) if call else None
+        
+        if read_timeout is None:
+            return self.timeout
+        
+        return self.timeout[0], min(read_timeout, self.timeout[1])
+
+    async def arequest(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """
+        Send a request through the async client for the running event loop.
+        
+        Args:
+            method: HTTP method
+            url: Absolute URL to call
+            **kwargs: Passed to httpx; timeout defaults to the transport timeouts
+        
+        Returns:
+            The HTTP response
+        """
+        connect_timeout, read_timeout = self.current_timeout()
+        kwargs.setdefault('timeout', httpx.Timeout(read_timeout, connect=connect_timeout))
+        return await self._async_client().request(method, url, **kwargs)
+
+    async def aget(self, url: str, **kwargs) -> httpx.Response:
+        """
+        Send an async GET request.
+        """
+        return await self.arequest('GET', url, **kwargs)
+
+    async def apost(self, url: str, **kwargs) -> httpx.Response:
+        """
+        Send an async POST request.
+        """
+        return await self.arequest('POST', url, **kwargs)
+
+    async def aclose(self):
+        """
+        Close the async client of the running event loop.
+        """
+        with self._lock:
+            client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        
+        if client is not None:
+            await client.aclose()
+
+    def _async_client(self) -> httpx.AsyncClient:
+        """
+        Get or create the async client of the running event loop.
+        """
+        loop = asyncio.get_running_loop()
+        
+        with self._lock:
+            client = self._async_clients.get(loop)
+            
+            if client is None:
+                client = httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=self.pool_size,
+                        max_keepalive_connections=self.pool_size
+                    )
+                )
+                self._async_clients[loop] = client
+        
+        return client
@@ -1,8 +1,10 @@
+import httpx
 import requests
 import logging
 from typing import Dict, Any
 from apps.digital.providers.base_provider import BaseProvider
-from apps.digital.models import Transaction
+from apps.digital.providers.transport import ProviderTransport
+from apps.digital.models import DigitalTransaction
 from core.exceptions import ProviderException
 
 
@@ -14,6 +16,8 @@ class VodafoneProvider(BaseProvider):
     Vodafone Provider Implementation
     """
     
+    supports_async = True
+    
     def __init__(self):
         self.base_url = "https://api.vodafone.com/v1"  # Placeholder URL
         self.api_key = None  # Will be set from settings
@@ -21,8 +25,9 @@ class VodafoneProvider(BaseProvider):
             'Content-Type': 'application/json',
             'Authorization': f'Bearer {self.api_key}'
         }
+        self.transport = ProviderTransport('vodafone')
 
-    def purchase(self, transaction: Transaction) -> Dict[str, Any]:
+    def purchase(self, transaction: DigitalTransaction) -> Dict[str, Any]:
         """
         Execute a purchase transaction with Vodafone.
         """
@@ -37,7 +42,7 @@ class VodafoneProvider(BaseProvider):
             }
             
             # Make API call to Vodafone
-            response = requests.post(
+            response = self.transport.post(
                 f"{self.base_url}/data-purchase",  # Placeholder endpoint
                 json=payload,
                 headers=self.headers
@@ -73,7 +78,7 @@ class VodafoneProvider(BaseProvider):
                 'network_code': network_provider_code
             }
             
-            response = requests.post(
+            response = self.transport.post(
                 f"{self.base_url}/validate-phone",
                 json=payload,
                 headers=self.headers
@@ -100,7 +105,7 @@ class VodafoneProvider(BaseProvider):
         Get Vodafone provider account balance.
         """
         try:
-            response = requests.get(
+            response = self.transport.get(
                 f"{self.base_url}/balance",
                 headers=self.headers
             )
@@ -126,7 +131,7 @@ class VodafoneProvider(BaseProvider):
         Verify a transaction with Vodafone.
         """
         try:
-            response = requests.get(
+            response = self.transport.get(
                 f"{self.base_url}/verify-transaction/{transaction_id}",
                 headers=self.headers
             )
@@ -147,6 +152,102 @@ class VodafoneProvider(BaseProvider):
             logger.error(f"Vodafone Transaction verification unexpected error: {str(e)}")
             return self.handle_error(e)
 
+    async def apurchase(self, transaction: DigitalTransaction) -> Dict[str, Any]:
+        """
+        Execute a purchase transaction with Vodafone without blocking the event loop.
+        """
+        try:
+            payload = {
+                'recipient_phone': transaction.phone_number,
+                'product_code': transaction.product.code,
+                'amount': float(transaction.amount),
+                'reference': transaction.reference,
+                'customer_reference': str(transaction.id)
+            }
+            
+            response = await self.transport.apost(
+                f"{self.base_url}/data-purchase",  # Placeholder endpoint
+                json=payload,
+                headers=self.headers
+            )
+            
+            response_data = response.json()
+            
+            formatted_response = self.format_response(response_data)
+            
+            return {
+                'status': 'success' if response.status_code == 200 else 'failed',
+                'provider_response': formatted_response,
+                'transaction_id': formatted_response.get('transaction_id'),
+                'message': formatted_response.get('message', 'Transaction processed'),
+                'provider': 'Vodafone'
+            }
+            
+        except httpx.HTTPError as e:
+            logger.error(f"Vodafone Provider API error: {str(e)}")
+            return self.handle_error(e)
+        except Exception as e:
+            logger.error(f"Vodafone Provider unexpected error: {str(e)}")
+            return self.handle_error(e)
+
+    async def aget_balance(self) -> Dict[str, Any]:
+        """
+        Get Vodafone provider account balance without blocking the event loop.
+        """
+        try:
+            response = await self.transport.aget(
+                f"{self.base_url}/balance",
+                headers=self.headers
+            )
+            
+            response_data = response.json()
+            
+            return {
+                'status': 'success' if response.status_code == 200 else 'failed',
+                'balance': response_data.get('balance'),
+                'currency': response_data.get('currency', 'GHS'),
+                'provider_response': response_data
+            }
+            
+        except httpx.HTTPError as e:
+            logger.error(f"Vodafone Balance check error: {str(e)}")
+            return self.handle_error(e)
+        except Exception as e:
+            logger.error(f"Vodafone Balance check unexpected error: {str(e)}")
+            return self.handle_error(e)
+
+    async def averify_transaction(self, transaction_id: str) -> Dict[str, Any]:
+        """
+        Verify a transaction with Vodafone without blocking the event loop.
+        """
+        try:
+            response = await self.transport.aget(
+                f"{self.base_url}/verify-transaction/{transaction_id}",
+                headers=self.headers
+            )
+            
+            response_data = response.json()
+            
+            return {
+                'status': 'success' if response.status_code == 200 else 'failed',
+                'verified': response_data.get('verified', False),
+                'status_message': response_data.get('status'),
+                'provider_response': response_data
+            }
+            
+        except httpx.HTTPError as e:
+            logger.error(f"Vodafone Transaction verification error: {str(e)}")
+            return self.handle_error(e)
+        except Exception as e:
+            logger.error(f"Vodafone Transaction verification unexpected error: {str(e)}")
+            return self.handle_error(e)
+
+    async def aclose(self):
+        """
+        Close the async HTTP client of the running event loop.
+        """
+        await self.transport.aclose()
+
     def format_response(self, response: Dict[str, Any]) -> Dict[str, Any]:
         """
         Format Vodafone provider response to standard format.
@@ -0,0 +1,546 @@
+import csv
+import io
+import uuid
+import logging
+from decimal import Decimal
+from typing import Dict, Any, List, Iterable
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction as db_transaction
+from django.db.models import F
+from django.utils import timezone
+from apps.digital.models import BulkOrder, DigitalProduct, DigitalTransaction
+from apps.digital.phone_numbers import get_engine, network_matches
+from apps.wallets.services.wallet_service import WalletService
+from core.exceptions import (
+    InvalidTransactionException,
+    FraudDetectedException,
+    ServiceNotAvailableException
+)
+from apps.digital.services.digital_service import DigitalService
+from apps.digital.services.fraud_service import FraudDetectionService
+from apps.digital.services.pricing_service import PricingService
+from apps.digital.services.float_service import ProviderFloatService
+from apps.digital.services.customer_webhook_service import CustomerWebhookService
+from apps.digital.validators import normalize_ghanaian_phone_number
+
+
+logger = logging.getLogger(__name__)
+
+PHONE_COLUMN_NAMES = ('phone', 'phone_number', 'recipient', 'recipient_phone', 'msisdn')
+MAX_REJECTED_SAMPLES = 50
+
+
+class BulkOrderService:
+    """
+    Service class for bulk purchases of one product for many recipients.
+    
+    A batch is priced and fraud-checked once, the wallet is debited once for
+    the batch total and the child transactions are inserted with bulk_create.
+    Provider calls are made by a Celery task through the provider's
+    purchase_batch, one chunk at a time, and progress is tracked on the
+    BulkOrder row.
+    """
+    
+    def __init__(self):
+        self.fraud_service = FraudDetectionService()
+        self.pricing_service = PricingService()
+        self.wallet_service = WalletService()
+        self.float_service = ProviderFloatService()
+        self.webhook_events = CustomerWebhookService()
+        self.chunk_size = settings.BULK_ORDER_CHUNK_SIZE
+        self.concurrency = settings.BULK_ORDER_CONCURRENCY
+
+    def create_bulk_order(self, user, product_id: str, recipients: List[str]) -> Dict[str, Any]:
+        """
+        Create a bulk order and queue it for processing.
+        
+        Args:
+            user: The user placing the order
+            product_id: ID of the digital product
+            recipients: Recipient phone numbers
+        
+        Returns:
+            Dict containing the BulkOrder and the rejected recipients
+        """
+        max_recipients = self.fraud_service.config['max_bulk_recipients']
+        if len(recipients) > max_recipients:
+            raise InvalidTransactionException(
+                f"Bulk orders are limited to {max_recipients} recipients"
+            )
+        
+        with db_transaction.atomic():
+            bulk_order = self.start_bulk_order(user, product_id, recipients=recipients)
+            rejected = self.add_recipients(bulk_order, recipients)
+            
+            if bulk_order.total_recipients == 0:
+                raise InvalidTransactionException("No valid recipients in bulk order")
+            
+            self.dispatch(bulk_order)
+        
+        return {
+            'bulk_order': bulk_order,
+            'rejected': rejected
+        }
+
+    def create_bulk_order_from_csv(self, user, product_id: str, csv_file) -> Dict[str, Any]:
+        """
+        Create a bulk order from an uploaded CSV of recipients.
+        
+        The file is read one row at a time. Each number is normalized and
+        validated, duplicates are dropped as they are read, and valid rows are
+        screened and inserted in chunks, so memory does not grow with the file.
+        The wallet is debited once for the whole upload at the end, so its row
+        is only locked until the order commits. The phone number is taken from
+        a recognised header column, or from the first column if the file has
+        no header.
+        
+        Args:
+            user: The user placing the order
+            product_id: ID of the digital product
+            csv_file: Binary file object containing the CSV
+        
+        Returns:
+            Dict containing the BulkOrder and row statistics
+        """
+        max_recipients = self.fraud_service.config['max_bulk_recipients']
+        reader = csv.reader(io.TextIOWrapper(csv_file, encoding='utf-8-sig', newline=''))
+        
+        stats = {
+            'rows': 0,
+            'invalid_count': 0,
+            'duplicate_count': 0,
+            'rejected_count': 0,
+            'rejected_samples': []
+        }
+        
+        def reject(recipient, message):
+            stats['rejected_count'] += 1
+            if len(stats['rejected_samples']) < MAX_REJECTED_SAMPLES:
+                stats['rejected_samples'].append({'recipient': recipient, 'message': message})
+        
+        with db_transaction.atomic():
+            bulk_order = self.start_bulk_order(user, product_id)
+            
+            seen = set()
+            chunk = []
+            column = 0
+            first_chunk = True
+            
+            for line_number, row in enumerate(reader):
+                if not row:
+                    continue
+                
+                if line_number == 0:
+                    header = [cell.strip().lower() for cell in row]
+                    matches = [i for i, name in enumerate(header) if name in PHONE_COLUMN_NAMES]
+                    if matches:
+                        column = matches[0]
+                        continue
+                
+                raw = row[column].strip() if column < len(row) else ''
+                if not raw:
+                    continue
+                
+                stats['rows'] += 1
+                
+                try:
+                    phone_number = normalize_ghanaian_phone_number(raw)
+                except ValidationError as e:
+                    stats['invalid_count'] += 1
+                    reject(raw, e.messages[0])
+                    continue
+                
+                # Numbers are stored as ints to keep the dedupe set compact
+                key = int(phone_number)
+                if key in seen:
+                    stats['duplicate_count'] += 1
+                    continue
+                
+                seen.add(key)
+                
+                if len(seen) > max_recipients:
+                    raise InvalidTransactionException(
+                        f"Bulk orders are limited to {max_recipients} recipients"
+                    )
+                
+                chunk.append(phone_number)
+                
+                if len(chunk) >= self.chunk_size:
+                    for recipient, message in self.add_recipients(
+                        bulk_order, chunk, screen_user=first_chunk, charge=False
+                    ).items():
+                        reject(recipient, message)
+                    chunk = []
+                    first_chunk = False
+            
+            if chunk:
+                for recipient, message in self.add_recipients(
+                    bulk_order, chunk, screen_user=first_chunk, charge=False
+                ).items():
+                    reject(recipient, message)
+            
+            if bulk_order.total_recipients == 0:
+                raise InvalidTransactionException("No valid recipients in bulk order")
+            
+            # One wallet debit for the whole upload, taken last
+            self._charge(
+                bulk_order, bulk_order.total_recipients, bulk_order.total_amount,
+                reference=f"{bulk_order.batch_number}-0"
+            )
+            self.dispatch(bulk_order)
+        
+        return {
+            'bulk_order': bulk_order,
+            'stats': stats
+        }
+
+    def start_bulk_order(self, user, product_id: str, recipients: List[str] = None) -> BulkOrder:
+        """
+        Create an empty bulk order for a product, priced for the user.
+        
+        Args:
+            user: The user placing the order
+            product_id: ID of the digital product
+            recipients: Recipient list to keep on the order, if any
+        
+        Returns:
+            The pending BulkOrder
+        """
+        try:
+            product = DigitalProduct.objects.select_related(
+                'service_type', 'network_provider'
+            ).get(id=product_id, is_active=True)
+        except DigitalProduct.DoesNotExist:
+            raise InvalidTransactionException("Product not found or inactive")
+        
+        if not product.service_type.is_active:
+            raise ServiceNotAvailableException("Service is not available")
+        
+        unit_price = self.pricing_service.get_user_price(user, product)
+        
+        return BulkOrder.objects.create(
+            batch_number=f"BLK{int(timezone.now().timestamp())}{uuid.uuid4().hex[:12].upper()}",
+            user=user,
+            product=product,
+            unit_price=unit_price,
+            total_recipients=0,
+            total_amount=Decimal('0.00'),
+            recipients=recipients or []
+        )
+
+    def add_recipients(self, bulk_order: BulkOrder, recipients: Iterable[str],
+                       screen_user: bool = True, charge: bool = True) -> Dict[str, str]:
+        """
+        Create the child transactions of a batch of recipients and charge for them.
+        
+        Args:
+            bulk_order: The pending bulk order
+            recipients: Recipient phone numbers for this batch
+            screen_user: Run the user-level fraud checks; only needed for the
+                first batch of an order
+            charge: Debit the wallet for this batch; callers adding several
+                batches pass False and charge the order once with _charge
+        
+        Returns:
+            Dict of rejected recipient -> reason
+        """
+        product = bulk_order.product
+        recipients = list(recipients)
+        
+        # Normalize and check the network of every recipient offline
+        engine = get_engine()
+        rejected = {}
+        candidates = []
+        
+        for phone_number in recipients:
+            parsed = engine.parse(phone_number)
+            
+            if parsed is None or parsed.network is None:
+                rejected[phone_number] = "Invalid phone number"
+            elif not network_matches(parsed, product):
+                rejected[phone_number] = f"Phone number is on {parsed.network}, not {product.network_provider.name}"
+            else:
+                candidates.append(parsed.local)
+        
+        if screen_user:
+            fraud_check = self.fraud_service.check_batch_risk(
+                user=bulk_order.user,
+                phone_numbers=candidates,
+                unit_amount=bulk_order.unit_price
+            )
+            
+            if fraud_check['is_fraud']:
+                raise FraudDetectedException(f"Fraud detected: {fraud_check['reason']}")
+            
+            rejected.update(fraud_check['rejected'])
+        else:
+            rejected.update(self.fraud_service.screen_phone_numbers(candidates))
+        accepted = [p for p in candidates if p not in rejected]
+        
+        if not accepted:
+            return rejected
+        
+        amount = bulk_order.unit_price * len(accepted)
+        provider = product.network_provider.code.lower() if product.network_provider else 'general'
+        
+        with db_transaction.atomic():
+            transactions = []
+            for phone_number in accepted:
+                transaction_id, reference = DigitalService.generate_transaction_ids()
+                transactions.append(DigitalTransaction(
+                    id=transaction_id,
+                    reference=reference,
+                    user=bulk_order.user,
+                    product=product,
+                    service_type=product.service_type,
+                    network_provider=product.network_provider,
+                    phone_number=phone_number,
+                    amount=bulk_order.unit_price,
+                    price=bulk_order.unit_price,
+                    quantity=1,
+                    priority='low',
+                    provider=provider,
+                    bulk_order=bulk_order
+                ))
+            
+            DigitalTransaction.objects.bulk_create(transactions, batch_size=self.chunk_size)
+            
+            BulkOrder.objects.filter(pk=bulk_order.pk).update(
+                total_recipients=F('total_recipients') + len(accepted),
+                total_amount=F('total_amount') + amount
+            )
+            
+            if charge:
+                # Taken last so the wallet row is locked only until the transaction commits
+                self._charge(
+                    bulk_order, len(accepted), amount,
+                    reference=f"{bulk_order.batch_number}-{bulk_order.total_recipients}"
+                )
+        
+        bulk_order.total_recipients += len(accepted)
+        bulk_order.total_amount += amount
+        
+        return rejected
+
+    def _charge(self, bulk_order: BulkOrder, count: int, amount: Decimal, reference: str):
+        """
+        Debit the wallet once for `count` recipients of a bulk order.
+        
+        The order is refused before the debit if the provider cannot fund it.
+        """
+        product = bulk_order.product
+        provider = product.network_provider.code.lower() if product.network_provider else 'general'
+        
+        if not self.float_service.has_float(provider, amount):
+            raise ServiceNotAvailableException(
+                "Service temporarily unavailable: insufficient provider float"
+            )
+        
+        self.wallet_service.debit(
+            user=bulk_order.user,
+            amount=amount,
+            reference=reference,
+            description=f"Bulk purchase: {product.name} x{count}",
+            metadata={'bulk_order_id': str(bulk_order.id)}
+        )
+
+    def dispatch(self, bulk_order: BulkOrder):
+        """
+        Queue a bulk order for processing once the current DB transaction commits.
+        """
+        from apps.digital.tasks import process_bulk_order
+        
+        bulk_order_id = str(bulk_order.id)
+        queue = settings.DIGITAL_PRIORITY_QUEUES['low']
+        
+        db_transaction.on_commit(
+            lambda: process_bulk_order.apply_async(args=[bulk_order_id], queue=queue)
+        )
+
+    def process(self, bulk_order_id: str) -> Dict[str, Any]:
+        """
+        Send the pending child transactions of a bulk order to the provider.
+        
+        Transactions are processed in chunks; within a chunk provider calls run
+        concurrently, results are written back with bulk_update, failures are
+        refunded with one wallet credit and the order counters are advanced.
+        
+        Args:
+            bulk_order_id: ID of the bulk order to process
+        
+        Returns:
+            Dict containing the bulk order summary
+        """
+        bulk_order = BulkOrder.objects.select_related('user', 'product').get(id=bulk_order_id)
+        
+        BulkOrder.objects.filter(pk=bulk_order.pk).update(
+            status='processing', started_at=timezone.now()
+        )
+        
+        failures = list(bulk_order.results)
+        last_id = ''
+        
+        while True:
+            chunk = list(
+                DigitalTransaction.objects.select_related('product')
+                .filter(bulk_order=bulk_order, status='pending', id__gt=last_id)
+                .order_by('id')[:self.chunk_size]
+            )
+            
+            if not chunk:
+                break
+            
+            last_id = chunk[-1].id
+            failures.extend(self._process_chunk(bulk_order, chunk))
+        
+        return self._finalize(bulk_order, failures)
+
+    def _process_chunk(self, bulk_order: BulkOrder, chunk: List[DigitalTransaction]) -> List[Dict[str, Any]]:
+        """
+        Process one chunk of child transactions.
+        
+        Only definite failures are refunded: a 'failed' answer, or a call that
+        never reached the provider. Rows with an unknown outcome, such as a
+        timeout, stay 'processing' with their float reserved until the stuck
+        transaction sweep verifies them. Results are only written back,
+        counted and refunded for rows that are still 'processing' when the
+        chunk is saved.
+        
+        Returns:
+            List of failed recipients and their errors
+        """
+        DigitalTransaction.objects.filter(
+            id__in=[t.id for t in chunk], status='pending'
+        ).update(status='processing', updated_at=timezone.now())
+        
+        for transaction in chunk:
+            transaction.status = 'processing'
+        
+        provider = None
+        
+        try:
+            from apps.digital.services.provider_factory import ProviderFactory
+            provider = self.float_service.reserve_route(
+                ProviderFactory.get_healthy_provider(chunk[0].provider),
+                bulk_order.unit_price * len(chunk),
+                chunk[0].provider
+            )
+            
+            if provider is None:
+                responses = [
+                    {'status': 'error', 'message': 'Insufficient provider float', 'rejected': True}
+                    for _ in chunk
+                ]
+            else:
+                for transaction in chunk:
+                    transaction.provider = provider.name
+                
+                responses = provider.purchase_batch(chunk, max_workers=self.concurrency)
+        except ValueError as e:
+            responses = [
+                {'status': 'error', 'message': f"Provider error: {str(e)}", 'rejected': True}
+                for _ in chunk
+            ]
+        
+        now = timezone.now()
+        failures = []
+        
+        for transaction, response in zip(chunk, responses):
+            transaction.provider_response = response
+            transaction.updated_at = now
+            
+            if response.get('status') == 'success':
+                transaction.status = 'completed'
+                transaction.provider_transaction_id = response.get('transaction_id') or ''
+                transaction.completed_at = now
+            elif response.get('status') == 'failed' or response.get('rejected'):
+                transaction.status = 'failed'
+                transaction.failed_at = now
+                failures.append({
+                    'recipient': transaction.phone_number,
+                    'transaction_id': transaction.id,
+                    'message': response.get('message')
+                })
+        
+        if provider is not None and failures:
+            self.float_service.release(provider.name, bulk_order.unit_price * len(failures))
+        
+        with db_transaction.atomic():
+            # Skip rows the stuck transaction sweep settled in the meantime
+            still_processing = set(
+                DigitalTransaction.objects.select_for_update()
+                .filter(id__in=[t.id for t in chunk], status='processing')
+                .values_list('id', flat=True)
+            )
+            
+            changed = [t for t in chunk if t.id in still_processing]
+            failures = [f for f in failures if f['transaction_id'] in still_processing]
+            
+            if not changed:
+                return failures
+            
+            DigitalTransaction.objects.bulk_update(
+                changed,
+                ['status', 'provider', 'provider_response', 'provider_transaction_id',
+                 'completed_at', 'failed_at', 'updated_at']
+            )
+            self.webhook_events.publish_transactions(changed)
+            
+            if failures:
+                # One refund for every failed recipient in the chunk
+                self.wallet_service.credit(
+                    user=bulk_order.user,
+                    amount=bulk_order.unit_price * len(failures),
+                    reference=f"R-{bulk_order.batch_number}-{changed[0].id}",
+                    description=f"Bulk purchase refund: {len(failures)} failed recipients",
+                    transaction_type='refund',
+                    metadata={'bulk_order_id': str(bulk_order.id)}
+                )
+            
+            BulkOrder.objects.filter(pk=bulk_order.pk).update(
+                successful_count=F('successful_count') + sum(1 for t in changed if t.status == 'completed'),
+                failed_count=F('failed_count') + len(failures)
+            )
+        
+        return failures
+
+    def _finalize(self, bulk_order: BulkOrder, failures: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Set the final status of a bulk order from its counters.
+        
+        Recipients whose outcome is still unknown leave the order 'partial'
+        until the stuck transaction sweep settles them.
+        """
+        bulk_order.refresh_from_db(fields=['successful_count', 'failed_count', 'total_recipients'])
+        bulk_order.status = bulk_order.settled_status()
+        
+        bulk_order.results = failures
+        bulk_order.completed_at = timezone.now()
+        bulk_order.save(update_fields=['status', 'results', 'completed_at'])
+        
+        summary = self.get_summary(bulk_order)
+        self.webhook_events.publish(bulk_order.user_id, 'bulk_order.completed', summary)
+        return summary
+
+    def get_summary(self, bulk_order: BulkOrder) -> Dict[str, Any]:
+        """
+        Get the progress summary of a bulk order.
+        """
+        return {
+            'id': str(bulk_order.id),
+            'batch_number': bulk_order.batch_number,
+            'status': bulk_order.status,
+            'product': {
+                'id': str(bulk_order.product_id),
+                'name': bulk_order.product.name
+            },
+            'unit_price': float(bulk_order.unit_price),
+            'total_amount': float(bulk_order.total_amount),
+            'total_recipients': bulk_order.total_recipients,
+            'processed_count': bulk_order.processed_count,
+            'successful_count': bulk_order.successful_count,
+            'failed_count': bulk_order.failed_count,
+            'created_at': bulk_order.created_at.isoformat(),
+            'completed_at': bulk_order.completed_at.isoformat() if bulk_order.completed_at else None
+        }
@@ -0,0 +1,375 @@
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import random
+import time
+from collections import defaultdict
+from datetime import timedelta
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+import httpx
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction as db_transaction
+from django.utils import timezone
+from apps.digital.metrics import CUSTOMER_WEBHOOK_DELIVERIES
+from apps.digital.models import DigitalTransaction, WebhookDelivery, WebhookSubscription
+from apps.digital.validators import is_public_address
+from core.identifiers import uuid7
+
+
+logger = logging.getLogger(__name__)
+
+# Events customers can subscribe to
+WEBHOOK_EVENTS = (
+    'order.completed',
+    'order.failed',
+    'bulk_order.completed',
+    'wallet.funded',
+    'wallet.withdrawn',
+)
+
+# Event published when a transaction reaches each final status
+TRANSACTION_EVENTS = {
+    'completed': 'order.completed',
+    'failed': 'order.failed',
+}
+
+
+class CustomerWebhookService:
+    """
+    Service class for pushing account events to customer webhook endpoints.
+    
+    publish() adds one WebhookDelivery per subscribed endpoint when the
+    surrounding database transaction commits, with a single bulk insert, and
+    queues a delivery task at most once per CUSTOMER_WEBHOOK_DISPATCH_DELAY
+    seconds. Subscriptions are cached per user, so events of users without
+    endpoints cost no query.
+    
+    deliver_due() claims due deliveries in batches and sends each batch
+    concurrently through one pooled HTTP client, with at most the
+    subscription's max_concurrency requests in flight per endpoint. Outcomes
+    are written with one bulk_update per batch; failed deliveries are retried
+    by later batches with exponential backoff and jitter, up to
+    CUSTOMER_WEBHOOK_MAX_ATTEMPTS attempts.
+    """
+    
+    DISPATCH_SCHEDULED_KEY = 'digital:customer_webhook_dispatch_scheduled'
+    
+    def __init__(self):
+        self.batch_size = settings.CUSTOMER_WEBHOOK_BATCH_SIZE
+        self.max_attempts = settings.CUSTOMER_WEBHOOK_MAX_ATTEMPTS
+
+    def publish(self, user_id, event: str, data: Dict[str, Any]):
+        """
+        Publish an event to the user's webhook endpoints.
+        
+        Args:
+            user_id: ID of the user the event belongs to
+            event: Event type, one of WEBHOOK_EVENTS
+            data: Event data sent to the endpoints
+        """
+        self.publish_many([(user_id, event, data)])
+
+    def publish_transactions(self, transactions: Iterable[DigitalTransaction]):
+        """
+        Publish order.completed or order.failed for transactions with a final status.
+        """
+        self.publish_many([
+            (transaction.user_id, TRANSACTION_EVENTS[transaction.status], self.transaction_data(transaction))
+            for transaction in transactions
+            if transaction.status in TRANSACTION_EVENTS
+        ])
+
+    def publish_many(self, events: List[Tuple[Any, str, Dict[str, Any]]]):
+        """
+        Publish several events with one subscription lookup and one insert.
+        
+        Deliveries are only created once the current database transaction
+        commits, so rolled back changes are never announced.
+        
+        Args:
+            events: List of (user ID, event type, event data)
+        """
+        if events:
+            db_transaction.on_commit(lambda: self._create_deliveries(events))
+
+    def schedule_delivery(self):
+        """
+        Queue a delivery task, at most once per CUSTOMER_WEBHOOK_DISPATCH_DELAY seconds.
+        """
+        from apps.digital.tasks import deliver_customer_webhooks
+        
+        delay = settings.CUSTOMER_WEBHOOK_DISPATCH_DELAY
+        
+        if cache.add(self.DISPATCH_SCHEDULED_KEY, 1, max(delay, 1)):
+            deliver_customer_webhooks.apply_async(countdown=delay)
+
+    def deliver_due(self) -> Dict[str, int]:
+        """
+        Send due deliveries, one batch at a time, until none are left.
+        
+        Returns:
+            Counts of delivered, retried and failed deliveries
+        """
+        stats = {'delivered': 0, 'retried': 0, 'failed': 0}
+        
+        while True:
+            deliveries = self._claim()
+            
+            if not deliveries:
+                break
+            
+            results = self.send_batch(deliveries)
+            
+            for key, count in self._record(deliveries, results).items():
+                stats[key] += count
+            
+            if len(deliveries) < self.batch_size:
+                break
+        
+        if any(stats.values()):
+            logger.info(f"Customer webhook deliveries: {stats}")
+        return stats
+
+    def send_batch(self, deliveries: List[WebhookDelivery]) -> List[Tuple[Optional[int], str]]:
+        """
+        POST a batch of deliveries concurrently over one pooled client.
+        
+        Returns:
+            List of (response status, error) in the same order as deliveries;
+            the status is None when no response was received
+        """
+        async def run():
+            pool_size = settings.CUSTOMER_WEBHOOK_POOL_SIZE
+            semaphores = {}
+            
+            async with httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+                timeout=httpx.Timeout(settings.CUSTOMER_WEBHOOK_TIMEOUT),
+                follow_redirects=False
+            ) as client:
+                async def send(delivery):
+                    subscription = delivery.subscription
+                    
+                    if subscription.id not in semaphores:
+                        semaphores[subscription.id] = asyncio.Semaphore(max(1, subscription.max_concurrency))
+                    
+                    async with semaphores[subscription.id]:
+                        return await self._send(client, delivery)
+                
+                return await asyncio.gather(*(send(delivery) for delivery in deliveries))
+        
+        return asyncio.run(run())
+
+    @staticmethod
+    def sign(secret: str, timestamp: str, body: bytes) -> str:
+        """
+        Sign a delivery body the way endpoints are told to verify it.
+        
+        The signature is the hex HMAC-SHA256 of "<timestamp>.<body>", so a
+        captured delivery cannot be replayed with a fresh timestamp.
+        """
+        return hmac.new(secret.encode('utf-8'), timestamp.encode('utf-8') + b'.' + body, hashlib.sha256).hexdigest()
+
+    @staticmethod
+    def transaction_data(transaction: DigitalTransaction) -> Dict[str, Any]:
+        """
+        Get the event data of a transaction, from fields already loaded.
+        """
+        return {
+            'transaction_id': transaction.id,
+            'reference': transaction.reference,
+            'status': transaction.status,
+            'product_id': transaction.product_id,
+            'phone_number': transaction.phone_number,
+            'amount': str(transaction.amount),
+            'bulk_order_id': str(transaction.bulk_order_id) if transaction.bulk_order_id else None,
+            'completed_at': transaction.completed_at.isoformat() if transaction.completed_at else None,
+            'failed_at': transaction.failed_at.isoformat() if transaction.failed_at else None,
+        }
+
+    @staticmethod
+    def subscription_cache_key(user_id) -> str:
+        """
+        Get the cache key of a user's active subscriptions.
+        """
+        return f"digital:webhook_subscriptions:{user_id}"
+
+    def _subscriptions(self, user_ids: List[Any]) -> Dict[Any, List[Dict[str, Any]]]:
+        """
+        Get the active subscriptions of users, from the cache where possible.
+        
+        Returns:
+            User ID -> list of {'id', 'events'}
+        """
+        keys = {self.subscription_cache_key(user_id): user_id for user_id in user_ids}
+        cached = cache.get_many(list(keys))
+        
+        found = {keys[key]: subscriptions for key, subscriptions in cached.items()}
+        missing = [user_id for user_id in user_ids if user_id not in found]
+        
+        if missing:
+            loaded = defaultdict(list)
+            for subscription in WebhookSubscription.objects.filter(user_id__in=missing, is_active=True):
+                loaded[subscription.user_id].append({'id': subscription.id, 'events': subscription.events})
+            
+            fresh = {user_id: loaded.get(user_id, []) for user_id in missing}
+            cache.set_many(
+                {self.subscription_cache_key(user_id): subscriptions for user_id, subscriptions in fresh.items()},
+                settings.CUSTOMER_WEBHOOK_SUBSCRIPTION_CACHE_SECONDS
+            )
+            found.update(fresh)
+        
+        return found
+
+    def _create_deliveries(self, events: List[Tuple[Any, str, Dict[str, Any]]]):
+        """
+        Insert the deliveries of events and make sure a delivery task is coming.
+        
+        Runs after commit: failing here must not fail the change being announced.
+        """
+        try:
+            subscriptions = self._subscriptions(list({user_id for user_id, _, _ in events}))
+            now = timezone.now()
+            deliveries = []
+            
+            for user_id, event, data in events:
+                targets = [s for s in subscriptions.get(user_id, []) if not s['events'] or event in s['events']]
+                
+                if not targets:
+                    continue
+                
+                event_id = uuid7()
+                payload = {'id': str(event_id), 'event': event, 'created_at': now.isoformat(), 'data': data}
+                
+                for subscription in targets:
+                    deliveries.append(WebhookDelivery(
+                        subscription_id=subscription['id'],
+                        event_id=event_id,
+                        event=event,
+                        payload=payload,
+                        next_attempt_at=now
+                    ))
+            
+            if deliveries:
+                WebhookDelivery.objects.bulk_create(deliveries, batch_size=self.batch_size)
+                self.schedule_delivery()
+        except Exception as e:
+            logger.error(f"Error publishing {len(events)} customer webhook events: {str(e)}")
+
+    def _claim(self) -> List[WebhookDelivery]:
+        """
+        Claim a batch of due deliveries.
+        
+        Claimed deliveries are leased for CUSTOMER_WEBHOOK_LEASE_SECONDS, so
+        other workers skip them and a worker that dies mid-batch only delays
+        them.
+        """
+        now = timezone.now()
+        
+        with db_transaction.atomic():
+            deliveries = list(
+                WebhookDelivery.objects.select_for_update(skip_locked=True, of=('self',))
+                .select_related('subscription')
+                .filter(status='pending', next_attempt_at__lte=now)
+                .order_by('next_attempt_at')[:self.batch_size]
+            )
+            
+            if deliveries:
+                WebhookDelivery.objects.filter(id__in=[d.id for d in deliveries]).update(
+                    next_attempt_at=now + timedelta(seconds=settings.CUSTOMER_WEBHOOK_LEASE_SECONDS)
+                )
+        
+        return deliveries
+
+    async def _send(self, client: httpx.AsyncClient, delivery: WebhookDelivery) -> Tuple[Optional[int], str]:
+        """
+        POST one signed delivery.
+        
+        The endpoint's host is resolved again before connecting, since DNS
+        may have changed since the subscription was validated.
+        """
+        subscription = delivery.subscription
+        
+        if not subscription.is_active:
+            return None, 'Subscription is inactive'
+        
+        try:
+            addresses = await asyncio.get_running_loop().getaddrinfo(httpx.URL(subscription.url).host, None)
+        except (OSError, UnicodeError):
+            return None, 'Webhook URL host cannot be resolved'
+        
+        if not all(is_public_address(info[4][0]) for info in addresses):
+            return None, 'Webhook URL does not point to a public address'
+        
+        body = json.dumps(delivery.payload, cls=DjangoJSONEncoder).encode('utf-8')
+        timestamp = str(int(time.time()))
+        headers = {
+            'Content-Type': 'application/json',
+            'X-Webhook-Id': str(delivery.event_id),
+            'X-Webhook-Event': delivery.event,
+            'X-Webhook-Timestamp': timestamp,
+            'X-Webhook-Signature': self.sign(subscription.secret, timestamp, body),
+        }
+        
+        try:
+            response = await client.post(subscription.url, content=body, headers=headers)
+        except httpx.HTTPError as e:
+            return None, f"{type(e).__name__}: {str(e)}"
+        
+        if 200 <= response.status_code < 300:
+            return response.status_code, ''
+        
+        return response.status_code, f"HTTP {response.status_code}"
+
+    def _record(self, deliveries: List[WebhookDelivery],
+                results: List[Tuple[Optional[int], str]]) -> Dict[str, int]:
+        """
+        Write the outcomes of a batch with one bulk_update.
+        
+        Returns:
+            Counts of delivered, retried and failed deliveries
+        """
+        stats = {'delivered': 0, 'retried': 0, 'failed': 0}
+        now = timezone.now()
+        
+        for delivery, (response_status, error) in zip(deliveries, results):
+            delivery.attempts += 1
+            delivery.response_status = response_status
+            delivery.error = error
+            
+            if not error:
+                delivery.status = 'delivered'
+                delivery.delivered_at = now
+                outcome = 'delivered'
+            elif delivery.attempts >= self.max_attempts or not delivery.subscription.is_active:
+                delivery.status = 'failed'
+                outcome = 'failed'
+            else:
+                delivery.next_attempt_at = now + timedelta(seconds=self._backoff(delivery.attempts))
+                outcome = 'retried'
+            
+            stats[outcome] += 1
+            CUSTOMER_WEBHOOK_DELIVERIES.inc(event=delivery.event, outcome=outcome)
+        
+        WebhookDelivery.objects.bulk_update(
+            deliveries,
+            ['status', 'attempts', 'next_attempt_at', 'response_status', 'error', 'delivered_at']
+        )
+        
+        return stats
+
+    @staticmethod
+    def _backoff(attempts: int) -> float:
+        """
+        Seconds before the next attempt: doubling per attempt up to the
+        maximum, with jitter so failed batches do not retry in lockstep.
+        """
+        delay = min(
+            settings.CUSTOMER_WEBHOOK_RETRY_BASE_SECONDS * 2 ** (attempts - 1),
+            settings.CUSTOMER_WEBHOOK_RETRY_MAX_SECONDS
+        )
+        return delay * random.uniform(0.5, 1.0)
@@ -1,12 +1,14 @@
-import uuid
 import logging
 import time
 from decimal import Decimal
 from typing import Dict, Any, Optional
+from django.conf import settings
 from django.db import transaction as db_transaction
 from django.utils import timezone
-from apps.digital.models import DigitalTransaction, UserPricing, DigitalProduct
-from apps.wallets.models import Wallet, Transaction as WalletTransaction
+from apps.digital.models import DigitalTransaction, DigitalProduct
+from apps.digital.phone_numbers import parse_phone_number, network_matches
+from apps.wallets.services.wallet_service import WalletService
+from core.identifiers import ulid
 from core.exceptions import (
     InsufficientFundsException, 
     InvalidTransactionException, 
@@ -16,6 +18,8 @@ from core.exceptions import (
 )
 from apps.digital.services.fraud_service import FraudDetectionService
 from apps.digital.services.pricing_service import PricingService
+from apps.digital.services.float_service import ProviderFloatService
+from apps.digital.services.customer_webhook_service import CustomerWebhookService
 
 
 logger = logging.getLogger(__name__)
@@ -30,6 +34,9 @@ class DigitalService:
     def __init__(self):
         self.fraud_service = FraudDetectionService()
         self.pricing_service = PricingService()
+        self.wallet_service = WalletService()
+        self.float_service = ProviderFloatService()
+        self.webhook_events = CustomerWebhookService()
 
     def initiate_purchase(self, 
                          user, 
@@ -50,8 +57,66 @@ class DigitalService:
         Returns:
             DigitalTransaction object
         """
+        product, price, phone_number = self._prepare_purchase(user, product_id, phone_number, quantity)
+        
+        return self._create_transaction(
+            user, product, phone_number, price, quantity, priority, status='pending'
+        )
+
+    def purchase(self,
+                 user,
+                 product_id: str,
+                 phone_number: str,
+                 quantity: int = 1,
+                 priority: str = 'normal') -> DigitalTransaction:
+        """
+        Initiate and process a purchase inline.
+        
+        The transaction is inserted directly in 'processing' state, every later
+        write uses update_fields and the wallet ledger row is inserted once on
+        capture, so a purchase issues a fixed number of statements.
+        
+        Args:
+            user: The user initiating the purchase
+            product_id: ID of the digital product
+            phone_number: Recipient phone number
+            quantity: Quantity of products to purchase
+            priority: Transaction priority (low, normal, high, critical)
+            
+        Returns:
+            The DigitalTransaction, completed or, if the provider's answer was
+            inconclusive, still processing
+            
+        Raises:
+            Exceptions raised once the transaction exists carry it as their
+            `transaction` attribute
+        """
+        product, price, phone_number = self._prepare_purchase(user, product_id, phone_number, quantity)
+        
+        transaction = self._create_transaction(
+            user, product, phone_number, price, quantity, priority, status='processing'
+        )
+        
+        try:
+            self._execute(transaction)
+        except Exception as e:
+            logger.error(f"Error processing transaction {transaction.id}: {str(e)}")
+            # Lets callers tell a failed purchase from a rejected request
+            e.transaction = transaction
+            raise e
+        
+        return transaction
+
+    def _prepare_purchase(self, user, product_id: str, phone_number: str, quantity: int):
+        """
+        Validate a purchase request, then price and fraud-check it.
+        
+        Returns:
+            Tuple of (product, unit price, phone number in local format)
+        """
         # Validate inputs
-        if not phone_number or len(phone_number) < 10:
+        parsed = parse_phone_number(phone_number)
+        if parsed is None or parsed.network is None:
             raise InvalidTransactionException("Invalid phone number")
         
         if quantity <= 0:
@@ -59,7 +124,6 @@ class DigitalService:
         
         # Get the product
         try:
-            from apps.digital.models import DigitalProduct
             product = DigitalProduct.objects.select_related(
                 'service_type', 'network_provider'
             ).get(id=product_id, is_active=True)
@@ -70,27 +134,36 @@ class DigitalService:
         if not product.service_type.is_active:
             raise ServiceNotAvailableException("Service is not available")
         
+        # Reject numbers on another network, e.g. an MTN bundle for a Telecel number
+        if not network_matches(parsed, product):
+            raise InvalidTransactionException(
+                f"Phone number is on {parsed.network}, not {product.network_provider.name}"
+            )
+        
         # Get user pricing
         price = self.pricing_service.get_user_price(user, product)
         
-        # Calculate total amount
-        total_amount = price * quantity
-        
         # Check for fraud
         fraud_check = self.fraud_service.check_transaction_risk(
             user=user,
-            phone_number=phone_number,
-            amount=total_amount
+            phone_number=parsed.local,
+            amount=price * quantity
         )
         
         if fraud_check['is_fraud']:
             raise FraudDetectedException(f"Fraud detected: {fraud_check['reason']}")
         
-        # Create transaction
-        transaction_id = str(uuid.uuid4()).replace('-', '')[:12].upper()
-        reference = f"TXN{int(timezone.now().timestamp())}{transaction_id}"
+        return product, price, parsed.local
+
+    def _create_transaction(self, user, product: DigitalProduct, phone_number: str,
+                            price: Decimal, quantity: int, priority: str,
+                            status: str) -> DigitalTransaction:
+        """
+        Insert a new DigitalTransaction.
+        """
+        transaction_id, reference = self.generate_transaction_ids()
         
-        transaction = DigitalTransaction.objects.create(
+        return DigitalTransaction.objects.create(
             id=transaction_id,
             reference=reference,
             user=user,
@@ -98,14 +171,54 @@ class DigitalService:
             service_type=product.service_type,
             network_provider=product.network_provider,
             phone_number=phone_number,
-            amount=total_amount,
+            amount=price * quantity,
             price=price,
             quantity=quantity,
             priority=priority,
+            status=status,
             provider=product.network_provider.code.lower() if product.network_provider else 'general'
         )
+
+    @staticmethod
+    def generate_transaction_ids():
+        """
+        Generate an ID and reference for a new DigitalTransaction.
         
-        return transaction
+        IDs are ULIDs, so they sort by creation time and new rows are appended
+        to the tail of the primary key index.
+        
+        Returns:
+            Tuple of (transaction_id, reference)
+        """
+        transaction_id = ulid()
+        reference = f"TXN{transaction_id}"
+        return transaction_id, reference
+
+    def dispatch_transaction(self, transaction: DigitalTransaction) -> str:
+        """
+        Queue a pending transaction for asynchronous processing.
+        
+        The transaction is routed to the Celery queue matching its priority so
+        critical top-ups are never stuck behind low-priority bulk work. The task
+        is only published once the surrounding database transaction commits.
+        
+        Args:
+            transaction: The pending transaction to process
+            
+        Returns:
+            Name of the queue the transaction was routed to
+        """
+        from apps.digital.tasks import process_transaction_async
+        
+        queues = settings.DIGITAL_PRIORITY_QUEUES
+        queue = queues.get(transaction.priority, queues['normal'])
+        transaction_id = transaction.id
+        
+        db_transaction.on_commit(
+            lambda: process_transaction_async.apply_async(args=[transaction_id], queue=queue)
+        )
+        
+        return queue
 
     def process_transaction(self, transaction_id: str) -> Dict[str, Any]:
         """
@@ -123,236 +236,147 @@ class DigitalService:
                 'user', 'product', 'service_type', 'network_provider'
             ).get(id=transaction_id)
             
-            # Update status to processing
-            transaction.status = 'processing'
-            transaction.save()
-            
-            # Lock user wallet to prevent concurrent transactions
-            wallet = self._lock_wallet(transaction.user)
+            # Claim the transaction so a redelivered task cannot process it twice
+            claimed = DigitalTransaction.objects.filter(
+                id=transaction_id, status='pending'
+            ).update(status='processing', updated_at=timezone.now())
             
-            try:
-                # Check wallet balance
-                if wallet.balance < transaction.amount:
-                    raise InsufficientFundsException(
-                        f"Insufficient funds. Balance: {wallet.balance}, "
-                        f"Required: {transaction.amount}"
-                    )
-                
-                # Debit wallet
-                wallet_transaction = self._debit_wallet(
-                    wallet=wallet,
-                    amount=transaction.amount,
-                    reference=transaction.reference,
-                    description=f"Digital service purchase: {transaction.product.name}"
+            if not claimed:
+                raise InvalidTransactionException(
+                    f"Transaction is already {transaction.status}"
                 )
-                
-                # Link wallet transaction to digital transaction
-                transaction.provider = transaction.provider
-                transaction.save()
-                
-            except Exception as e:
-                # If wallet debit fails, unlock wallet and return error
-                self._unlock_wallet(transaction.user)
-                raise e
             
-            # Get provider
-            try:
-                from apps.digital.services.provider_factory import ProviderFactory
-                provider = ProviderFactory.get_provider(transaction.provider)
-            except ValueError as e:
-                # Unlock wallet on provider error
-                self._unlock_wallet(transaction.user)
-                raise ProviderException(f"Provider error: {str(e)}")
-
-            # Execute purchase with provider
-            provider_response = provider.purchase(transaction)
-
-            # Process provider response
-            if provider_response.get('status') == 'success':
-                # Complete transaction
-                transaction.status = 'completed'
-                transaction.provider_response = provider_response
-                transaction.provider_transaction_id = provider_response.get('transaction_id')
-                transaction.completed_at = timezone.now()
-                transaction.save()
-                
-                # Unlock wallet
-                self._unlock_wallet(transaction.user)
-                
-                return {
-                    'status': 'success',
-                    'transaction_id': transaction.id,
-                    'reference': transaction.reference,
-                    'provider_response': provider_response,
-                    'message': 'Transaction completed successfully'
-                }
-            else:
-                # Handle failed transaction - rollback wallet
-                self._rollback_wallet_transaction(wallet_transaction)
-                
-                # Unlock wallet
-                self._unlock_wallet(transaction.user)
-                
-                # Update transaction status
-                transaction.status = 'failed'
-                transaction.provider_response = provider_response
-                transaction.failed_at = timezone.now()
-                transaction.save()
-                
-                raise ProviderException(f"Provider transaction failed: {provider_response.get('message')}")
+            transaction.status = 'processing'
+            
+            return self._execute(transaction)
                 
         except DigitalTransaction.DoesNotExist:
             raise InvalidTransactionException("Transaction not found")
         except Exception as e:
             # Log error
             logger.error(f"Error processing transaction {transaction_id}: {str(e)}")
-            
-            # Try to unlock wallet if it's still locked
-            try:
-                self._unlock_wallet(transaction.user)
-            except:
-                pass  # Ignore if user doesn't have a wallet
-            
             raise e
 
-    def _lock_wallet(self, user) -> Wallet:
+    def _execute(self, transaction: DigitalTransaction) -> Dict[str, Any]:
         """
-        Lock a user's wallet for transaction processing.
+        Run a claimed transaction: pick a provider with enough float, hold
+        funds, call the provider, then capture or release the hold and record
+        the outcome.
         
-        Args:
-            user: The user whose wallet to lock
-            
-        Returns:
-            Wallet object
-        """
-        wallet, created = Wallet.objects.get_or_create(user=user)
-        
-        if wallet.is_locked:
-            raise Exception("Wallet is already locked")
-        
-        wallet.is_locked = True
-        wallet.save()
-        
-        return wallet
-
-    def _unlock_wallet(self, user) -> Wallet:
-        """
-        Unlock a user's wallet after transaction processing.
+        Errors that leave the outcome unknown, such as timeouts, keep the
+        transaction in 'processing' with its hold open until it is verified.
         
         Args:
-            user: The user whose wallet to unlock
+            transaction: A transaction in 'processing' state
             
         Returns:
-            Wallet object
+            Dict containing transaction result
         """
-        wallet = Wallet.objects.get(user=user)
-        wallet.is_locked = False
-        wallet.save()
+        # Get provider
+        try:
+            from apps.digital.services.provider_factory import ProviderFactory
+            provider = ProviderFactory.get_healthy_provider(transaction.provider)
+        except ValueError as e:
+            self._mark_failed(transaction, {'message': str(e)})
+            raise ProviderException(f"Provider error: {str(e)}")
         
-        return wallet
-
-    def _debit_wallet(self, wallet: Wallet, amount: Decimal, 
-                     reference: str, description: str) -> WalletTransaction:
-        """
-        Debit an amount from a wallet.
+        # Take the amount off the provider's cached float before touching the
+        # wallet, rerouting when the provider cannot fund the purchase
+        provider = self.float_service.reserve_route(provider, transaction.amount, transaction.provider)
         
-        Args:
-            wallet: The wallet to debit
-            amount: Amount to debit
-            reference: Transaction reference
-            description: Description of the transaction
-            
-        Returns:
-            WalletTransaction object
-        """
-        balance_before = wallet.balance
-        balance_after = balance_before - amount
-        
-        # Create wallet transaction
-        wallet_transaction = WalletTransaction.objects.create(
-            wallet=wallet,
-            transaction_type='debit',
-            amount=amount,
-            balance_before=balance_before,
-            balance_after=balance_after,
-            reference=reference,
-            description=description,
-            status='pending'
-        )
+        if provider is None:
+            self._mark_failed(transaction, {'message': 'Insufficient provider float'})
+            raise ServiceNotAvailableException("Service temporarily unavailable: insufficient provider float")
         
-        # Update wallet balance
-        wallet.balance = balance_after
-        wallet.save()
+        # Record the aggregator actually used when failing over
+        transaction.provider = provider.name
         
-        # Mark wallet transaction as completed
-        wallet_transaction.status = 'completed'
-        wallet_transaction.processed_at = timezone.now()
-        wallet_transaction.save()
-        
-        return wallet_transaction
+        # Reserve funds; the wallet row is only locked for this short update
+        try:
+            hold = self.wallet_service.place_hold(
+                user=transaction.user,
+                amount=transaction.amount,
+                reference=transaction.reference,
+                description=f"Digital service purchase: {transaction.product.name}",
+                metadata={'transaction_id': transaction.id}
+            )
+        except InsufficientFundsException:
+            self.float_service.release(provider.name, transaction.amount)
+            self._mark_failed(transaction, {'message': 'Insufficient funds'})
+            raise
 
-    def _credit_wallet(self, wallet: Wallet, amount: Decimal, 
-                      reference: str, description: str) -> WalletTransaction:
-        """
-        Credit an amount to a wallet.
+        # Execute purchase with provider, outside any wallet critical section
+        try:
+            provider_response = provider.purchase(transaction)
+        except Exception as e:
+            logger.error(f"Provider {provider.name} raised on transaction {transaction.id}: {str(e)}")
+            provider_response = provider.handle_error(e)
         
-        Args:
-            wallet: The wallet to credit
-            amount: Amount to credit
-            reference: Transaction reference
-            description: Description of the transaction
+        # Process provider response
+        if provider_response.get('status') == 'success':
+            # Capture the reserved funds
+            self.wallet_service.capture_hold(hold)
             
-        Returns:
-            WalletTransaction object
-        """
-        balance_before = wallet.balance
-        balance_after = balance_before + amount
-        
-        # Create wallet transaction
-        wallet_transaction = WalletTransaction.objects.create(
-            wallet=wallet,
-            transaction_type='credit',
-            amount=amount,
-            balance_before=balance_before,
-            balance_after=balance_after,
-            reference=reference,
-            description=description,
-            status='pending'
-        )
-        
-        # Update wallet balance
-        wallet.balance = balance_after
-        wallet.save()
-        
-        # Mark wallet transaction as completed
-        wallet_transaction.status = 'completed'
-        wallet_transaction.processed_at = timezone.now()
-        wallet_transaction.save()
-        
-        return wallet_transaction
+            # Complete transaction
+            transaction.status = 'completed'
+            transaction.provider_response = provider_response
+            transaction.provider_transaction_id = provider_response.get('transaction_id') or ''
+            transaction.completed_at = timezone.now()
+            transaction.save(update_fields=[
+                'status', 'provider', 'provider_response', 'provider_transaction_id',
+                'completed_at', 'updated_at'
+            ])
+            self.webhook_events.publish_transactions([transaction])
+            
+            return {
+                'status': 'success',
+                'transaction_id': transaction.id,
+                'reference': transaction.reference,
+                'provider_response': provider_response,
+                'message': 'Transaction completed successfully'
+            }
+        elif provider_response.get('status') == 'failed' or provider_response.get('rejected'):
+            # Handle failed transaction - release the reserved funds and float
+            self.wallet_service.release_hold(hold)
+            self.float_service.release(provider.name, transaction.amount)
+            
+            # Update transaction status
+            self._mark_failed(transaction, provider_response)
+            
+            raise ProviderException(f"Provider transaction failed: {provider_response.get('message')}")
+        else:
+            # A timeout or other error does not tell whether the purchase was
+            # delivered, so the hold and float stay reserved and the stuck
+            # transaction sweep verifies it with the provider
+            transaction.provider_response = provider_response
+            transaction.save(update_fields=['provider', 'provider_response', 'updated_at'])
+            
+            logger.warning(
+                f"Transaction {transaction.id} outcome unknown, left for verification: "
+                f"{provider_response.get('message')}"
+            )
+            
+            return {
+                'status': 'processing',
+                'transaction_id': transaction.id,
+                'reference': transaction.reference,
+                'provider_response': provider_response,
+                'message': 'Transaction is awaiting provider confirmation'
+            }
 
-    def _rollback_wallet_transaction(self, wallet_transaction: WalletTransaction):
+    def _mark_failed(self, transaction: DigitalTransaction, provider_response: Dict[str, Any]):
         """
-        Rollback a wallet transaction by crediting the amount back.
+        Mark a transaction as failed.
         
         Args:
-            wallet_transaction: The wallet transaction to rollback
+            transaction: The transaction that failed
+            provider_response: Response or error details to store
         """
-        if wallet_transaction.transaction_type == 'debit':
-            # Credit the amount back to the wallet
-            wallet = wallet_transaction.wallet
-            credit_transaction = self._credit_wallet(
-                wallet=wallet,
-                amount=wallet_transaction.amount,
-                reference=f"R-{wallet_transaction.reference}",
-                description=f"Rollback: {wallet_transaction.description}"
-            )
-            
-            # Update original transaction status
-            wallet_transaction.status = 'reversed'
-            wallet_transaction.save()
-            
-            return credit_transaction
+        transaction.status = 'failed'
+        transaction.provider_response = provider_response
+        transaction.failed_at = timezone.now()
+        transaction.save(update_fields=['status', 'provider', 'provider_response', 'failed_at', 'updated_at'])
+        self.webhook_events.publish_transactions([transaction])
 
     def retry_transaction(self, transaction_id: str) -> Dict[str, Any]:
         """
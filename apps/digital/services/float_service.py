@@ -0,0 +1,156 @@
+import logging
+from decimal import Decimal, InvalidOperation
+from typing import Optional
+from django.conf import settings
+from django.core.cache import cache
+from apps.digital.providers.base_provider import BaseProvider
+
+
+logger = logging.getLogger(__name__)
+
+
+class ProviderFloatService:
+    """
+    Cached view of each provider's float (our prepaid balance with it).
+    
+    A Celery beat task refreshes the cache from get_balance(), and purchases
+    reserve their amount with an atomic cache decrement before any wallet
+    write, so a purchase the provider cannot fund is rejected or rerouted up
+    front instead of failing after the hold. Amounts are stored in pesewas so
+    Redis can update them with DECRBY/INCRBY.
+    
+    When a provider's float is unknown (never polled, or the cache entry
+    expired) purchases are let through.
+    """
+    
+    def refresh(self, provider: BaseProvider) -> Optional[Decimal]:
+        """
+        Fetch a provider's balance and cache it.
+        
+        Args:
+            provider: The provider to poll
+        
+        Returns:
+            The balance, or None if the provider did not return one
+        """
+        response = provider.get_balance()
+        
+        if response.get('status') != 'success':
+            logger.warning(f"Could not fetch {provider.name} float: {response.get('message')}")
+            return None
+        
+        try:
+            balance = Decimal(str(response.get('balance')))
+        except (InvalidOperation, ValueError):
+            logger.warning(f"Invalid {provider.name} float in balance response: {response.get('balance')}")
+            return None
+        
+        cache.set(self._cache_key(provider.name), self._to_pesewas(balance), settings.PROVIDER_FLOAT_CACHE_TIMEOUT)
+        return balance
+
+    def get_float(self, provider_name: str) -> Optional[Decimal]:
+        """
+        Get the cached float of a provider.
+        
+        Returns:
+            The remaining float, or None if unknown
+        """
+        pesewas = cache.get(self._cache_key(provider_name))
+        
+        if pesewas is None:
+            return None
+        
+        return Decimal(pesewas) / 100
+
+    def has_float(self, provider_name: str, amount: Decimal) -> bool:
+        """
+        Check, without reserving, that a provider can fund an amount.
+        """
+        remaining = self.get_float(provider_name)
+        return remaining is None or remaining - amount >= settings.PROVIDER_FLOAT_MINIMUM
+
+    def reserve(self, provider_name: str, amount: Decimal) -> bool:
+        """
+        Optimistically take an amount off a provider's cached float.
+        
+        Args:
+            provider_name: The provider to reserve float on
+            amount: Amount of the purchase
+        
+        Returns:
+            True if the purchase may go to the provider
+        """
+        key = self._cache_key(provider_name)
+        pesewas = self._to_pesewas(amount)
+        
+        try:
+            remaining = cache.decr(key, pesewas)
+        except ValueError:
+            # Float unknown
+            return True
+        
+        if remaining < self._to_pesewas(settings.PROVIDER_FLOAT_MINIMUM):
+            self._incr(key, pesewas)
+            return False
+        
+        return True
+
+    def release(self, provider_name: str, amount: Decimal):
+        """
+        Give back float reserved for a purchase the provider did not fulfil.
+        """
+        self._incr(self._cache_key(provider_name), self._to_pesewas(amount))
+
+    def reserve_route(self, provider: BaseProvider, amount: Decimal, original_name: str) -> Optional[BaseProvider]:
+        """
+        Reserve float on a provider, rerouting to an alternate with enough
+        float when it cannot fund the purchase.
+        
+        Args:
+            provider: The provider chosen for the purchase
+            amount: Amount of the purchase
+            original_name: Provider the product belongs to, whose
+                PROVIDER_FAILOVER alternates may be used
+        
+        Returns:
+            The provider the float was reserved on, or None if none can fund it
+        """
+        from apps.digital.services.provider_factory import ProviderFactory
+        
+        if self.reserve(provider.name, amount):
+            return provider
+        
+        for name in settings.PROVIDER_FAILOVER.get(original_name, []):
+            if name == provider.name or name not in ProviderFactory.get_available_providers():
+                continue
+            
+            alternate = ProviderFactory.get_provider(name)
+            
+            if alternate.breaker.is_available() and self.reserve(alternate.name, amount):
+                logger.warning(f"Provider {provider.name} float too low, rerouting to {alternate.name}")
+                return alternate
+        
+        return None
+
+    def _incr(self, key: str, pesewas: int):
+        """
+        Add pesewas back to a cached float, if it is still cached.
+        """
+        try:
+            cache.incr(key, pesewas)
+        except ValueError:
+            pass
+
+    @staticmethod
+    def _cache_key(provider_name: str) -> str:
+        """
+        Cache key holding a provider's float in pesewas.
+        """
+        return f"provider_float:{provider_name}"
+
+    @staticmethod
+    def _to_pesewas(amount: Decimal) -> int:
+        """
+        Convert a cedi amount to whole pesewas.
+        """
+        return int((Decimal(amount) * 100).to_integral_value())
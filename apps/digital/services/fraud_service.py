@@ -1,5 +1,6 @@
-from typing import Dict, Any
+from typing import Dict, Any, Iterable
 from apps.users.models import User
+from apps.digital.phone_numbers import parse_phone_number
 
 
 class FraudDetectionService:
@@ -13,7 +14,9 @@ class FraudDetectionService:
             'max_daily_amount': 10000,  # Maximum daily transaction amount
             'max_single_transaction': 1000,  # Maximum single transaction amount
             'min_transaction_interval': 60,  # Minimum seconds between transactions
-            'max_transactions_per_hour': 50,  # Maximum transactions per hour
+            'max_transactions_per_hour': 50,  # Maximum transactions per hour, a bulk order counting as one
+            'max_bulk_orders_per_hour': 10,  # Maximum bulk orders per hour
+            'max_bulk_recipients': 100000,  # Maximum recipients in one bulk order
         }
 
     def check_transaction_risk(self, user, phone_number: str, amount: float) -> Dict[str, Any]:
@@ -56,10 +59,70 @@ class FraudDetectionService:
             'reason': '; '.join(risk_factors) if risk_factors else 'No fraud detected'
         }
 
+    def check_batch_risk(self, user, phone_numbers: Iterable[str], unit_amount: float) -> Dict[str, Any]:
+        """
+        Check a bulk purchase for fraud risk in a single pass.
+        
+        User-level checks (amount limit, recent bulk orders, watch list) run
+        once for the whole batch; recipients with suspicious numbers are
+        rejected individually instead of failing the batch.
+        
+        The order's own recipients are not velocity events: bulk orders are
+        limited by max_bulk_orders_per_hour instead, the order being checked
+        included.
+        
+        Args:
+            user: The user initiating the bulk purchase
+            phone_numbers: The recipient phone numbers
+            unit_amount: The amount charged per recipient
+            
+        Returns:
+            Dict containing the batch fraud result and rejected recipients
+        """
+        risk_factors = []
+        
+        if unit_amount > self.config['max_single_transaction']:
+            risk_factors.append(f"Transaction amount {unit_amount} exceeds limit {self.config['max_single_transaction']}")
+        
+        recent_bulk_orders_count = self._get_recent_bulk_orders_count(user)
+        if recent_bulk_orders_count > self.config['max_bulk_orders_per_hour']:
+            risk_factors.append(f"Too many bulk orders ({recent_bulk_orders_count}) in the last hour")
+        
+        if self._is_user_on_watch_list(user):
+            risk_factors.append(f"User {user.email} is on fraud watch list")
+        
+        rejected = self.screen_phone_numbers(phone_numbers)
+        
+        return {
+            'is_fraud': len(risk_factors) > 0,
+            'risk_factors': risk_factors,
+            'risk_score': len(risk_factors),
+            'reason': '; '.join(risk_factors) if risk_factors else 'No fraud detected',
+            'rejected': rejected
+        }
+
+    def screen_phone_numbers(self, phone_numbers: Iterable[str]) -> Dict[str, str]:
+        """
+        Screen recipient phone numbers for suspicious patterns.
+        
+        Args:
+            phone_numbers: The recipient phone numbers
+            
+        Returns:
+            Dict of rejected phone number -> reason
+        """
+        return {
+            phone_number: f"Suspicious phone number pattern: {phone_number}"
+            for phone_number in phone_numbers
+            if self._is_suspicious_phone_number(phone_number)
+        }
+
     def _get_recent_transactions_count(self, user, hours: int = 1) -> int:
         """
         Get the number of recent transactions for a user.
         
+        A bulk order counts as one transaction, however many recipients it has.
+        
         Args:
             user: The user to check
             hours: Number of hours to look back
@@ -68,12 +131,37 @@ class FraudDetectionService:
             Number of transactions in the specified time period
         """
         from django.utils import timezone
-        from apps.digital.models import Transaction
+        from apps.digital.models import DigitalTransaction
+        from datetime import timedelta
+        
+        time_threshold = timezone.now() - timedelta(hours=hours)
+        
+        single_count = DigitalTransaction.objects.filter(
+            user=user,
+            bulk_order__isnull=True,
+            created_at__gte=time_threshold
+        ).count()
+        
+        return single_count + self._get_recent_bulk_orders_count(user, hours)
+
+    def _get_recent_bulk_orders_count(self, user, hours: int = 1) -> int:
+        """
+        Get the number of recent bulk orders for a user.
+        
+        Args:
+            user: The user to check
+            hours: Number of hours to look back
+            
+        Returns:
+            Number of bulk orders in the specified time period
+        """
+        from django.utils import timezone
+        from apps.digital.models import BulkOrder
         from datetime import timedelta
         
         time_threshold = timezone.now() - timedelta(hours=hours)
         
-        return Transaction.objects.filter(
+        return BulkOrder.objects.filter(
             user=user,
             created_at__gte=time_threshold
         ).count()
@@ -88,16 +176,17 @@ class FraudDetectionService:
         Returns:
             True if the phone number is suspicious, False otherwise
         """
-        # Example checks - these would be more sophisticated in a real system
-        if len(phone_number) < 10:
+        # Numbers that are not Ghanaian mobile numbers cannot be topped up
+        parsed = parse_phone_number(phone_number)
+        if parsed is None or parsed.network is None:
             return True
         
         # Check for repeated digits
-        if len(set(phone_number)) == 1:
+        if len(set(parsed.local)) == 1:
             return True
             
         # Check for sequential digits
-        if self._is_sequential(phone_number):
+        if self._is_sequential(parsed.local):
             return True
             
         return False
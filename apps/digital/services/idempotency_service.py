@@ -0,0 +1,206 @@
+import hashlib
+import json
+import logging
+from datetime import timedelta
+from functools import wraps
+from typing import Dict, Any, Optional
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction as db_transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from apps.digital.models import IdempotencyKey
+
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+
+
+class IdempotencyService:
+    """
+    Service class for storing and replaying responses keyed by Idempotency-Key.
+    
+    The unique (user, scope, key) index guarantees a single execution per key;
+    completed responses are also cached so a replay costs one cache hit.
+    """
+
+    def __init__(self):
+        self.cache_timeout = settings.IDEMPOTENCY_CACHE_TIMEOUT
+        self.lock_timeout = settings.IDEMPOTENCY_LOCK_TIMEOUT
+
+    def get_cached_response(self, user, scope: str, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a stored response from the cache.
+        
+        Returns:
+            Dict with request_hash, status and body, or None on a cache miss
+        """
+        return cache.get(self._cache_key(user, scope, key))
+
+    def claim(self, user, scope: str, key: str, request_hash: str):
+        """
+        Claim a key for execution.
+        
+        Args:
+            user: The user sending the request
+            scope: The endpoint the key applies to
+            key: The client-supplied key
+            request_hash: Fingerprint of the request payload
+            
+        Returns:
+            Tuple of (IdempotencyKey, claimed) where claimed is True if the
+            caller should execute the request
+        """
+        try:
+            with db_transaction.atomic():
+                record = IdempotencyKey.objects.create(
+                    user=user, scope=scope, key=key, request_hash=request_hash
+                )
+            return record, True
+        except IntegrityError:
+            record = IdempotencyKey.objects.get(user=user, scope=scope, key=key)
+        
+        if record.status == 'processing' and record.request_hash == request_hash:
+            # Take over keys abandoned by a crashed request
+            stale_before = timezone.now() - timedelta(seconds=self.lock_timeout)
+            taken = IdempotencyKey.objects.filter(
+                pk=record.pk, status='processing', updated_at__lt=stale_before
+            ).update(updated_at=timezone.now())
+            return record, bool(taken)
+        
+        return record, False
+
+    def complete(self, record: IdempotencyKey, response_status: int, response_body: Any):
+        """
+        Store the response produced for a claimed key.
+        """
+        record.status = 'completed'
+        record.response_status = response_status
+        record.response_body = response_body
+        record.save(update_fields=['status', 'response_status', 'response_body', 'updated_at'])
+        
+        self._cache(record)
+
+    def release(self, record: IdempotencyKey):
+        """
+        Drop a claimed key so the client can retry after a server error.
+        """
+        record.delete()
+
+    def replay(self, record: IdempotencyKey) -> Dict[str, Any]:
+        """
+        Cache and return a completed record in the stored-response format.
+        """
+        return self._cache(record)
+
+    def _cache(self, record: IdempotencyKey) -> Dict[str, Any]:
+        stored = {
+            'request_hash': record.request_hash,
+            'status': record.response_status,
+            'body': record.response_body,
+        }
+        cache.set(
+            self._cache_key(record.user, record.scope, record.key),
+            stored,
+            self.cache_timeout
+        )
+        return stored
+
+    def _cache_key(self, user, scope: str, key: str) -> str:
+        return f"idempotency:{user.pk}:{scope}:{key}"
+
+
+def keep_idempotency_key(request):
+    """
+    Store this request's response under its Idempotency-Key even if it is a
+    server error, because the request already had side effects.
+    """
+    request.keep_idempotency_key = True
+
+
+def _request_hash(request) -> str:
+    payload = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _error(code: str, message: str, response_status: int) -> Response:
+    return Response({
+        'error': {
+            'code': code,
+            'message': message
+        }
+    }, status=response_status)
+
+
+def _replayed(stored: Dict[str, Any]) -> Response:
+    response = Response(stored['body'], status=stored['status'])
+    response[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def idempotent(scope: str):
+    """
+    Make a function-based API view honour the Idempotency-Key header.
+    
+    Requests without the header run as before. A repeated key with the same
+    payload returns the original response; a repeated key with a different
+    payload is rejected. Server errors release the key so it can be retried,
+    unless the view called keep_idempotency_key() because the request had
+    already had side effects.
+    
+    Args:
+        scope: Name of the endpoint the keys belong to
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            key = request.headers.get(IDEMPOTENCY_HEADER)
+            
+            if not key:
+                return view_func(request, *args, **kwargs)
+            
+            if len(key) > 255:
+                return _error('VALIDATION_ERROR', 'Idempotency-Key must be at most 255 characters',
+                              status.HTTP_400_BAD_REQUEST)
+            
+            service = IdempotencyService()
+            request_hash = _request_hash(request)
+            
+            stored = service.get_cached_response(request.user, scope, key)
+            if stored is None:
+                record, claimed = service.claim(request.user, scope, key, request_hash)
+                
+                if not claimed:
+                    if record.request_hash != request_hash:
+                        stored = {'request_hash': record.request_hash}
+                    elif record.status == 'completed':
+                        stored = service.replay(record)
+                    else:
+                        return _error('IDEMPOTENCY_CONFLICT',
+                                      'A request with this Idempotency-Key is still being processed',
+                                      status.HTTP_409_CONFLICT)
+            
+            if stored is not None:
+                if stored['request_hash'] != request_hash:
+                    return _error('IDEMPOTENCY_KEY_REUSED',
+                                  'Idempotency-Key was already used with a different request',
+                                  status.HTTP_422_UNPROCESSABLE_ENTITY)
+                return _replayed(stored)
+            
+            try:
+                response = view_func(request, *args, **kwargs)
+            except Exception:
+                service.release(record)
+                raise
+            
+            if response.status_code >= 500 and not getattr(request, 'keep_idempotency_key', False):
+                service.release(record)
+            else:
+                service.complete(record, response.status_code, response.data)
+            
+            return response
+        return wrapper
+    return decorator
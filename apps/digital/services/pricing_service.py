@@ -1,12 +1,101 @@
+import threading
+import time
+from collections import OrderedDict
 from decimal import Decimal
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Tuple
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction as db_transaction
 from apps.digital.models import DigitalProduct, UserPricing
 from apps.users.models import User
 
 
+# Cached in place of a price for users without a UserPricing row, since
+# the cache returns None for missing keys
+NO_USER_PRICE = ''
+
+
+class LocalPriceBook:
+    """
+    Per-process LRU of (user, product) prices in front of the Redis price book.
+    
+    Entries expire after PRICE_BOOK_LOCAL_SECONDS, which bounds how long
+    another process can serve a price changed elsewhere; changes made in
+    this process drop their entries at once.
+    """
+    
+    def __init__(self):
+        self._entries: 'OrderedDict[Tuple[Any, Any], Tuple[str, Decimal, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id, product_id, role: str) -> Optional[Decimal]:
+        """
+        Get a cached price, or None if it is missing, expired or was cached
+        for another role.
+        """
+        key = (user_id, product_id)
+        
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            
+            entry_role, price, expires_at = entry
+            if entry_role != role or expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            
+            self._entries.move_to_end(key)
+            return price
+
+    def set(self, user_id, product_id, role: str, price: Decimal):
+        """
+        Cache a price, evicting the least recently used one when full.
+        """
+        expires_at = time.monotonic() + settings.PRICE_BOOK_LOCAL_SECONDS
+        
+        with self._lock:
+            self._entries[(user_id, product_id)] = (role, price, expires_at)
+            self._entries.move_to_end((user_id, product_id))
+            
+            while len(self._entries) > settings.PRICE_BOOK_LOCAL_SIZE:
+                self._entries.popitem(last=False)
+
+    def discard(self, product_id, user_id=None):
+        """
+        Drop the cached prices of a product, or of one user for a product.
+        """
+        with self._lock:
+            if user_id is not None:
+                self._entries.pop((user_id, product_id), None)
+                return
+            
+            for key in [key for key in self._entries if key[1] == product_id]:
+                del self._entries[key]
+
+    def clear(self):
+        """
+        Drop every cached price.
+        """
+        with self._lock:
+            self._entries.clear()
+
+
+_local_prices = LocalPriceBook()
+
+
 class PricingService:
     """
     Service class for handling pricing logic for digital products.
+    
+    Prices are read from a price book with two tiers: a per-process LRU keyed
+    by (user, product), then Redis, which holds each user's UserPricing
+    override (or its absence) and each product's precomputed price for every
+    role. Only a miss in both reaches the database, so on the purchase path a
+    price is a dictionary lookup.
+    
+    The post_save and post_delete signals of UserPricing and DigitalProduct
+    invalidate the affected entries once the change commits.
     """
     
     def __init__(self):
@@ -18,6 +107,11 @@ class PricingService:
             'reseller': 0.02 # 2% markup for resellers
         }
         
+        # Price multipliers, converted once rather than on every calculation
+        self.markup_multipliers = {
+            role: Decimal('1') + Decimal(str(markup)) for role, markup in self.default_markups.items()
+        }
+        
         # Default base prices (these would typically come from a database or API)
         self.default_base_prices = {
             # Data bundles
@@ -31,6 +125,8 @@ class PricingService:
             'airtime_50': Decimal('50.00'),
             'airtime_100': Decimal('100.00'),
         }
+        
+        self.cache_timeout = settings.PRICE_BOOK_CACHE_SECONDS
 
     def get_user_price(self, user: User, product: DigitalProduct) -> Decimal:
         """
@@ -43,13 +139,102 @@ class PricingService:
         Returns:
             The price for the user
         """
-        # First, check if there's a specific user pricing
-        try:
-            user_pricing = UserPricing.objects.get(user=user, product=product, is_active=True)
-            return user_pricing.price
-        except UserPricing.DoesNotExist:
-            # If no specific pricing, calculate based on user type and base price
-            return self._calculate_default_price(user, product)
+        price = _local_prices.get(user.pk, product.pk, user.role)
+        if price is not None:
+            return price
+        
+        price = self._price_book_lookup(user, product)
+        _local_prices.set(user.pk, product.pk, user.role, price)
+        return price
+
+    def _price_book_lookup(self, user: User, product: DigitalProduct) -> Decimal:
+        """
+        Get a price from Redis, filling in whatever is missing from the database.
+        """
+        user_key = self.user_price_cache_key(user.pk, product.pk)
+        product_key = self.product_prices_cache_key(product.pk)
+        
+        cached = cache.get_many([user_key, product_key])
+        user_price = cached.get(user_key)
+        role_prices = cached.get(product_key)
+        missing = {}
+        
+        if user_price is None:
+            user_price = UserPricing.objects.filter(
+                user=user, product=product, is_active=True
+            ).values_list('price', flat=True).first()
+            
+            if user_price is None:
+                user_price = NO_USER_PRICE
+            missing[user_key] = user_price
+        
+        if user_price != NO_USER_PRICE:
+            if missing:
+                cache.set_many(missing, self.cache_timeout)
+            return user_price
+        
+        if role_prices is None:
+            role_prices = self.role_prices(product)
+            missing[product_key] = role_prices
+        
+        if missing:
+            cache.set_many(missing, self.cache_timeout)
+        
+        return role_prices.get(user.role, role_prices['user'])
+
+    def role_prices(self, product: DigitalProduct) -> Dict[str, Decimal]:
+        """
+        Calculate a product's default price for every user type.
+        
+        Args:
+            product: The product to price
+        
+        Returns:
+            Dict of user type to price
+        """
+        base_price = self._base_price(product)
+        
+        return {
+            role: (base_price * multiplier).quantize(Decimal('0.01'))
+            for role, multiplier in self.markup_multipliers.items()
+        }
+
+    @staticmethod
+    def user_price_cache_key(user_id, product_id) -> str:
+        """
+        Get the price book key of a user's override for a product.
+        """
+        return f"digital:price_book:user:{user_id}:{product_id}"
+
+    @staticmethod
+    def product_prices_cache_key(product_id) -> str:
+        """
+        Get the price book key of a product's role prices.
+        """
+        return f"digital:price_book:product:{product_id}"
+
+    @classmethod
+    def invalidate(cls, product_id, user_id=None):
+        """
+        Drop a product's price book entries, or only a user's, once the
+        current transaction commits.
+        
+        Dropping them earlier would let a concurrent lookup cache the old
+        price again before the change is visible.
+        
+        Args:
+            product_id: Product whose prices changed
+            user_id: User whose override changed, or None for the product's
+                role prices
+        """
+        def drop():
+            if user_id is not None:
+                cache.delete(cls.user_price_cache_key(user_id, product_id))
+            else:
+                cache.delete(cls.product_prices_cache_key(product_id))
+            _local_prices.discard(product_id, user_id)
+        
+        db_transaction.on_commit(drop)
 
     def _calculate_default_price(self, user: User, product: DigitalProduct) -> Decimal:
         """
@@ -62,21 +247,18 @@ class PricingService:
         Returns:
             The calculated price
         """
+        return self.get_pricing_for_user_type(user.role, product)
+
+    def _base_price(self, product: DigitalProduct) -> Decimal:
+        """
+        Get the base price of a product before markup.
+        """
         # Get base price - this could come from the product itself or default prices
         if product.denomination:
-            base_price = product.denomination
-        else:
-            # Use a default price based on product code if available
-            base_price = self.default_base_prices.get(product.code, Decimal('10.00'))
+            return product.denomination
         
-        # Get markup percentage based on user type
-        markup_percentage = self.default_markups.get(user.user_type, self.default_markups['user'])
-        
-        # Calculate final price with markup
-        markup_amount = base_price * Decimal(str(markup_percentage))
-        final_price = base_price + markup_amount
-        
-        return final_price.quantize(Decimal('0.01'))  # Round to 2 decimal places
+        # Use a default price based on product code if available
+        return self.default_base_prices.get(product.code, Decimal('10.00'))
 
     def set_user_pricing(self, user: User, product: DigitalProduct, price: Decimal) -> UserPricing:
         """
@@ -114,13 +296,6 @@ class PricingService:
         Returns:
             The calculated price for the user type
         """
-        if product.denomination:
-            base_price = product.denomination
-        else:
-            base_price = self.default_base_prices.get(product.code, Decimal('10.00'))
-        
-        markup_percentage = self.default_markups.get(user_type, self.default_markups['user'])
-        markup_amount = base_price * Decimal(str(markup_percentage))
-        final_price = base_price + markup_amount
+        multiplier = self.markup_multipliers.get(user_type, self.markup_multipliers['user'])
         
-        return final_price.quantize(Decimal('0.01'))
\ No newline at end of file
+        return (self._base_price(product) * multiplier).quantize(Decimal('0.01'))
\ No newline at end of file
@@ -1,12 +1,22 @@
+import logging
+import threading
 from typing import Type, Dict
+from django.conf import settings
 from apps.digital.providers.base_provider import BaseProvider
 from apps.digital.providers.mtn_provider import MTNProvider
 # Additional providers will be imported as they are created
 
 
+logger = logging.getLogger(__name__)
+
+
 class ProviderFactory:
     """
     Factory class to create and manage provider instances.
+    
+    Providers are stateless apart from their HTTP transport, so one instance
+    per provider is created lazily and shared, keeping its connection pool
+    warm across purchases.
     """
     
     _providers: Dict[str, Type[BaseProvider]] = {
@@ -16,6 +26,9 @@ class ProviderFactory:
         # 'airteltigo': AirtelTigoProvider,
         # 'waec': WAECProvider,
     }
+    
+    _instances: Dict[str, BaseProvider] = {}
+    _lock = threading.Lock()
 
     @classmethod
     def register_provider(cls, name: str, provider_class: Type[BaseProvider]):
@@ -26,15 +39,17 @@ class ProviderFactory:
             name: The name of the provider
             provider_class: The provider class to register
         """
-        cls._providers[name.lower()] = provider_class
+        with cls._lock:
+            cls._providers[name.lower()] = provider_class
+            cls._instances.pop(name.lower(), None)
 
     @classmethod
     def get_provider(cls, provider_name: str) -> BaseProvider:
         """
-        Get an instance of a provider by name.
+        Get the shared instance of a provider by name.
         
         Args:
-            provider_name: The name of the provider to instantiate
+            provider_name: The name of the provider
             
         Returns:
             An instance of the requested provider
@@ -49,8 +64,64 @@ class ProviderFactory:
             raise ValueError(f"Provider '{provider_name}' is not registered. "
                            f"Available providers: {available_providers}")
         
-        provider_class = cls._providers[provider_name]
-        return provider_class()
+        provider = cls._instances.get(provider_name)
+        
+        if provider is None:
+            with cls._lock:
+                provider = cls._instances.get(provider_name)
+                if provider is None:
+                    provider = cls._providers[provider_name]()
+                    provider.name = provider_name
+                    cls._instances[provider_name] = provider
+        
+        return provider
+
+    @classmethod
+    def get_healthy_provider(cls, provider_name: str) -> BaseProvider:
+        """
+        Get a provider, failing over to an alternate when it is unhealthy.
+        
+        The provider is used while its health score stays at or above
+        PROVIDER_FAILOVER_MIN_HEALTH. Otherwise the healthiest alternate listed
+        in PROVIDER_FAILOVER is used if it scores better. When every candidate
+        is down the original provider is returned and its open circuit rejects
+        the call immediately.
+        
+        Args:
+            provider_name: The name of the preferred provider
+            
+        Returns:
+            An instance of the provider to use
+            
+        Raises:
+            ValueError: If the provider is not registered
+        """
+        provider = cls.get_provider(provider_name)
+        score = provider.breaker.health_score()
+        
+        if score >= settings.PROVIDER_FAILOVER_MIN_HEALTH:
+            return provider
+        
+        alternates = [
+            cls.get_provider(name)
+            for name in settings.PROVIDER_FAILOVER.get(provider.name, [])
+            if name.lower() in cls._providers
+        ]
+        
+        if not alternates:
+            return provider
+        
+        best = max(alternates, key=lambda alternate: alternate.breaker.health_score())
+        best_score = best.breaker.health_score()
+        
+        if best_score <= score:
+            return provider
+        
+        logger.warning(
+            f"Provider {provider.name} unhealthy (score {score:.2f}), "
+            f"failing over to {best.name} (score {best_score:.2f})"
+        )
+        return best
 
     @classmethod
     def get_available_providers(cls) -> list:
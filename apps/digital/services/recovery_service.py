@@ -0,0 +1,317 @@
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from typing import Dict, Any, List, Optional
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction as db_transaction
+from django.db.models import F
+from django.utils import timezone
+from apps.digital.models import BulkOrder, DigitalTransaction
+from apps.digital.providers.base_provider import BaseProvider
+from apps.digital.services.customer_webhook_service import CustomerWebhookService
+from apps.wallets.models import WalletHold
+from apps.wallets.services.wallet_service import WalletService
+
+
+logger = logging.getLogger(__name__)
+
+# Provider statuses meaning the provider has not finished the transaction yet
+PROVIDER_PENDING_STATUSES = ('pending', 'processing', 'queued', 'in_progress')
+
+
+class TransactionRecoveryService:
+    """
+    Service class for recovering transactions stuck in 'processing'.
+    
+    A transaction stays in 'processing' when its worker dies between claiming
+    it and recording the provider's answer, or when the provider call ends
+    without a definite answer, e.g. on a timeout. The sweep pages through such
+    transactions older than STUCK_TRANSACTION_AGE_SECONDS in primary key
+    order, verifies each page with the providers concurrently, then settles
+    the page in one database transaction: completed and failed rows are
+    written with a single bulk_update, wallet holds are captured or released
+    and failed bulk order recipients are refunded with one credit per order.
+    
+    Transactions the provider could not be asked about, or is still working
+    on, are left for the next sweep, as are the children of bulk orders that
+    are still being processed. Provider floats are not adjusted; the
+    next float poll brings them back in line.
+    """
+    
+    LOCK_KEY = 'digital:stuck_transaction_sweep'
+    
+    def __init__(self):
+        self.wallet_service = WalletService()
+        self.batch_size = settings.STUCK_TRANSACTION_BATCH_SIZE
+        self.concurrency = settings.STUCK_TRANSACTION_VERIFY_CONCURRENCY
+
+    def sweep(self, max_transactions: Optional[int] = None) -> Dict[str, int]:
+        """
+        Verify and settle stale 'processing' transactions.
+        
+        Only one sweep runs at a time across workers.
+        
+        Args:
+            max_transactions: Stop after this many transactions, defaults to
+                STUCK_TRANSACTION_MAX_PER_SWEEP
+        
+        Returns:
+            Counts of checked, completed, failed and unresolved transactions
+        """
+        stats = {'checked': 0, 'completed': 0, 'failed': 0, 'unresolved': 0}
+        
+        if not cache.add(self.LOCK_KEY, 1, settings.STUCK_TRANSACTION_SWEEP_LOCK_SECONDS):
+            logger.info("Stuck transaction sweep already running")
+            return stats
+        
+        try:
+            limit = max_transactions or settings.STUCK_TRANSACTION_MAX_PER_SWEEP
+            cutoff = timezone.now() - timedelta(seconds=settings.STUCK_TRANSACTION_AGE_SECONDS)
+            last_id = ''
+            
+            while stats['checked'] < limit:
+                page = list(
+                    DigitalTransaction.objects.select_related('user')
+                    .filter(status='processing', updated_at__lt=cutoff, id__gt=last_id)
+                    .order_by('id')[:min(self.batch_size, limit - stats['checked'])]
+                )
+                
+                if not page:
+                    break
+                
+                last_id = page[-1].id
+                
+                for key, count in self.recover(page).items():
+                    stats[key] += count
+        finally:
+            cache.delete(self.LOCK_KEY)
+        
+        logger.info(f"Stuck transaction sweep: {stats}")
+        return stats
+
+    def recover(self, transactions: List[DigitalTransaction]) -> Dict[str, int]:
+        """
+        Verify a page of stuck transactions and settle the ones with a final answer.
+        
+        Args:
+            transactions: Transactions in 'processing' state
+        
+        Returns:
+            Counts of checked, completed, failed and unresolved transactions
+        """
+        from apps.digital.services.provider_factory import ProviderFactory
+        
+        # Children of a bulk order that is still running belong to its worker
+        live_orders = set(
+            BulkOrder.objects.filter(
+                pk__in={t.bulk_order_id for t in transactions if t.bulk_order_id},
+                status='processing'
+            ).values_list('pk', flat=True)
+        )
+        
+        by_provider = defaultdict(list)
+        for transaction in transactions:
+            if transaction.bulk_order_id not in live_orders:
+                by_provider[transaction.provider].append(transaction)
+        
+        outcomes = {}
+        for provider_name, group in by_provider.items():
+            if provider_name not in ProviderFactory.get_available_providers():
+                logger.warning(f"Cannot verify {len(group)} stuck transactions: unknown provider {provider_name}")
+                continue
+            
+            provider = ProviderFactory.get_provider(provider_name)
+            results = self.verify_batch(provider, group)
+            
+            for transaction, result in zip(group, results):
+                outcome = self._outcome(result)
+                if outcome:
+                    outcomes[transaction.id] = (outcome, result)
+        
+        settled = self._settle(transactions, outcomes) if outcomes else {'completed': 0, 'failed': 0}
+        
+        return {
+            'checked': len(transactions),
+            'completed': settled['completed'],
+            'failed': settled['failed'],
+            'unresolved': len(transactions) - settled['completed'] - settled['failed'],
+        }
+
+    def verify_batch(self, provider: BaseProvider, transactions: List[DigitalTransaction]) -> List[Dict[str, Any]]:
+        """
+        Verify transactions with a provider, at most `concurrency` at a time.
+        
+        Transactions are looked up by provider transaction ID when the
+        provider returned one, otherwise by our reference.
+        
+        Returns:
+            List of verification responses, in the same order as transactions
+        """
+        async def run():
+            semaphore = asyncio.Semaphore(self.concurrency)
+            
+            async def verify(transaction):
+                async with semaphore:
+                    try:
+                        return await provider.averify_transaction(
+                            transaction.provider_transaction_id or transaction.reference
+                        )
+                    except Exception as e:
+                        return provider.handle_error(e)
+            
+            try:
+                return await asyncio.gather(*(verify(transaction) for transaction in transactions))
+            finally:
+                await provider.aclose()
+        
+        return asyncio.run(run())
+
+    @staticmethod
+    def _outcome(result: Dict[str, Any]) -> Optional[str]:
+        """
+        Map a verification response to 'completed', 'failed' or None (unknown).
+        
+        Only answers to a successful lookup are trusted: an error response
+        could hide a delivered purchase, so it is retried on the next sweep.
+        """
+        if result.get('status') != 'success':
+            return None
+        
+        if result.get('verified'):
+            return 'completed'
+        
+        if str(result.get('status_message') or '').lower() in PROVIDER_PENDING_STATUSES:
+            return None
+        
+        return 'failed'
+
+    def _settle(self, transactions: List[DigitalTransaction],
+                outcomes: Dict[str, tuple]) -> Dict[str, int]:
+        """
+        Apply verification outcomes and settle the money they affect.
+        
+        Args:
+            transactions: The page of transactions that was verified
+            outcomes: Transaction ID -> (outcome, verification response)
+        
+        Returns:
+            Counts of completed and failed transactions
+        """
+        counts = {'completed': 0, 'failed': 0}
+        now = timezone.now()
+        
+        with db_transaction.atomic():
+            # Skip rows a webhook or retry moved on while we were verifying
+            still_processing = set(
+                DigitalTransaction.objects.select_for_update()
+                .filter(id__in=list(outcomes), status='processing')
+                .values_list('id', flat=True)
+            )
+            
+            changed = []
+            for transaction in transactions:
+                if transaction.id not in still_processing:
+                    continue
+                
+                outcome, result = outcomes[transaction.id]
+                transaction.status = outcome
+                transaction.provider_response = {**(transaction.provider_response or {}), 'verification': result}
+                transaction.updated_at = now
+                
+                if outcome == 'completed':
+                    transaction.completed_at = now
+                    provider_id = (result.get('provider_response') or {}).get('transaction_id')
+                    if provider_id and not transaction.provider_transaction_id:
+                        transaction.provider_transaction_id = provider_id
+                else:
+                    transaction.failed_at = now
+                
+                counts[outcome] += 1
+                changed.append(transaction)
+            
+            if not changed:
+                return counts
+            
+            DigitalTransaction.objects.bulk_update(
+                changed,
+                ['status', 'provider_response', 'provider_transaction_id',
+                 'completed_at', 'failed_at', 'updated_at']
+            )
+            CustomerWebhookService().publish_transactions(changed)
+            self.settle_funds(changed)
+        
+        return counts
+
+    def settle_funds(self, transactions: List[DigitalTransaction]):
+        """
+        Settle the money of transactions that just left 'processing'.
+        
+        Must run in the database transaction that saved their new status.
+        
+        Args:
+            transactions: Transactions now 'completed' or 'failed'
+        """
+        self._settle_holds([t for t in transactions if t.bulk_order_id is None])
+        self._settle_bulk_orders([t for t in transactions if t.bulk_order_id is not None])
+
+    def _settle_holds(self, transactions: List[DigitalTransaction]):
+        """
+        Capture or release the open wallet holds of single purchases.
+        
+        Transactions that crashed before their hold was placed have none.
+        """
+        if not transactions:
+            return
+        
+        status_by_reference = {t.reference: t.status for t in transactions}
+        holds = WalletHold.objects.select_related('user').filter(
+            reference__in=list(status_by_reference), status='held'
+        )
+        
+        for hold in holds:
+            if status_by_reference[hold.reference] == 'completed':
+                self.wallet_service.capture_hold(hold)
+            else:
+                self.wallet_service.release_hold(hold)
+
+    def _settle_bulk_orders(self, transactions: List[DigitalTransaction]):
+        """
+        Update bulk order counters and refund failed recipients, one credit per order.
+        
+        Bulk recipients are paid for up front with a single wallet debit. The
+        status of finished bulk orders is recomputed from the new counters;
+        an order still being processed gets its status when it finishes.
+        """
+        if not transactions:
+            return
+        
+        by_order = defaultdict(list)
+        for transaction in transactions:
+            by_order[transaction.bulk_order_id].append(transaction)
+        
+        for bulk_order in BulkOrder.objects.select_related('user').filter(pk__in=list(by_order)):
+            group = by_order[bulk_order.pk]
+            failed = [t for t in group if t.status == 'failed']
+            
+            if failed:
+                self.wallet_service.credit(
+                    user=bulk_order.user,
+                    amount=sum((t.amount for t in failed), Decimal('0.00')),
+                    reference=f"R-{bulk_order.batch_number}-{failed[0].id}",
+                    description=f"Bulk purchase refund: {len(failed)} failed recipients",
+                    transaction_type='refund',
+                    metadata={'bulk_order_id': str(bulk_order.id)}
+                )
+            
+            BulkOrder.objects.filter(pk=bulk_order.pk).update(
+                successful_count=F('successful_count') + (len(group) - len(failed)),
+                failed_count=F('failed_count') + len(failed)
+            )
+            
+            bulk_order.refresh_from_db(fields=['successful_count', 'failed_count', 'total_recipients'])
+            BulkOrder.objects.filter(pk=bulk_order.pk).exclude(status='processing').update(
+                status=bulk_order.settled_status()
+            )
@@ -0,0 +1,238 @@
+import csv
+import json
+import logging
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal, InvalidOperation
+from typing import Dict, Any, Iterable, Iterator, List, Optional, TextIO
+from django.conf import settings
+from django.utils import timezone
+from apps.digital.models import DigitalTransaction
+
+
+logger = logging.getLogger(__name__)
+
+# Settlement file column names, by the field they hold
+REFERENCE_COLUMNS = ('reference', 'merchant_reference', 'customer_reference', 'client_reference')
+PROVIDER_ID_COLUMNS = ('provider_transaction_id', 'transaction_id', 'external_id', 'provider_reference')
+AMOUNT_COLUMNS = ('amount', 'settled_amount', 'value')
+STATUS_COLUMNS = ('status', 'state', 'result')
+
+SETTLED_STATUSES = ('success', 'successful', 'completed', 'settled', 'delivered')
+FAILED_STATUSES = ('failed', 'declined', 'reversed', 'cancelled', 'rejected')
+
+REPORT_FIELDS = (
+    'type', 'line', 'reference', 'provider_transaction_id', 'transaction_id',
+    'settlement_amount', 'amount', 'settlement_status', 'status'
+)
+
+_TRANSACTION_FIELDS = ('id', 'reference', 'provider_transaction_id', 'amount', 'status')
+
+
+class SettlementReconciliationService:
+    """
+    Service class for reconciling provider settlement files with our transactions.
+    
+    The file is streamed and matched one batch of lines at a time: one IN
+    query by reference, then one by provider transaction ID for the lines
+    still unmatched, so memory stays bounded by the batch size whatever the
+    file size. Discrepancies are written to the report as they are found.
+    
+    Settled lines mark their transaction's settled_at, which lets transactions
+    completed on the settlement date but absent from the file be found with
+    one streamed query at the end.
+    """
+    
+    def __init__(self, provider: str, batch_size: Optional[int] = None):
+        self.provider = provider
+        self.batch_size = batch_size or settings.SETTLEMENT_BATCH_SIZE
+
+    def reconcile(self, lines: Iterable[Dict[str, Any]], report: TextIO,
+                  settlement_date: Optional[date] = None) -> Dict[str, Any]:
+        """
+        Reconcile settlement lines and write a discrepancy report.
+        
+        Args:
+            lines: Settlement lines as dicts, e.g. from read_lines()
+            report: Text file the CSV discrepancy report is written to
+            settlement_date: Date the file settles; when given, our completed
+                transactions of that date missing from the file are reported
+        
+        Returns:
+            Dict of line, match and discrepancy counts
+        """
+        writer = csv.DictWriter(report, fieldnames=REPORT_FIELDS)
+        writer.writeheader()
+        
+        stats = {
+            'lines': 0,
+            'matched': 0,
+            'settled_amount': Decimal('0.00'),
+            'discrepancies': {},
+        }
+        
+        batch = []
+        for line_number, line in enumerate(lines, start=1):
+            batch.append((line_number, line))
+            
+            if len(batch) >= self.batch_size:
+                self._reconcile_batch(batch, writer, stats)
+                batch = []
+        
+        if batch:
+            self._reconcile_batch(batch, writer, stats)
+        
+        if settlement_date is not None:
+            self._report_unsettled(settlement_date, writer, stats)
+        
+        stats['settled_amount'] = str(stats['settled_amount'])
+        logger.info(f"Reconciled {self.provider} settlement: {stats}")
+        return stats
+
+    @staticmethod
+    def read_lines(path: str, file_format: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Stream the lines of a CSV (with a header row) or JSONL settlement file.
+        
+        Args:
+            path: Path of the settlement file
+            file_format: 'csv' or 'jsonl', defaults to the file extension
+        """
+        file_format = file_format or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        
+        with open(path, encoding='utf-8-sig', newline='') as settlement_file:
+            if file_format == 'jsonl':
+                for raw in settlement_file:
+                    if raw.strip():
+                        yield json.loads(raw)
+            else:
+                for row in csv.DictReader(settlement_file):
+                    yield {(key or '').strip().lower(): value for key, value in row.items()}
+
+    def _reconcile_batch(self, batch: List[tuple], writer: csv.DictWriter, stats: Dict[str, Any]):
+        """
+        Match a batch of lines with two IN lookups and report their discrepancies.
+        """
+        parsed = [(line_number, self._parse(line)) for line_number, line in batch]
+        
+        references = [entry['reference'] for _, entry in parsed if entry['reference']]
+        by_reference = {
+            t['reference']: t
+            for t in DigitalTransaction.objects.filter(reference__in=references).values(*_TRANSACTION_FIELDS)
+        }
+        
+        provider_ids = [
+            entry['provider_transaction_id'] for _, entry in parsed
+            if entry['reference'] not in by_reference and entry['provider_transaction_id']
+        ]
+        by_provider_id = {}
+        if provider_ids:
+            by_provider_id = {
+                t['provider_transaction_id']: t
+                for t in DigitalTransaction.objects.filter(
+                    provider=self.provider, provider_transaction_id__in=provider_ids
+                ).values(*_TRANSACTION_FIELDS)
+            }
+        
+        settled_ids = []
+        
+        for line_number, entry in parsed:
+            stats['lines'] += 1
+            transaction = by_reference.get(entry['reference']) or by_provider_id.get(entry['provider_transaction_id'])
+            
+            if transaction is None:
+                self._report(writer, stats, 'missing_transaction', line_number, entry)
+                continue
+            
+            stats['matched'] += 1
+            
+            if entry['amount'] is None or entry['amount'] != transaction['amount']:
+                self._report(writer, stats, 'amount_mismatch', line_number, entry, transaction)
+            
+            if entry['status'] == 'settled':
+                stats['settled_amount'] += entry['amount'] or Decimal('0.00')
+                settled_ids.append(transaction['id'])
+                
+                if transaction['status'] != 'completed':
+                    self._report(writer, stats, 'settled_not_completed', line_number, entry, transaction)
+            elif entry['status'] == 'failed' and transaction['status'] == 'completed':
+                self._report(writer, stats, 'completed_not_settled', line_number, entry, transaction)
+        
+        if settled_ids:
+            DigitalTransaction.objects.filter(id__in=settled_ids, settled_at__isnull=True).update(
+                settled_at=timezone.now()
+            )
+
+    def _report_unsettled(self, settlement_date: date, writer: csv.DictWriter, stats: Dict[str, Any]):
+        """
+        Report transactions completed on the settlement date that no settled line matched.
+        """
+        # A range rather than completed_at__date, so digital_txn_unsettled applies
+        day_start = timezone.make_aware(datetime.combine(settlement_date, time.min))
+        
+        unsettled = DigitalTransaction.objects.filter(
+            provider=self.provider,
+            status='completed',
+            completed_at__gte=day_start,
+            completed_at__lt=day_start + timedelta(days=1),
+            settled_at__isnull=True
+        ).values(*_TRANSACTION_FIELDS).order_by('id')
+        
+        for transaction in unsettled.iterator(chunk_size=self.batch_size):
+            self._report(writer, stats, 'missing_from_settlement', None, None, transaction)
+
+    @staticmethod
+    def _report(writer: csv.DictWriter, stats: Dict[str, Any], discrepancy: str,
+                line_number: Optional[int], entry: Optional[Dict[str, Any]],
+                transaction: Optional[Dict[str, Any]] = None):
+        """
+        Write one discrepancy to the report and count it.
+        """
+        stats['discrepancies'][discrepancy] = stats['discrepancies'].get(discrepancy, 0) + 1
+        
+        entry = entry or {}
+        transaction = transaction or {}
+        
+        writer.writerow({
+            'type': discrepancy,
+            'line': line_number or '',
+            'reference': entry.get('reference') or transaction.get('reference') or '',
+            'provider_transaction_id': entry.get('provider_transaction_id') or transaction.get('provider_transaction_id') or '',
+            'transaction_id': transaction.get('id') or '',
+            'settlement_amount': entry.get('amount') if entry.get('amount') is not None else '',
+            'amount': transaction.get('amount') if transaction.get('amount') is not None else '',
+            'settlement_status': entry.get('raw_status') or '',
+            'status': transaction.get('status') or '',
+        })
+
+    @staticmethod
+    def _parse(line: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Pick the reference, provider ID, amount and status out of a settlement line.
+        """
+        def first(columns):
+            for column in columns:
+                value = line.get(column)
+                if value not in (None, ''):
+                    return str(value).strip()
+            return ''
+        
+        try:
+            amount = Decimal(first(AMOUNT_COLUMNS)).quantize(Decimal('0.01'))
+        except InvalidOperation:
+            amount = None
+        
+        raw_status = first(STATUS_COLUMNS)
+        status = raw_status.lower()
+        
+        if status in SETTLED_STATUSES:
+            status = 'settled'
+        elif status in FAILED_STATUSES:
+            status = 'failed'
+        
+        return {
+            'reference': first(REFERENCE_COLUMNS),
+            'provider_transaction_id': first(PROVIDER_ID_COLUMNS),
+            'amount': amount,
+            'status': status,
+            'raw_status': raw_status,
+        }
@@ -0,0 +1,283 @@
+import hashlib
+import json
+import logging
+from typing import Dict, Any, Optional, Tuple
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction as db_transaction
+from django.db.models import F
+from django.utils import timezone
+from apps.digital.models import DigitalTransaction, WebhookInbox
+from apps.digital.services.customer_webhook_service import CustomerWebhookService
+from apps.digital.services.recovery_service import TransactionRecoveryService
+
+
+logger = logging.getLogger(__name__)
+
+# Webhook statuses and the transaction status they set. Anything else, such
+# as a provider-side refund, is recorded but never applied: moving money is
+# left to WalletService flows, not to provider callbacks.
+WEBHOOK_STATUSES = {
+    'success': 'completed',
+    'failed': 'failed',
+}
+
+# Payload fields holding the provider's event ID, in order of preference
+EVENT_ID_FIELDS = ('event_id', 'notification_id', 'webhook_id', 'id')
+
+
+class WebhookService:
+    """
+    Service class for provider webhooks.
+    
+    The webhook endpoint only appends the raw body to the WebhookInbox table,
+    so providers get their 200 after a single INSERT. Celery drains the inbox
+    in batches: each batch is claimed with SELECT ... FOR UPDATE SKIP LOCKED,
+    its transactions are fetched with one IN query and updated with one
+    bulk_update, and the inbox rows are marked with one UPDATE.
+    
+    Webhooks that arrive before the purchase recorded the provider transaction
+    ID are retried on later drains, up to WEBHOOK_INBOX_MAX_ATTEMPTS times.
+    
+    Redeliveries are dropped on insert by the unique (provider, event_id)
+    index, and events that would move a transaction's status backwards, such
+    as a late 'processing' after 'completed', are recorded but not applied.
+    Statuses missing from WEBHOOK_STATUSES are marked failed as unprocessable.
+    When a webhook settles a transaction, its wallet hold or bulk order refund
+    is settled in the same database transaction, as the stuck transaction
+    sweep does.
+    """
+    
+    DRAIN_SCHEDULED_KEY = 'digital:webhook_drain_scheduled'
+    
+    def __init__(self):
+        self.batch_size = settings.WEBHOOK_INBOX_BATCH_SIZE
+        self.max_attempts = settings.WEBHOOK_INBOX_MAX_ATTEMPTS
+
+    def ingest(self, provider: str, body: bytes, payload: Dict[str, Any]) -> Optional[WebhookInbox]:
+        """
+        Store a verified webhook and make sure a drain is coming.
+        
+        Args:
+            provider: Provider the webhook came from
+            body: Raw request body
+            payload: The parsed body
+        
+        Returns:
+            The pending WebhookInbox row, or None if the event was already received
+        """
+        try:
+            with db_transaction.atomic():
+                entry = WebhookInbox.objects.create(
+                    provider=provider,
+                    event_id=self.event_id(payload, body),
+                    body=body.decode('utf-8')
+                )
+        except IntegrityError:
+            logger.info(f"Dropped duplicate {provider} webhook")
+            return None
+        
+        self.schedule_drain()
+        return entry
+
+    @staticmethod
+    def event_id(payload: Dict[str, Any], body: bytes) -> str:
+        """
+        Get the provider's ID for a webhook event.
+        
+        Providers without event IDs redeliver the same body, so its hash
+        stands in for one.
+        """
+        if isinstance(payload, dict):
+            for field in EVENT_ID_FIELDS:
+                if payload.get(field) not in (None, ''):
+                    return str(payload[field])[:255]
+        
+        return f"sha256:{hashlib.sha256(body).hexdigest()}"
+
+    def schedule_drain(self):
+        """
+        Queue a drain task, at most once per WEBHOOK_INBOX_DRAIN_DELAY seconds.
+        
+        Webhooks arriving in the same window are picked up by the same drain.
+        """
+        from apps.digital.tasks import drain_webhook_inbox
+        
+        delay = settings.WEBHOOK_INBOX_DRAIN_DELAY
+        
+        if cache.add(self.DRAIN_SCHEDULED_KEY, 1, max(delay, 1)):
+            drain_webhook_inbox.apply_async(countdown=delay)
+
+    def drain(self) -> Dict[str, int]:
+        """
+        Process pending inbox rows, one batch at a time, until none are left.
+        
+        Returns:
+            Counts of processed, stale, retried and failed webhooks
+        """
+        stats = {'processed': 0, 'stale': 0, 'retried': 0, 'failed': 0}
+        last_id = 0
+        
+        while True:
+            # Rows left pending for a retry are not claimed again in this drain
+            batch_stats, last_id = self.process_batch(after_id=last_id)
+            
+            for key, count in batch_stats.items():
+                stats[key] += count
+            
+            if sum(batch_stats.values()) < self.batch_size:
+                break
+        
+        if any(stats.values()):
+            logger.info(f"Drained webhook inbox: {stats}")
+        return stats
+
+    def process_batch(self, after_id: int = 0) -> Tuple[Dict[str, int], int]:
+        """
+        Claim and apply one batch of pending webhooks.
+        
+        Args:
+            after_id: Only claim inbox rows with a greater ID
+        
+        Returns:
+            Tuple of (counts of processed, stale, retried and failed webhooks,
+            last claimed inbox row ID)
+        """
+        stats = {'processed': 0, 'stale': 0, 'retried': 0, 'failed': 0}
+        
+        with db_transaction.atomic():
+            entries = list(
+                WebhookInbox.objects.select_for_update(skip_locked=True)
+                .filter(status='pending', id__gt=after_id)
+                .order_by('id')[:self.batch_size]
+            )
+            
+            if not entries:
+                return stats, after_id
+            
+            events = []
+            invalid = []
+            
+            for entry in entries:
+                try:
+                    payload = json.loads(entry.body)
+                    provider_id = str(payload['transaction_id'])
+                except (ValueError, KeyError, TypeError) as e:
+                    invalid.append(entry)
+                    entry.error = f"Invalid payload: {str(e)}"
+                    continue
+                
+                if payload.get('status') not in WEBHOOK_STATUSES:
+                    invalid.append(entry)
+                    entry.error = f"Unprocessable status {str(payload.get('status'))[:50]!r}, not applied"
+                    continue
+                
+                events.append((entry, provider_id, payload))
+            
+            # Locked so a purchase or sweep finishing meanwhile is not overwritten
+            transactions = {
+                transaction.provider_transaction_id: transaction
+                for transaction in DigitalTransaction.objects.select_for_update().filter(
+                    provider_transaction_id__in=[provider_id for _, provider_id, _ in events]
+                ).order_by('id')
+            }
+            
+            now = timezone.now()
+            changed = {}
+            # Transactions leaving 'processing', whose money is still reserved
+            settling = set()
+            processed = []
+            stale = []
+            unmatched = []
+            
+            # Events are applied in arrival order; each may only move its
+            # transaction forward
+            for entry, provider_id, payload in events:
+                transaction = transactions.get(provider_id)
+                
+                if transaction is None:
+                    unmatched.append(entry)
+                    continue
+                
+                if transaction.status == 'processing':
+                    settling.add(transaction.id)
+                
+                if not self._apply(transaction, payload, now):
+                    stale.append(entry)
+                    continue
+                
+                changed[transaction.id] = transaction
+                processed.append(entry)
+            
+            if changed:
+                DigitalTransaction.objects.bulk_update(
+                    list(changed.values()),
+                    ['status', 'provider_response', 'completed_at', 'failed_at', 'updated_at']
+                )
+                CustomerWebhookService().publish_transactions(changed.values())
+                TransactionRecoveryService().settle_funds(
+                    [t for t in changed.values() if t.id in settling]
+                )
+            
+            if processed:
+                WebhookInbox.objects.filter(id__in=[e.id for e in processed]).update(
+                    status='processed', attempts=F('attempts') + 1, processed_at=now
+                )
+            
+            if stale:
+                WebhookInbox.objects.filter(id__in=[e.id for e in stale]).update(
+                    status='processed', attempts=F('attempts') + 1, error='Stale status, not applied',
+                    processed_at=now
+                )
+            
+            retry = [e for e in unmatched if e.attempts + 1 < self.max_attempts]
+            failed = [e for e in unmatched if e.attempts + 1 >= self.max_attempts]
+            
+            if retry:
+                WebhookInbox.objects.filter(id__in=[e.id for e in retry]).update(
+                    attempts=F('attempts') + 1, error='Transaction not found'
+                )
+            
+            if failed:
+                WebhookInbox.objects.filter(id__in=[e.id for e in failed]).update(
+                    status='failed', attempts=F('attempts') + 1, error='Transaction not found', processed_at=now
+                )
+            
+            for entry in invalid:
+                entry.status = 'failed'
+                entry.attempts += 1
+                entry.processed_at = now
+            if invalid:
+                WebhookInbox.objects.bulk_update(invalid, ['status', 'attempts', 'error', 'processed_at'])
+        
+        stats['processed'] = len(processed)
+        stats['stale'] = len(stale)
+        stats['retried'] = len(retry)
+        stats['failed'] = len(failed) + len(invalid)
+        return stats, entries[-1].id
+
+    @staticmethod
+    def _apply(transaction: DigitalTransaction, payload: Dict[str, Any], now) -> bool:
+        """
+        Apply a webhook payload with a status from WEBHOOK_STATUSES to a
+        transaction in memory.
+        
+        Returns:
+            False if the payload's status would not move the transaction
+            forward and nothing was applied
+        """
+        new_status = WEBHOOK_STATUSES[payload['status']]
+        
+        if not transaction.can_transition_to(new_status):
+            return False
+        
+        transaction.status = new_status
+        transaction.provider_response = payload.get('provider_response', {})
+        transaction.updated_at = now
+        
+        if transaction.status == 'completed':
+            transaction.completed_at = transaction.completed_at or now
+        elif transaction.status == 'failed':
+            transaction.failed_at = transaction.failed_at or now
+        
+        return True
@@ -0,0 +1,43 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.core.cache import cache
+from apps.digital.models import DigitalProduct, PortedNumber, UserPricing, WebhookSubscription
+from apps.digital.phone_numbers import invalidate_engine
+
+
+@receiver([post_save, post_delete], sender=PortedNumber)
+def reload_ported_numbers(sender, **kwargs):
+    """
+    Rebuild the phone number engine when a ported number changes.
+    """
+    invalidate_engine()
+
+
+@receiver([post_save, post_delete], sender=WebhookSubscription)
+def reload_webhook_subscriptions(sender, instance, **kwargs):
+    """
+    Drop the cached subscriptions of a user whose subscription changed.
+    """
+    from apps.digital.services.customer_webhook_service import CustomerWebhookService
+    
+    cache.delete(CustomerWebhookService.subscription_cache_key(instance.user_id))
+
+
+@receiver([post_save, post_delete], sender=UserPricing)
+def reload_user_price(sender, instance, **kwargs):
+    """
+    Drop the cached price of a user whose pricing changed.
+    """
+    from apps.digital.services.pricing_service import PricingService
+    
+    PricingService.invalidate(instance.product_id, user_id=instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=DigitalProduct)
+def reload_product_prices(sender, instance, **kwargs):
+    """
+    Drop the cached role prices of a product that changed.
+    """
+    from apps.digital.services.pricing_service import PricingService
+    
+    PricingService.invalidate(instance.pk)
@@ -1,19 +1,25 @@
 from celery import shared_task
 import logging
 from apps.digital.services.digital_service import DigitalService
-from apps.digital.models import Transaction
+from apps.digital.models import DigitalTransaction, IdempotencyKey
 from apps.digital.services.provider_factory import ProviderFactory
+from apps.digital.services.customer_webhook_service import CustomerWebhookService
+from django.conf import settings
 from django.utils import timezone
 
 
 logger = logging.getLogger(__name__)
 
 
-@shared_task
+@shared_task(acks_late=True)
 def process_transaction_async(transaction_id):
     """
     Async task to process a digital transaction.
     
+    Published by DigitalService.dispatch_transaction onto the queue matching the
+    transaction priority. Acknowledged late so a crashed worker redelivers it;
+    process_transaction refuses transactions that are no longer pending.
+    
     Args:
         transaction_id: ID of the transaction to process
     """
@@ -27,6 +33,25 @@ def process_transaction_async(transaction_id):
         raise e
 
 
+@shared_task(acks_late=True)
+def process_bulk_order(bulk_order_id):
+    """
+    Async task to send the transactions of a bulk order to the provider.
+    
+    Args:
+        bulk_order_id: ID of the bulk order to process
+    """
+    from apps.digital.services.bulk_order_service import BulkOrderService
+    
+    try:
+        result = BulkOrderService().process(bulk_order_id)
+        logger.info(f"Processed bulk order {bulk_order_id}: {result}")
+        return result
+    except Exception as e:
+        logger.error(f"Error processing bulk order {bulk_order_id}: {str(e)}")
+        raise e
+
+
 @shared_task
 def retry_failed_transaction(transaction_id):
     """
@@ -54,7 +79,7 @@ def verify_transaction_with_provider(transaction_id):
         transaction_id: ID of the transaction to verify
     """
     try:
-        transaction = Transaction.objects.get(id=transaction_id)
+        transaction = DigitalTransaction.objects.get(id=transaction_id)
         provider = ProviderFactory.get_provider(transaction.provider)
         result = provider.verify_transaction(transaction.provider_transaction_id)
         
@@ -66,7 +91,8 @@ def verify_transaction_with_provider(transaction_id):
             transaction.status = 'failed'
             transaction.provider_response = {**transaction.provider_response, 'verified': False}
         
-        transaction.save()
+        transaction.save(update_fields=['status', 'provider_response', 'updated_at'])
+        CustomerWebhookService().publish_transactions([transaction])
         
         logger.info(f"Verified transaction {transaction_id} with provider: {result}")
         return result
@@ -75,6 +101,45 @@ def verify_transaction_with_provider(transaction_id):
         raise e
 
 
+@shared_task
+def sweep_stuck_transactions():
+    """
+    Async task to verify and settle transactions stuck in 'processing'.
+    
+    Scheduled by Celery beat every STUCK_TRANSACTION_SWEEP_SECONDS.
+    """
+    from apps.digital.services.recovery_service import TransactionRecoveryService
+    
+    return TransactionRecoveryService().sweep()
+
+
+@shared_task
+def drain_webhook_inbox():
+    """
+    Async task to apply pending provider webhooks from the inbox.
+    
+    Queued by WebhookService.ingest a moment after webhooks arrive, and
+    scheduled by Celery beat every WEBHOOK_INBOX_DRAIN_SECONDS to retry
+    webhooks that arrived before their transaction could be matched.
+    """
+    from apps.digital.services.webhook_service import WebhookService
+    
+    return WebhookService().drain()
+
+
+@shared_task
+def deliver_customer_webhooks():
+    """
+    Async task to send due customer webhook deliveries.
+    
+    Queued shortly after events are published, and scheduled by Celery beat
+    every CUSTOMER_WEBHOOK_DELIVERY_SECONDS to send retries once due.
+    """
+    from apps.digital.services.customer_webhook_service import CustomerWebhookService
+    
+    return CustomerWebhookService().deliver_due()
+
+
 @shared_task
 def cleanup_old_transactions():
     """
@@ -87,7 +152,7 @@ def cleanup_old_transactions():
         completed_threshold = timezone.now() - timedelta(days=365)  # 1 year for completed transactions
         
         # Delete failed transactions older than threshold
-        old_failed_transactions = Transaction.objects.filter(
+        old_failed_transactions = DigitalTransaction.objects.filter(
             status='failed',
             created_at__lt=failed_threshold
         )
@@ -95,7 +160,7 @@ def cleanup_old_transactions():
         old_failed_transactions.delete()
         
         # Archive or delete completed transactions older than threshold
-        old_completed_transactions = Transaction.objects.filter(
+        old_completed_transactions = DigitalTransaction.objects.filter(
             status='completed',
             created_at__lt=completed_threshold
         )
@@ -113,6 +178,42 @@ def cleanup_old_transactions():
         raise e
 
 
+@shared_task
+def cleanup_idempotency_keys():
+    """
+    Async task to delete idempotency keys past their retention period.
+    
+    Scheduled by Celery beat every IDEMPOTENCY_KEY_CLEANUP_SECONDS.
+    """
+    from datetime import timedelta
+    threshold = timezone.now() - timedelta(days=settings.IDEMPOTENCY_KEY_RETENTION_DAYS)
+    
+    deleted, _ = IdempotencyKey.objects.filter(created_at__lt=threshold).delete()
+    
+    logger.info(f"Cleaned up {deleted} idempotency keys")
+    return {'deleted': deleted}
+
+
+@shared_task
+def refresh_provider_floats():
+    """
+    Async task to poll every provider's balance into the float cache.
+    
+    Scheduled by Celery beat every PROVIDER_FLOAT_POLL_SECONDS.
+    """
+    from apps.digital.services.float_service import ProviderFloatService
+    
+    float_service = ProviderFloatService()
+    floats = {}
+    
+    for provider_name in ProviderFactory.get_available_providers():
+        balance = float_service.refresh(ProviderFactory.get_provider(provider_name))
+        floats[provider_name] = str(balance) if balance is not None else None
+    
+    logger.info(f"Refreshed provider floats: {floats}")
+    return floats
+
+
 @shared_task
 def send_transaction_notification(transaction_id, notification_type='status_update'):
     """
@@ -123,7 +224,7 @@ def send_transaction_notification(transaction_id, notification_type='status_upda
         notification_type: Type of notification to send
     """
     try:
-        transaction = Transaction.objects.get(id=transaction_id)
+        transaction = DigitalTransaction.objects.get(id=transaction_id)
         
         # In a real implementation, this would send emails, SMS, or push notifications
         # For now, we'll just log the notification
@@ -0,0 +1,221 @@
+import io
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from apps.digital.models import BulkOrder, DigitalProduct, DigitalTransaction, NetworkProvider, ServiceType
+from apps.digital.providers.base_provider import BaseProvider
+from apps.digital.services.bulk_order_service import BulkOrderService
+from apps.digital.services.fraud_service import FraudDetectionService
+from apps.digital.services.recovery_service import TransactionRecoveryService
+from apps.users.models import User
+from apps.wallets.models import Transaction as WalletTransaction
+from apps.wallets.services.wallet_service import WalletService
+from core.exceptions import FraudDetectedException
+
+
+def mtn_numbers(count):
+    """
+    Generate distinct MTN numbers that pass the fraud phone number screen.
+    """
+    fraud_service = FraudDetectionService()
+    numbers = []
+    candidate = 244000000
+    
+    while len(numbers) < count:
+        candidate += 7919
+        phone_number = f"0{candidate}"
+        if not fraud_service._is_suspicious_phone_number(phone_number):
+            numbers.append(phone_number)
+    
+    return numbers
+
+
+class BatchStubProvider(BaseProvider):
+    """
+    Provider answering a batch of three with success, a timeout and a failure.
+    """
+    
+    name = 'mtn'
+    
+    def purchase(self, transaction):
+        return {'status': 'success'}
+
+    def purchase_batch(self, transactions, max_workers=None):
+        return [
+            {'status': 'success', 'transaction_id': 'P-1'},
+            {'status': 'error', 'message': 'Read timed out'},
+            {'status': 'failed', 'message': 'Invalid recipient'},
+        ]
+
+    def validate_phone_number(self, phone_number, network_provider_code):
+        return {'valid': True}
+
+    def get_balance(self):
+        return {'balance': 0}
+
+    def verify_transaction(self, transaction_id):
+        return {'status': 'success', 'verified': True}
+
+
+class BulkOrderTestCase(TestCase):
+    """
+    An agent with a funded wallet and an MTN data product.
+    """
+    
+    def setUp(self):
+        self.user = User.objects.create(username='agent', email='agent@example.com', role='agent')
+        network = NetworkProvider.objects.create(name='MTN', code='MTN')
+        service_type = ServiceType.objects.create(name='Data', code='DATA')
+        self.product = DigitalProduct.objects.create(
+            service_type=service_type,
+            network_provider=network,
+            name='1GB',
+            code='MTN-1GB',
+            denomination=Decimal('5.00')
+        )
+        WalletService().credit(self.user, Decimal('10000.00'), 'DEP-1', 'Test funding')
+        
+        self.service = BulkOrderService()
+        self.recipients = mtn_numbers(120)
+        self.limit = self.service.fraud_service.config['max_transactions_per_hour']
+
+
+class BulkOrderVelocityTests(BulkOrderTestCase):
+    """
+    Bulk order recipients must not count toward the per-transaction velocity limit.
+    """
+    
+    def test_back_to_back_bulk_orders(self):
+        first = self.service.create_bulk_order(self.user, str(self.product.id), self.recipients[:60])
+        second = self.service.create_bulk_order(self.user, str(self.product.id), self.recipients[60:])
+        
+        self.assertEqual(first['bulk_order'].total_recipients, 60)
+        self.assertEqual(second['bulk_order'].total_recipients, 60)
+        self.assertGreater(DigitalTransaction.objects.filter(user=self.user).count(), self.limit)
+        
+        # Each bulk order is a single velocity event
+        self.assertEqual(self.service.fraud_service._get_recent_transactions_count(self.user), 2)
+        
+        fraud_check = self.service.fraud_service.check_transaction_risk(
+            user=self.user, phone_number=self.recipients[0], amount=Decimal('5.00')
+        )
+        self.assertFalse(fraud_check['is_fraud'], fraud_check['reason'])
+
+    def test_bulk_orders_have_their_own_limit(self):
+        max_orders = self.service.fraud_service.config['max_bulk_orders_per_hour']
+        
+        for i in range(max_orders):
+            self.service.create_bulk_order(self.user, str(self.product.id), self.recipients[i:i + 1])
+        
+        fraud_check = self.service.fraud_service.check_batch_risk(
+            user=self.user, phone_numbers=[], unit_amount=Decimal('5.00')
+        )
+        self.assertFalse(fraud_check['is_fraud'], fraud_check['reason'])
+        
+        with self.assertRaises(FraudDetectedException) as raised:
+            self.service.create_bulk_order(self.user, str(self.product.id), self.recipients[-1:])
+        
+        self.assertIn('Too many bulk orders', str(raised.exception))
+
+
+
+@override_settings(BULK_ORDER_CHUNK_SIZE=50)
+class BulkOrderCsvTests(BulkOrderTestCase):
+    """
+    CSV uploads are parsed before the order is charged.
+    """
+    
+    def test_upload_is_charged_once(self):
+        rows = ['phone'] + self.recipients + [self.recipients[0], 'not-a-number']
+        csv_file = io.BytesIO('\n'.join(rows).encode('utf-8'))
+        
+        result = BulkOrderService().create_bulk_order_from_csv(self.user, str(self.product.id), csv_file)
+        
+        bulk_order = result['bulk_order']
+        self.assertEqual(bulk_order.total_recipients, 120)
+        self.assertEqual(bulk_order.total_amount, bulk_order.unit_price * 120)
+        self.assertEqual(DigitalTransaction.objects.filter(bulk_order=bulk_order).count(), 120)
+        self.assertEqual(result['stats']['duplicate_count'], 1)
+        self.assertEqual(result['stats']['invalid_count'], 1)
+        
+        # One wallet debit for the whole upload, across several insert chunks
+        debits = WalletTransaction.objects.filter(user=self.user, transaction_type='purchase')
+        self.assertEqual(debits.count(), 1)
+        self.assertEqual(debits.get().amount, bulk_order.total_amount)
+
+
+
+class BulkOrderRecoveryTests(BulkOrderTestCase):
+    """
+    The stuck transaction sweep and a running bulk order never settle the same row twice.
+    """
+    
+    def setUp(self):
+        super().setUp()
+        result = self.service.create_bulk_order(self.user, str(self.product.id), self.recipients[:3])
+        self.bulk_order = result['bulk_order']
+        self.chunk = list(
+            DigitalTransaction.objects.filter(bulk_order=self.bulk_order).order_by('id')
+        )
+
+    def refunds(self):
+        return WalletTransaction.objects.filter(user=self.user, transaction_type='refund')
+
+    def test_sweep_skips_running_bulk_orders(self):
+        BulkOrder.objects.filter(pk=self.bulk_order.pk).update(status='processing')
+        DigitalTransaction.objects.filter(bulk_order=self.bulk_order).update(
+            status='processing', updated_at=timezone.now() - timedelta(hours=1)
+        )
+        
+        stats = TransactionRecoveryService().recover(
+            list(DigitalTransaction.objects.filter(bulk_order=self.bulk_order))
+        )
+        
+        self.assertEqual(stats['unresolved'], 3)
+        self.assertEqual(DigitalTransaction.objects.filter(status='processing').count(), 3)
+        self.assertFalse(self.refunds().exists())
+
+    def test_chunk_skips_rows_settled_by_the_sweep(self):
+        settled = self.chunk[0]
+        DigitalTransaction.objects.filter(pk=settled.pk).update(status='failed')
+        
+        with mock.patch.object(self.service.float_service, 'reserve_route', return_value=None):
+            failures = self.service._process_chunk(self.bulk_order, self.chunk)
+        
+        self.assertEqual([f['transaction_id'] for f in failures], [t.id for t in self.chunk[1:]])
+        self.assertEqual(self.refunds().get().amount, self.bulk_order.unit_price * 2)
+        
+        self.bulk_order.refresh_from_db()
+        self.assertEqual(self.bulk_order.failed_count, 2)
+
+    def test_timed_out_recipient_is_not_refunded(self):
+        provider = BatchStubProvider()
+        
+        with mock.patch.object(self.service.float_service, 'reserve_route', return_value=provider), \
+                mock.patch('apps.digital.services.provider_factory.ProviderFactory.get_healthy_provider',
+                           return_value=provider):
+            self.service.process(str(self.bulk_order.id))
+        
+        statuses = [t.status for t in DigitalTransaction.objects.filter(bulk_order=self.bulk_order).order_by('id')]
+        self.assertEqual(statuses, ['completed', 'processing', 'failed'])
+        self.assertEqual(self.refunds().get().amount, self.bulk_order.unit_price)
+        
+        self.bulk_order.refresh_from_db()
+        self.assertEqual(self.bulk_order.status, 'partial')
+        
+        # Once the order has finished, the sweep verifies the timed-out recipient
+        with mock.patch('apps.digital.services.provider_factory.ProviderFactory.get_available_providers',
+                        return_value=['mtn']), \
+                mock.patch('apps.digital.services.provider_factory.ProviderFactory.get_provider',
+                           return_value=provider):
+            stats = TransactionRecoveryService().recover(
+                list(DigitalTransaction.objects.filter(bulk_order=self.bulk_order, status='processing'))
+            )
+        
+        self.assertEqual(stats['completed'], 1)
+        self.assertEqual(self.refunds().count(), 1)
+        
+        self.bulk_order.refresh_from_db()
+        self.assertEqual((self.bulk_order.successful_count, self.bulk_order.failed_count), (2, 1))
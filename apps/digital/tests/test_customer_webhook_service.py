@@ -0,0 +1,61 @@
+import asyncio
+import socket
+from unittest import mock
+import httpx
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+from apps.digital.models import WebhookDelivery, WebhookSubscription
+from apps.digital.services.customer_webhook_service import CustomerWebhookService
+from apps.users.models import User
+
+
+def resolve_to(address):
+    return mock.patch('socket.getaddrinfo', return_value=[
+        (socket.AF_INET, socket.SOCK_STREAM, 6, '', (address, 0))
+    ])
+
+
+class WebhookTargetTests(TestCase):
+    """
+    Webhook deliveries can only be aimed at public addresses.
+    """
+    
+    def setUp(self):
+        self.user = User.objects.create(username='developer', email='developer@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create(self, url):
+        return self.client.post(reverse('api-webhooks'), {'url': url, 'events': []}, format='json')
+
+    def test_internal_targets_are_rejected(self):
+        for url in ('https://169.254.169.254/latest/meta-data', 'https://127.0.0.1/hook',
+                    'https://10.0.0.5/hook', 'https://[::ffff:127.0.0.1]/hook'):
+            response = self.create(url)
+            
+            self.assertEqual(response.status_code, 400, url)
+        
+        with resolve_to('192.168.1.20'):
+            self.assertEqual(self.create('https://internal.example.com/hook').status_code, 400)
+        
+        self.assertFalse(WebhookSubscription.objects.exists())
+
+    def test_public_target_is_accepted(self):
+        with resolve_to('93.184.216.34'):
+            response = self.create('https://hooks.example.com/hook')
+        
+        self.assertEqual(response.status_code, 201)
+
+    def test_delivery_checks_the_resolved_address(self):
+        subscription = WebhookSubscription.objects.create(
+            user=self.user, url='https://127.0.0.1/hook', secret='secret'
+        )
+        delivery = WebhookDelivery(subscription=subscription, event='order.completed', payload={})
+        transport = httpx.MockTransport(lambda request: httpx.Response(200))
+        
+        async def send():
+            async with httpx.AsyncClient(transport=transport) as client:
+                return await CustomerWebhookService()._send(client, delivery)
+        
+        self.assertEqual(asyncio.run(send()), (None, 'Webhook URL does not point to a public address'))
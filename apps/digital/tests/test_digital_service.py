@@ -0,0 +1,67 @@
+from decimal import Decimal
+from unittest import mock
+from django.test import TestCase
+from apps.digital.models import DigitalProduct, NetworkProvider, ServiceType
+from apps.digital.phone_numbers import get_engine
+from apps.digital.providers.base_provider import BaseProvider
+from apps.digital.services.digital_service import DigitalService
+from apps.users.models import User
+from apps.wallets.services.wallet_service import WalletService
+
+
+class StubProvider(BaseProvider):
+    """
+    Provider that accepts every purchase without a network call.
+    """
+    
+    name = 'mtn'
+    
+    def purchase(self, transaction):
+        return {'status': 'success', 'transaction_id': f"P-{transaction.id}"}
+    
+    def validate_phone_number(self, phone_number):
+        return {'valid': True}
+    
+    def get_balance(self):
+        return {'balance': 0}
+    
+    def verify_transaction(self, transaction_id):
+        return {'status': 'success'}
+
+
+class PurchaseQueryCountTests(TestCase):
+    """
+    A single purchase issues a fixed number of statements.
+    """
+    
+    def setUp(self):
+        self.user = User.objects.create(username='customer', email='customer@example.com')
+        network = NetworkProvider.objects.create(name='MTN', code='MTN')
+        service_type = ServiceType.objects.create(name='Data', code='DATA')
+        self.product = DigitalProduct.objects.create(
+            service_type=service_type,
+            network_provider=network,
+            name='1GB',
+            code='MTN-1GB',
+            denomination=Decimal('5.00')
+        )
+        WalletService().credit(self.user, Decimal('100.00'), 'DEP-1', 'Test funding')
+        
+        # Load the ported numbers table up front; it is cached per process
+        get_engine()
+        
+        patcher = mock.patch(
+            'apps.digital.services.provider_factory.ProviderFactory.get_healthy_provider',
+            return_value=StubProvider()
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_purchase_query_count(self):
+        # Product, user price, fraud counts (2), transaction insert, hold (2),
+        # capture (3), the final status update and the savepoints around the
+        # hold and capture blocks (4)
+        with self.assertNumQueries(15):
+            transaction = DigitalService().purchase(self.user, str(self.product.id), '0245813927')
+        
+        self.assertEqual(transaction.status, 'completed')
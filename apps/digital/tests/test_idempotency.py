@@ -0,0 +1,79 @@
+from decimal import Decimal
+from unittest import mock
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+from apps.digital.models import DigitalProduct, DigitalTransaction, NetworkProvider, ServiceType
+from apps.digital.providers.base_provider import BaseProvider
+from apps.users.models import User
+from apps.wallets.services.wallet_service import WalletService
+
+
+class DecliningProvider(BaseProvider):
+    """
+    Provider that declines every purchase.
+    """
+    
+    name = 'mtn'
+
+    def purchase(self, transaction):
+        return {'status': 'failed', 'message': 'Declined'}
+
+    def validate_phone_number(self, phone_number, network_provider_code):
+        return {'valid': True}
+
+    def get_balance(self):
+        return {'balance': 0}
+
+    def verify_transaction(self, transaction_id):
+        return {'status': 'success'}
+
+
+class CreateOrderIdempotencyTests(TestCase):
+    """
+    A retried order never buys twice.
+    """
+    
+    def setUp(self):
+        self.user = User.objects.create(username='customer', email='customer@example.com')
+        network = NetworkProvider.objects.create(name='MTN', code='MTN')
+        service_type = ServiceType.objects.create(name='Data', code='DATA')
+        self.product = DigitalProduct.objects.create(
+            service_type=service_type,
+            network_provider=network,
+            name='1GB',
+            code='MTN-1GB',
+            denomination=Decimal('5.00')
+        )
+        
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.payload = {'product_id': str(self.product.id), 'recipient_phone': '0245813927'}
+        
+        patcher = mock.patch(
+            'apps.digital.services.provider_factory.ProviderFactory.get_healthy_provider',
+            return_value=DecliningProvider()
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self):
+        return self.client.post(reverse('api-create-order'), self.payload, format='json',
+                                HTTP_IDEMPOTENCY_KEY='order-1')
+
+    def test_domain_errors_are_client_errors(self):
+        response = self.post()
+        
+        self.assertEqual(response.status_code, 402)
+        self.assertEqual(response.data['error']['code'], 'INSUFFICIENT_FUNDS')
+
+    def test_server_error_after_the_transaction_keeps_the_key(self):
+        WalletService().credit(self.user, Decimal('100.00'), 'DEP-1', 'Test funding')
+        
+        first = self.post()
+        second = self.post()
+        
+        self.assertEqual(first.status_code, 502)
+        self.assertEqual(second.status_code, 502)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(DigitalTransaction.objects.filter(user=self.user).count(), 1)
@@ -0,0 +1,24 @@
+from django.test import SimpleTestCase, override_settings
+from apps.digital.providers.latency import adaptive_read_timeout, get_latency_tracker
+
+
+@override_settings(PROVIDER_ADAPTIVE_TIMEOUTS=True, PROVIDER_LATENCY_MIN_SAMPLES=5)
+class AdaptiveTimeoutTests(SimpleTestCase):
+    """
+    Only read-only operations get a latency-derived read timeout.
+    """
+    
+    def record(self, operation, latency):
+        tracker = get_latency_tracker('latency-test', operation)
+        for _ in range(10):
+            tracker.record(latency)
+
+    def test_reads_adapt_to_latency(self):
+        self.record('verify_transaction', 1.0)
+        
+        self.assertIsNotNone(adaptive_read_timeout('latency-test', 'verify_transaction'))
+
+    def test_purchase_keeps_static_timeout(self):
+        self.record('purchase', 1.0)
+        
+        self.assertIsNone(adaptive_read_timeout('latency-test', 'purchase'))
@@ -0,0 +1,124 @@
+import json
+from collections import defaultdict
+from unittest import mock
+from django.test import SimpleTestCase, override_settings
+from core import metrics
+from core.metrics import Counter, SharedStore
+
+
+TEST_COUNTER = Counter('shared_store_test_total', 'Test counter', ('outcome',))
+
+
+class FakeRedis:
+    """
+    The hash and sorted set commands SharedStore uses, in memory.
+    """
+    
+    def __init__(self):
+        self.hashes = defaultdict(dict)
+        self.sorted_sets = defaultdict(dict)
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    
+    def __init__(self, redis):
+        self.redis = redis
+        self.results = []
+
+    def hincrbyfloat(self, key, field, amount):
+        values = self.redis.hashes[key]
+        values[field] = float(values.get(field, 0)) + amount
+        self.results.append(values[field])
+
+    def hset(self, key, mapping):
+        self.redis.hashes[key].update(mapping)
+        self.results.append(len(mapping))
+
+    def hgetall(self, key):
+        self.results.append({k.encode(): str(v).encode() for k, v in self.redis.hashes.get(key, {}).items()})
+
+    def delete(self, key):
+        self.results.append(int(self.redis.hashes.pop(key, None) is not None))
+
+    def expire(self, key, seconds):
+        self.results.append(True)
+
+    def zadd(self, key, mapping):
+        self.redis.sorted_sets[key].update(mapping)
+        self.results.append(len(mapping))
+
+    def zremrangebyscore(self, key, low, high):
+        members = self.redis.sorted_sets[key]
+        stale = [m for m, score in members.items() if score <= high]
+        for member in stale:
+            del members[member]
+        self.results.append(len(stale))
+
+    def zrange(self, key, start, end):
+        self.results.append([m.encode() for m in self.redis.sorted_sets[key]])
+
+    def execute(self):
+        return self.results
+
+
+class SharedStoreTests(SimpleTestCase):
+    """
+    Metrics recorded in any process are rendered by the scrape.
+    """
+    
+    def setUp(self):
+        self.redis = FakeRedis()
+        self.store = SharedStore(self.redis, flush_seconds=10)
+        self.counter = TEST_COUNTER
+
+    def total(self):
+        field = json.dumps(['shared_store_test_total', ['success'], ''])
+        return self.redis.hashes[SharedStore.TOTALS_KEY].get(field)
+
+    def test_flush_pushes_increments_only(self):
+        self.store.flush()
+        before = self.total() or 0
+        
+        self.counter.inc(outcome='success')
+        self.store.flush()
+        self.store.flush()
+        self.counter.inc(2, outcome='success')
+        self.store.flush()
+        
+        self.assertEqual(self.total() - before, 3)
+
+    def test_render_includes_other_processes(self):
+        # A Celery worker's increments, already in Redis
+        field = json.dumps(['shared_store_test_total', ['success'], ''])
+        self.redis.hashes[SharedStore.TOTALS_KEY][field] = 5.0
+        self.counter.inc(outcome='success')
+        local = self.counter.export()[(('success',), '')]
+        
+        with mock.patch.object(metrics, '_shared_store', self.store):
+            rendered = metrics.render_metrics()
+        
+        self.assertIn(f'shared_store_test_total{{outcome="success"}} {5.0 + local}', rendered)
+
+
+class MetricsViewTests(SimpleTestCase):
+    """
+    Metrics are not public unless a token is configured or they are opted out.
+    """
+    
+    @override_settings(DEBUG=False, METRICS_AUTH_TOKEN='', METRICS_PUBLIC=False)
+    def test_no_token_outside_debug_is_refused(self):
+        self.assertEqual(self.client.get('/metrics/').status_code, 403)
+
+    @override_settings(DEBUG=False, METRICS_AUTH_TOKEN='', METRICS_PUBLIC=True)
+    def test_explicit_opt_out(self):
+        self.assertEqual(self.client.get('/metrics/').status_code, 200)
+
+    @override_settings(DEBUG=False, METRICS_AUTH_TOKEN='secret')
+    def test_token_is_required(self):
+        self.assertEqual(self.client.get('/metrics/').status_code, 401)
+        self.assertEqual(
+            self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer secret').status_code, 200
+        )
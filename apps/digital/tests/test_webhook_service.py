@@ -0,0 +1,66 @@
+import json
+from decimal import Decimal
+from django.test import TestCase
+from apps.digital.models import DigitalProduct, DigitalTransaction, NetworkProvider, ServiceType, WebhookInbox
+from apps.digital.services.digital_service import DigitalService
+from apps.digital.services.webhook_service import WebhookService
+from apps.users.models import User
+from apps.wallets.models import Wallet, WalletHold
+from apps.wallets.services.wallet_service import WalletService
+
+
+class WebhookInboxTests(TestCase):
+    """
+    Draining the inbox only applies known statuses and settles held funds.
+    """
+    
+    def setUp(self):
+        self.user = User.objects.create(username='customer', email='customer@example.com')
+        network = NetworkProvider.objects.create(name='MTN', code='MTN')
+        service_type = ServiceType.objects.create(name='Data', code='DATA')
+        self.product = DigitalProduct.objects.create(
+            service_type=service_type,
+            network_provider=network,
+            name='1GB',
+            code='MTN-1GB',
+            denomination=Decimal('5.00')
+        )
+        WalletService().credit(self.user, Decimal('100.00'), 'DEP-1', 'Test funding')
+
+    def _transaction(self, status, provider_transaction_id):
+        transaction = DigitalService()._create_transaction(
+            self.user, self.product, '0245813927', Decimal('5.00'), 1, 'normal', status
+        )
+        transaction.provider_transaction_id = provider_transaction_id
+        transaction.save(update_fields=['provider_transaction_id'])
+        return transaction
+
+    def _receive(self, event_id, provider_transaction_id, status):
+        body = json.dumps({'event_id': event_id, 'transaction_id': provider_transaction_id, 'status': status})
+        return WebhookInbox.objects.create(provider='mtn', event_id=event_id, body=body)
+
+    def test_failed_webhook_releases_the_hold(self):
+        transaction = self._transaction('processing', 'P-1')
+        WalletService().place_hold(self.user, Decimal('5.00'), transaction.reference, 'Test purchase')
+        self._receive('E-1', 'P-1', 'failed')
+        
+        stats, _ = WebhookService().process_batch()
+        
+        self.assertEqual(stats['processed'], 1)
+        transaction.refresh_from_db()
+        self.assertEqual(transaction.status, 'failed')
+        self.assertEqual(WalletHold.objects.get(reference=transaction.reference).status, 'released')
+        self.assertEqual(Wallet.objects.get(user=self.user).held_balance, Decimal('0.00'))
+
+    def test_unmapped_status_is_not_applied(self):
+        transaction = self._transaction('completed', 'P-2')
+        entry = self._receive('E-2', 'P-2', 'refunded')
+        
+        stats, _ = WebhookService().process_batch()
+        
+        self.assertEqual(stats['failed'], 1)
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, 'failed')
+        self.assertIn('refunded', entry.error)
+        self.assertEqual(DigitalTransaction.objects.get(pk=transaction.pk).status, 'completed')
+        self.assertEqual(Wallet.objects.get(user=self.user).balance, Decimal('100.00'))
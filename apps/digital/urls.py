@@ -9,9 +9,9 @@ urlpatterns = [
     path('transaction/<str:transaction_id>/retry/', purchase_views.retry_transaction, name='retry-transaction'),
     
     # Webhook endpoints
-    path('webhooks/mtn/', webhook_views.mtn_webhook, name='mtn-webhook'),
-    path('webhooks/vodafone/', webhook_views.vodafone_webhook, name='vodafone-webhook'),
-    path('webhooks/airteltigo/', webhook_views.airteltigo_webhook, name='airteltigo-webhook'),
+    path('webhooks/mtn/', webhook_views.provider_webhook, {'provider': 'mtn'}, name='mtn-webhook'),
+    path('webhooks/vodafone/', webhook_views.provider_webhook, {'provider': 'vodafone'}, name='vodafone-webhook'),
+    path('webhooks/airteltigo/', webhook_views.provider_webhook, {'provider': 'airteltigo'}, name='airteltigo-webhook'),
     
     # Admin endpoints
     path('admin/service-types/', admin_views.manage_service_types, name='manage-service-types'),
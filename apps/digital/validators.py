@@ -1,6 +1,10 @@
 from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
+from urllib.parse import urlsplit
+import ipaddress
 import re
+import socket
+from apps.digital.phone_numbers import parse_phone_number
 
 
 def validate_phone_number(value):
@@ -29,40 +33,35 @@ def validate_phone_number(value):
 def validate_ghanaian_phone_number(value):
     """
     Specifically validate Ghanaian phone numbers.
+    
+    Local (024XXXXXXX), international (23324XXXXXXX) and short (24XXXXXXX)
+    formats are accepted when the prefix belongs to a mobile network.
+    
+    Returns:
+        The parsed PhoneNumber
     """
-    # Remove any non-digit characters
-    digits_only = re.sub(r'\D', '', value)
+    parsed = parse_phone_number(value)
     
-    # Check length (Ghanaian mobile numbers are 10 digits after removing country code)
-    if len(digits_only) == 10 and digits_only.startswith('0'):
-        # Local format: 024XXXXXXX
-        valid_prefixes = ['024', '027', '054', '055', '059', '026', '023', '057']
-        if not any(digits_only.startswith(prefix) for prefix in valid_prefixes):
-            raise ValidationError(
-                _('Invalid Ghanaian phone number prefix.'),
-                params={'value': value},
-            )
-    elif len(digits_only) == 12 and digits_only.startswith('233'):
-        # International format: 23324XXXXXXX
-        valid_prefixes = ['23324', '23327', '23354', '23355', '23359', '23326', '23323', '23357']
-        if not any(digits_only.startswith(prefix) for prefix in valid_prefixes):
-            raise ValidationError(
-                _('Invalid Ghanaian phone number prefix.'),
-                params={'value': value},
-            )
-    elif len(digits_only) == 9:
-        # Short format: 24XXXXXXX
-        valid_prefixes = ['24', '27', '54', '55', '59', '26', '23', '57']
-        if not any(digits_only.startswith(prefix) for prefix in valid_prefixes):
-            raise ValidationError(
-                _('Invalid Ghanaian phone number prefix.'),
-                params={'value': value},
-            )
-    else:
+    if parsed is None:
         raise ValidationError(
             _('Invalid Ghanaian phone number format.'),
             params={'value': value},
         )
+    
+    if parsed.network is None:
+        raise ValidationError(
+            _('Invalid Ghanaian phone number prefix.'),
+            params={'value': value},
+        )
+    
+    return parsed
+
+
+def normalize_ghanaian_phone_number(value):
+    """
+    Validate a Ghanaian phone number and return it in local format (0XXXXXXXXX).
+    """
+    return validate_ghanaian_phone_number(value).local
 
 
 def validate_positive_decimal(value):
@@ -97,4 +96,40 @@ def validate_size_format(value):
             raise ValidationError(
                 _('Size must be in format like 1GB, 500MB, 1024KB.'),
                 params={'value': value},
-            )
\ No newline at end of file
+            )
+
+def is_public_address(address):
+    """
+    Whether an IP address is publicly routable.
+    
+    Loopback, private, link-local, reserved and multicast addresses are not,
+    including IPv4 addresses mapped into IPv6.
+    """
+    ip = ipaddress.ip_address(address.split('%')[0])
+    
+    if ip.version == 6 and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    
+    return ip.is_global and not ip.is_multicast
+
+
+def validate_webhook_url(value):
+    """
+    Validate that a webhook URL's host resolves only to public addresses,
+    so deliveries cannot be aimed at internal services.
+    """
+    host = urlsplit(value).hostname
+    
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, None)}
+    except (socket.gaierror, UnicodeError):
+        raise ValidationError(
+            _('Webhook URL host cannot be resolved.'),
+            params={'value': value},
+        )
+    
+    if not addresses or not all(is_public_address(address) for address in addresses):
+        raise ValidationError(
+            _('Webhook URL must point to a public address.'),
+            params={'value': value},
+        )
@@ -5,7 +5,7 @@ from rest_framework import status
 from apps.users.models import User
 from apps.digital.models import (
     ServiceType, NetworkProvider, DigitalProduct, 
-    Transaction, UserPricing
+    DigitalTransaction, UserPricing
 )
 from apps.digital.serializers import (
     ServiceTypeSerializer, NetworkProviderSerializer, 
@@ -139,7 +139,7 @@ def admin_transactions(request):
     """
     Get all transactions for admin dashboard
     """
-    transactions = Transaction.objects.select_related(
+    transactions = DigitalTransaction.objects.select_related(
         'user', 'product', 'service_type', 'network_provider'
     ).all().order_by('-created_at')
     
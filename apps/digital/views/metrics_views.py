@@ -0,0 +1,29 @@
+import hmac
+from django.conf import settings
+from django.http import HttpResponse
+from django.views.decorators.http import require_GET
+from core.metrics import render_metrics
+
+# Import the metric definitions so they are registered before the first scrape
+import apps.digital.metrics  # noqa: F401
+
+
+@require_GET
+def metrics(request):
+    """
+    Expose the metrics of every web and Celery process in the Prometheus text format.
+    
+    The scraper must send METRICS_AUTH_TOKEN as a bearer token. Without a
+    token the endpoint is only served in DEBUG or with METRICS_PUBLIC set.
+    """
+    token = settings.METRICS_AUTH_TOKEN
+    
+    if token:
+        authorization = request.META.get('HTTP_AUTHORIZATION', '')
+        if not hmac.compare_digest(authorization, f'Bearer {token}'):
+            return HttpResponse(status=401)
+    elif not (settings.DEBUG or settings.METRICS_PUBLIC):
+        # Provider and volume data are not public by default
+        return HttpResponse(status=403)
+    
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -2,14 +2,16 @@ from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from django.shortcuts import get_object_or_404
+from django.conf import settings
+from apps.digital.models import DigitalTransaction
 from apps.digital.serializers import TransactionCreateSerializer, TransactionSerializer
 from apps.digital.services.digital_service import DigitalService
-from apps.digital.models import DigitalProduct
+from apps.digital.services.idempotency_service import idempotent
 
 
 @permission_classes([IsAuthenticated])
 @api_view(['POST'])
+@idempotent('digital.purchase')
 def initiate_purchase(request):
     """
     Initiate a digital service purchase.
@@ -18,11 +20,8 @@ def initiate_purchase(request):
     
     if serializer.is_valid():
         try:
-            # Get the product
+            # Get validated data
             product_id = serializer.validated_data['product']
-            product = get_object_or_404(DigitalProduct, id=product_id, is_active=True)
-            
-            # Get other validated data
             phone_number = serializer.validated_data['phone_number']
             quantity = serializer.validated_data.get('quantity', 1)
             priority = serializer.validated_data.get('priority', 'normal')
@@ -30,8 +29,29 @@ def initiate_purchase(request):
             # Create digital service instance
             digital_service = DigitalService()
             
-            # Initiate the purchase
-            transaction = digital_service.initiate_purchase(
+            # Hand processing to the priority queues and return immediately
+            if settings.DIGITAL_ASYNC_PURCHASES:
+                transaction = digital_service.initiate_purchase(
+                    user=request.user,
+                    product_id=product_id,
+                    phone_number=phone_number,
+                    quantity=quantity,
+                    priority=priority
+                )
+                digital_service.dispatch_transaction(transaction)
+                return Response({
+                    'status': 'accepted',
+                    'message': 'Transaction queued for processing',
+                    'data': {
+                        'transaction_id': transaction.id,
+                        'reference': transaction.reference,
+                        'status': transaction.status,
+                        'priority': transaction.priority
+                    }
+                }, status=status.HTTP_202_ACCEPTED)
+            
+            # Process the transaction inline
+            transaction = digital_service.purchase(
                 user=request.user,
                 product_id=product_id,
                 phone_number=phone_number,
@@ -39,14 +59,20 @@ def initiate_purchase(request):
                 priority=priority
             )
             
-            # Process the transaction (in a real app, this might be queued)
-            result = digital_service.process_transaction(transaction.id)
-            
             # Return the transaction details
             transaction_serializer = TransactionSerializer(transaction)
+            
+            if transaction.status == 'processing':
+                # The provider gave no definite answer; the transaction is verified later
+                return Response({
+                    'status': 'accepted',
+                    'message': 'Transaction is awaiting provider confirmation',
+                    'data': transaction_serializer.data
+                }, status=status.HTTP_202_ACCEPTED)
+            
             return Response({
                 'status': 'success',
-                'message': result.get('message', 'Transaction processed successfully'),
+                'message': 'Transaction completed successfully',
                 'data': transaction_serializer.data
             }, status=status.HTTP_201_CREATED)
             
@@ -116,7 +142,7 @@ def list_transactions(request):
     """
     try:
         # Get transactions for the authenticated user
-        transactions = request.user.transaction_set.all().order_by('-created_at')
+        transactions = DigitalTransaction.objects.filter(user=request.user).order_by('-created_at')
         
         # Apply filters if provided
         status_filter = request.query_params.get('status')
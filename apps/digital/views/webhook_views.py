@@ -6,131 +6,38 @@ import json
 import hashlib
 import hmac
 from django.conf import settings
-from apps.digital.models import Transaction
+from apps.digital.metrics import WEBHOOK_DUPLICATES, track_webhook
+from apps.digital.services.webhook_service import WebhookService
 
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
-def mtn_webhook(request):
+@track_webhook()
+def provider_webhook(request, provider):
     """
-    Webhook endpoint for MTN provider notifications.
-    """
-    try:
-        # Verify webhook signature (implement based on MTN's requirements)
-        if not _verify_webhook_signature(request, 'mtn'):
-            return Response({'error': 'Invalid signature'}, status=status.HTTP_401_UNAUTHORIZED)
-        
-        # Process the webhook payload
-        payload = request.data
-        transaction_id = payload.get('transaction_id')
-        status = payload.get('status')
-        provider_response = payload.get('provider_response', {})
-        
-        # Update the transaction in the database
-        try:
-            transaction = Transaction.objects.get(provider_transaction_id=transaction_id)
-            transaction.provider_response = provider_response
-            
-            if status == 'success':
-                transaction.status = 'completed'
-                transaction.completed_at = transaction.completed_at or transaction.updated_at
-            elif status == 'failed':
-                transaction.status = 'failed'
-                transaction.failed_at = transaction.updated_at
-            else:
-                transaction.status = status  # Update to whatever status was provided
-            
-            transaction.save()
-            
-            return Response({'status': 'success', 'message': 'Webhook processed successfully'})
-            
-        except Transaction.DoesNotExist:
-            return Response({'error': 'Transaction not found'}, status=status.HTTP_404_NOT_FOUND)
-            
-    except Exception as e:
-        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-
-@api_view(['POST'])
-@permission_classes([AllowAny])
-def vodafone_webhook(request):
-    """
-    Webhook endpoint for Vodafone provider notifications.
+    Webhook endpoint for provider notifications.
+    
+    Only verifies the signature and stores the raw payload in the webhook
+    inbox; Celery applies it to the transaction shortly after, so providers
+    are answered without waiting on transaction lookups and updates.
     """
     try:
-        # Verify webhook signature (implement based on Vodafone's requirements)
-        if not _verify_webhook_signature(request, 'vodafone'):
+        if not _verify_webhook_signature(request, provider):
             return Response({'error': 'Invalid signature'}, status=status.HTTP_401_UNAUTHORIZED)
         
-        # Process the webhook payload
-        payload = request.data
-        transaction_id = payload.get('transaction_id')
-        status = payload.get('status')
-        provider_response = payload.get('provider_response', {})
+        body = request._request.body
         
-        # Update the transaction in the database
         try:
-            transaction = Transaction.objects.get(provider_transaction_id=transaction_id)
-            transaction.provider_response = provider_response
-            
-            if status == 'success':
-                transaction.status = 'completed'
-                transaction.completed_at = transaction.completed_at or transaction.updated_at
-            elif status == 'failed':
-                transaction.status = 'failed'
-                transaction.failed_at = transaction.updated_at
-            else:
-                transaction.status = status  # Update to whatever status was provided
-            
-            transaction.save()
-            
-            return Response({'status': 'success', 'message': 'Webhook processed successfully'})
-            
-        except Transaction.DoesNotExist:
-            return Response({'error': 'Transaction not found'}, status=status.HTTP_404_NOT_FOUND)
-            
-    except Exception as e:
-        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-
-@api_view(['POST'])
-@permission_classes([AllowAny])
-def airteltigo_webhook(request):
-    """
-    Webhook endpoint for AirtelTigo provider notifications.
-    """
-    try:
-        # Verify webhook signature (implement based on AirtelTigo's requirements)
-        if not _verify_webhook_signature(request, 'airteltigo'):
-            return Response({'error': 'Invalid signature'}, status=status.HTTP_401_UNAUTHORIZED)
+            payload = json.loads(body)
+        except ValueError:
+            return Response({'error': 'Invalid JSON payload'}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Process the webhook payload
-        payload = request.data
-        transaction_id = payload.get('transaction_id')
-        status = payload.get('status')
-        provider_response = payload.get('provider_response', {})
+        if WebhookService().ingest(provider, body, payload) is None:
+            WEBHOOK_DUPLICATES.inc(provider=provider)
+            return Response({'status': 'success', 'message': 'Duplicate webhook ignored'})
         
-        # Update the transaction in the database
-        try:
-            transaction = Transaction.objects.get(provider_transaction_id=transaction_id)
-            transaction.provider_response = provider_response
-            
-            if status == 'success':
-                transaction.status = 'completed'
-                transaction.completed_at = transaction.completed_at or transaction.updated_at
-            elif status == 'failed':
-                transaction.status = 'failed'
-                transaction.failed_at = transaction.updated_at
-            else:
-                transaction.status = status  # Update to whatever status was provided
-            
-            transaction.save()
-            
-            return Response({'status': 'success', 'message': 'Webhook processed successfully'})
-            
-        except Transaction.DoesNotExist:
-            return Response({'error': 'Transaction not found'}, status=status.HTTP_404_NOT_FOUND)
-            
+        return Response({'status': 'success', 'message': 'Webhook received'})
+    
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -142,7 +49,7 @@ def _verify_webhook_signature(request, provider):
     Args:
         request: The webhook request
         provider: The provider name
-        
+    
     Returns:
         True if signature is valid, False otherwise
     """
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from apps.users.models import User, UserProfile
+from apps.users.models import User, UserProfile, Agent, AgentTier
 
 
 class UserProfileSerializer(serializers.ModelSerializer):
@@ -15,6 +15,37 @@ class UserSerializer(serializers.ModelSerializer):
         model = User
         fields = [
             'id', 'email', 'first_name', 'last_name', 'phone_number', 
-            'user_type', 'is_active', 'date_joined', 'profile', 'username'
+            'role', 'is_active', 'date_joined', 'profile', 'username'
         ]
-        read_only_fields = ['id', 'date_joined', 'username']
\ No newline at end of file
+        read_only_fields = ['id', 'date_joined', 'username']
+
+
+class AgentTierSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AgentTier
+        fields = '__all__'
+        read_only_fields = ['id', 'created_at']
+
+
+class AgentSerializer(serializers.ModelSerializer):
+    user = UserSerializer(read_only=True)
+    tier = AgentTierSerializer(read_only=True)
+    
+    class Meta:
+        model = Agent
+        fields = '__all__'
+
+
+class AgentApplicationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Agent
+        fields = ['business_name', 'business_type', 'business_address', 'ghana_card_number', 'ghana_card_image']
+
+    def validate(self, attrs):
+        if Agent.objects.filter(user=self.context['user']).exists():
+            raise serializers.ValidationError("You have already applied to become an agent")
+        return attrs
+
+    def create(self, validated_data):
+        validated_data['user'] = self.context['user']
+        return super().create(validated_data)
\ No newline at end of file
@@ -3,6 +3,7 @@ from django.db import models
 from django.utils import timezone
 from decimal import Decimal
 from apps.users.models import User
+from core.identifiers import uuid7
 
 
 class Wallet(models.Model):
@@ -10,6 +11,7 @@ class Wallet(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='wallet')
     balance = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'))
+    held_balance = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'))  # Reserved by open holds
     currency = models.CharField(max_length=3, default='GHS')
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(default=timezone.now)
@@ -21,10 +23,44 @@ class Wallet(models.Model):
         self.updated_at = timezone.now()
         super().save(*args, **kwargs)
 
+    @property
+    def available_balance(self):
+        return self.balance - self.held_balance
+
     def __str__(self):
         return f"{self.user.email} Wallet - {self.balance} {self.currency}"
 
 
+class WalletHold(models.Model):
+    """Funds reserved on a wallet while a purchase is in flight"""
+    STATUS_CHOICES = [
+        ('held', 'Held'),
+        ('captured', 'Captured'),
+        ('released', 'Released'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    reference = models.CharField(max_length=100, unique=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='wallet_holds')
+    wallet = models.ForeignKey('Wallet', on_delete=models.CASCADE, related_name='holds')
+    amount = models.DecimalField(max_digits=15, decimal_places=2)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='held')
+    description = models.TextField(null=True, blank=True)
+    metadata = models.JSONField(default=dict)
+    settled_at = models.DateTimeField(null=True, blank=True)  # Captured or released at
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    def save(self, *args, **kwargs):
+        if not self.id:
+            self.created_at = timezone.now()
+        self.updated_at = timezone.now()
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.reference} - {self.amount} ({self.status})"
+
+
 class Transaction(models.Model):
     """Wallet transaction record"""
     TRANSACTION_TYPE_CHOICES = [
@@ -42,7 +78,7 @@ class Transaction(models.Model):
         ('failed', 'Failed'),
     ]
 
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     reference = models.CharField(max_length=100, unique=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='transactions')
     wallet = models.ForeignKey('Wallet', on_delete=models.SET_NULL, null=True, blank=True, related_name='transactions')
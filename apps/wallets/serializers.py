@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from apps.wallets.models import Wallet, WalletTransaction
+from apps.wallets.models import Wallet, Transaction as WalletTransaction
 
 
 class WalletTransactionSerializer(serializers.ModelSerializer):
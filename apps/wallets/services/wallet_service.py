@@ -0,0 +1,326 @@
+import logging
+from decimal import Decimal
+from typing import Dict, Any, Optional, Tuple
+from django.db import connection, transaction as db_transaction
+from django.utils import timezone
+from apps.wallets.models import Wallet, WalletHold, Transaction as WalletTransaction
+from core.exceptions import InsufficientFundsException, InvalidTransactionException
+
+
+logger = logging.getLogger(__name__)
+
+# Customer webhook event published for each ledger transaction type
+WEBHOOK_EVENTS = {
+    'deposit': 'wallet.funded',
+    'withdrawal': 'wallet.withdrawn',
+}
+
+
+class WalletService:
+    """
+    Service class for moving money in and out of wallets.
+    
+    Every balance change is a single conditional UPDATE followed by one ledger
+    insert inside the same database transaction. Concurrent purchases for the
+    same wallet queue on the row lock taken by the UPDATE instead of failing,
+    and no application-level locking is required.
+    
+    Purchases that wait on a provider use holds: place_hold reserves funds and
+    returns immediately, and the hold is later captured or released, so the
+    wallet row is never locked for the duration of a provider call.
+    """
+
+    def debit(self,
+              user,
+              amount: Decimal,
+              reference: str,
+              description: str,
+              transaction_type: str = 'purchase',
+              metadata: Optional[Dict[str, Any]] = None) -> WalletTransaction:
+        """
+        Debit an amount from a user's wallet.
+        
+        Args:
+            user: The wallet owner
+            amount: Amount to debit
+            reference: Unique ledger reference
+            description: Description of the transaction
+            transaction_type: Ledger transaction type
+            metadata: Extra data stored on the ledger row
+            
+        Returns:
+            The completed WalletTransaction
+            
+        Raises:
+            InsufficientFundsException: If the wallet is missing, inactive or
+                its available balance does not cover the amount
+        """
+        with db_transaction.atomic():
+            result = self._update_balance(user, balance_delta=-amount, require_available=amount)
+            
+            if result is None:
+                raise InsufficientFundsException(
+                    f"Insufficient funds. Required: {amount}"
+                )
+            
+            wallet_id, balance_after = result
+            
+            return self._record(
+                user=user,
+                wallet_id=wallet_id,
+                amount=amount,
+                balance_before=balance_after + amount,
+                balance_after=balance_after,
+                reference=reference,
+                description=description,
+                transaction_type=transaction_type,
+                metadata=metadata
+            )
+
+    def credit(self,
+               user,
+               amount: Decimal,
+               reference: str,
+               description: str,
+               transaction_type: str = 'deposit',
+               metadata: Optional[Dict[str, Any]] = None) -> WalletTransaction:
+        """
+        Credit an amount to a user's wallet, creating the wallet if needed.
+        
+        Args:
+            user: The wallet owner
+            amount: Amount to credit
+            reference: Unique ledger reference
+            description: Description of the transaction
+            transaction_type: Ledger transaction type
+            metadata: Extra data stored on the ledger row
+            
+        Returns:
+            The completed WalletTransaction
+            
+        Raises:
+            InvalidTransactionException: If the wallet is inactive; refunds
+                are still credited to inactive wallets
+        """
+        # Money taken for a failed purchase goes back even if the wallet
+        # was deactivated in the meantime
+        active_only = transaction_type != 'refund'
+        
+        with db_transaction.atomic():
+            result = self._update_balance(user, balance_delta=amount, active_only=active_only)
+            
+            if result is None:
+                Wallet.objects.get_or_create(user=user)
+                result = self._update_balance(user, balance_delta=amount, active_only=active_only)
+            
+            if result is None:
+                raise InvalidTransactionException("Wallet is inactive")
+            
+            wallet_id, balance_after = result
+            
+            return self._record(
+                user=user,
+                wallet_id=wallet_id,
+                amount=amount,
+                balance_before=balance_after - amount,
+                balance_after=balance_after,
+                reference=reference,
+                description=description,
+                transaction_type=transaction_type,
+                metadata=metadata
+            )
+
+    def place_hold(self,
+                   user,
+                   amount: Decimal,
+                   reference: str,
+                   description: str,
+                   metadata: Optional[Dict[str, Any]] = None) -> WalletHold:
+        """
+        Reserve funds on a user's wallet without moving the balance.
+        
+        Args:
+            user: The wallet owner
+            amount: Amount to reserve
+            reference: Unique hold reference, reused for the captured ledger row
+            description: Description of the purchase
+            metadata: Extra data stored on the hold and the captured ledger row
+            
+        Returns:
+            The open WalletHold
+            
+        Raises:
+            InsufficientFundsException: If the available balance does not
+                cover the amount
+        """
+        with db_transaction.atomic():
+            result = self._update_balance(user, held_delta=amount, require_available=amount)
+            
+            if result is None:
+                raise InsufficientFundsException(
+                    f"Insufficient funds. Required: {amount}"
+                )
+            
+            wallet_id, _ = result
+            
+            return WalletHold.objects.create(
+                user=user,
+                wallet_id=wallet_id,
+                amount=amount,
+                reference=reference,
+                description=description,
+                metadata=metadata or {}
+            )
+
+    def capture_hold(self, hold: WalletHold) -> WalletTransaction:
+        """
+        Capture an open hold, moving the reserved amount out of the balance.
+        
+        Args:
+            hold: The hold to capture
+            
+        Returns:
+            The completed purchase WalletTransaction
+            
+        Raises:
+            InvalidTransactionException: If the hold is no longer open
+        """
+        with db_transaction.atomic():
+            self._settle(hold, 'captured')
+            
+            wallet_id, balance_after = self._update_balance(
+                hold.user, balance_delta=-hold.amount, held_delta=-hold.amount, active_only=False
+            )
+            
+            return self._record(
+                user=hold.user,
+                wallet_id=wallet_id,
+                amount=hold.amount,
+                balance_before=balance_after + hold.amount,
+                balance_after=balance_after,
+                reference=hold.reference,
+                description=hold.description,
+                transaction_type='purchase',
+                metadata=hold.metadata
+            )
+
+    def release_hold(self, hold: WalletHold) -> WalletHold:
+        """
+        Release an open hold, returning the reserved amount to the available balance.
+        
+        Args:
+            hold: The hold to release
+            
+        Returns:
+            The released WalletHold
+            
+        Raises:
+            InvalidTransactionException: If the hold is no longer open
+        """
+        with db_transaction.atomic():
+            self._settle(hold, 'released')
+            self._update_balance(hold.user, held_delta=-hold.amount, active_only=False)
+        
+        return hold
+
+    def _settle(self, hold: WalletHold, status: str):
+        """
+        Move a hold out of the 'held' state exactly once.
+        """
+        now = timezone.now()
+        settled = WalletHold.objects.filter(pk=hold.pk, status='held').update(
+            status=status, settled_at=now, updated_at=now
+        )
+        
+        if not settled:
+            raise InvalidTransactionException(f"Hold {hold.reference} is not open")
+        
+        hold.status = status
+        hold.settled_at = now
+
+    def _update_balance(self, user,
+                        balance_delta: Decimal = Decimal('0'),
+                        held_delta: Decimal = Decimal('0'),
+                        require_available: Optional[Decimal] = None,
+                        active_only: bool = True) -> Optional[Tuple[Any, Decimal]]:
+        """
+        Apply a balance change with one conditional UPDATE ... RETURNING.
+        
+        Args:
+            user: The wallet owner
+            balance_delta: Signed amount to add to the balance
+            held_delta: Signed amount to add to the held balance
+            require_available: Only update if balance - held_balance covers this amount
+            active_only: Only update active wallets
+            
+        Returns:
+            Tuple of (wallet id, new balance), or None if no row matched
+        """
+        opts = Wallet._meta
+        qn = connection.ops.quote_name
+        balance = qn(opts.get_field('balance').column)
+        held_balance = qn(opts.get_field('held_balance').column)
+        
+        sql = (
+            f"UPDATE {qn(opts.db_table)} "
+            f"SET {balance} = {balance} + %s, {held_balance} = {held_balance} + %s, "
+            f"{qn(opts.get_field('updated_at').column)} = %s "
+            f"WHERE {qn(opts.get_field('user').column)} = %s"
+        )
+        params = [
+            balance_delta,
+            held_delta,
+            connection.ops.adapt_datetimefield_value(timezone.now()),
+            opts.get_field('user').get_db_prep_value(user.pk, connection),
+        ]
+        
+        if active_only:
+            sql += f" AND {qn(opts.get_field('is_active').column)} = %s"
+            params.append(True)
+        
+        if require_available is not None:
+            sql += f" AND {balance} >= {held_balance} + %s"
+            params.append(require_available)
+        
+        sql += f" RETURNING {qn(opts.pk.column)}, {balance}"
+        
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            row = cursor.fetchone()
+        
+        if row is None:
+            return None
+        
+        return row[0], Decimal(str(row[1])).quantize(Decimal('0.01'))
+
+    def _record(self, user, wallet_id, amount: Decimal, balance_before: Decimal,
+                balance_after: Decimal, reference: str, description: str,
+                transaction_type: str,
+                metadata: Optional[Dict[str, Any]]) -> WalletTransaction:
+        """
+        Insert the ledger row for a balance change in its final state.
+        """
+        ledger_transaction = WalletTransaction.objects.create(
+            user=user,
+            wallet_id=wallet_id,
+            transaction_type=transaction_type,
+            amount=amount,
+            balance_before=balance_before,
+            balance_after=balance_after,
+            reference=reference,
+            description=description,
+            status='completed',
+            metadata=metadata or {}
+        )
+        
+        if transaction_type in WEBHOOK_EVENTS:
+            from apps.digital.services.customer_webhook_service import CustomerWebhookService
+            
+            CustomerWebhookService().publish(user.pk, WEBHOOK_EVENTS[transaction_type], {
+                'reference': reference,
+                'amount': str(amount),
+                'balance': str(balance_after),
+                'description': description,
+            })
+        
+        return ledger_transaction
@@ -1,6 +1,7 @@
 import os
 from pathlib import Path
 from datetime import timedelta
+from decimal import Decimal
 import environ
 
 env = environ.Env()
@@ -80,6 +81,9 @@ DATABASES = {
     }
 }
 
+# Custom user model
+AUTH_USER_MODEL = 'users.User'
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -136,6 +140,16 @@ SIMPLE_JWT = {
     'USER_ID_CLAIM': 'user_id',
 }
 
+# Cache
+REDIS_URL = env('REDIS_URL', default='redis://localhost:6379/1')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    }
+}
+
 # Celery Configuration
 CELERY_BROKER_URL = env('CELERY_BROKER_URL', default='redis://localhost:6379/0')
 CELERY_RESULT_BACKEND = env('CELERY_RESULT_BACKEND', default='redis://localhost:6379/0')
@@ -143,6 +157,44 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+# Everything but purchases runs here; it needs its own worker (-Q default), see README
+CELERY_TASK_DEFAULT_QUEUE = 'default'
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+# Drain queues in the order a worker lists them (-Q purchases.critical,purchases.high,...)
+CELERY_BROKER_TRANSPORT_OPTIONS = {'queue_order_strategy': 'priority'}
+CELERY_BEAT_SCHEDULE = {
+    'refresh-provider-floats': {
+        'task': 'apps.digital.tasks.refresh_provider_floats',
+        'schedule': env('PROVIDER_FLOAT_POLL_SECONDS', default=60, cast=int),
+    },
+    'sweep-stuck-transactions': {
+        'task': 'apps.digital.tasks.sweep_stuck_transactions',
+        'schedule': env('STUCK_TRANSACTION_SWEEP_SECONDS', default=60, cast=int),
+    },
+    'drain-webhook-inbox': {
+        'task': 'apps.digital.tasks.drain_webhook_inbox',
+        'schedule': env('WEBHOOK_INBOX_DRAIN_SECONDS', default=30, cast=int),
+    },
+    'deliver-customer-webhooks': {
+        'task': 'apps.digital.tasks.deliver_customer_webhooks',
+        'schedule': env('CUSTOMER_WEBHOOK_DELIVERY_SECONDS', default=15, cast=int),
+    },
+    'cleanup-idempotency-keys': {
+        'task': 'apps.digital.tasks.cleanup_idempotency_keys',
+        'schedule': env('IDEMPOTENCY_KEY_CLEANUP_SECONDS', default=60 * 60, cast=int),
+    },
+}
+
+# Purchase pipeline
+# When enabled, purchase endpoints only validate, price and persist the
+# transaction, respond 202 and leave provider processing to Celery.
+DIGITAL_ASYNC_PURCHASES = env('DIGITAL_ASYNC_PURCHASES', default=False, cast=bool)
+DIGITAL_PRIORITY_QUEUES = {
+    'critical': 'purchases.critical',
+    'high': 'purchases.high',
+    'normal': 'purchases.normal',
+    'low': 'purchases.low',
+}
 
 # DRF Spectacular (OpenAPI)
 SPECTACULAR_SETTINGS = {
@@ -153,4 +205,106 @@ SPECTACULAR_SETTINGS = {
 }
 
 # CORS Settings
-CORS_ALLOWED_ORIGINS = env('CORS_ALLOWED_ORIGINS', default='http://localhost:3000,http://127.0.0.1:3000').split(',')
\ No newline at end of file
+CORS_ALLOWED_ORIGINS = env('CORS_ALLOWED_ORIGINS', default='http://localhost:3000,http://127.0.0.1:3000').split(',')
+
+# Idempotency keys for purchase and order endpoints
+IDEMPOTENCY_CACHE_TIMEOUT = env('IDEMPOTENCY_CACHE_TIMEOUT', default=60 * 60, cast=int)  # Seconds
+IDEMPOTENCY_LOCK_TIMEOUT = env('IDEMPOTENCY_LOCK_TIMEOUT', default=120, cast=int)  # Seconds before an unfinished request can be retried
+IDEMPOTENCY_KEY_RETENTION_DAYS = env('IDEMPOTENCY_KEY_RETENTION_DAYS', default=7, cast=int)
+
+# Bulk orders
+BULK_ORDER_CHUNK_SIZE = env('BULK_ORDER_CHUNK_SIZE', default=500, cast=int)  # Transactions per insert/update batch
+BULK_ORDER_CONCURRENCY = env('BULK_ORDER_CONCURRENCY', default=20, cast=int)  # Concurrent provider calls per bulk order
+
+# Provider HTTP transport
+PROVIDER_HTTP_CONNECT_TIMEOUT = env('PROVIDER_HTTP_CONNECT_TIMEOUT', default=3.05, cast=float)  # Seconds
+PROVIDER_HTTP_READ_TIMEOUT = env('PROVIDER_HTTP_READ_TIMEOUT', default=30, cast=float)  # Seconds
+PROVIDER_HTTP_POOL_SIZE = env('PROVIDER_HTTP_POOL_SIZE', default=50, cast=int)  # Keep-alive connections per provider
+
+# Provider circuit breaker and failover
+PROVIDER_BREAKER_WINDOW_SECONDS = env('PROVIDER_BREAKER_WINDOW_SECONDS', default=60, cast=int)  # Rolling window of call outcomes
+PROVIDER_BREAKER_MIN_CALLS = env('PROVIDER_BREAKER_MIN_CALLS', default=20, cast=int)  # Calls in the window before the circuit can open
+PROVIDER_BREAKER_ERROR_RATE = env('PROVIDER_BREAKER_ERROR_RATE', default=0.5, cast=float)
+PROVIDER_BREAKER_SLOW_CALL_SECONDS = env('PROVIDER_BREAKER_SLOW_CALL_SECONDS', default=10, cast=float)
+PROVIDER_BREAKER_SLOW_CALL_RATE = env('PROVIDER_BREAKER_SLOW_CALL_RATE', default=0.8, cast=float)
+PROVIDER_BREAKER_OPEN_SECONDS = env('PROVIDER_BREAKER_OPEN_SECONDS', default=30, cast=int)  # Seconds before a probe call is allowed
+# Alternate aggregators able to fulfil a provider's products, e.g. {'mtn': ['hubtel']}
+PROVIDER_FAILOVER = {}
+PROVIDER_FAILOVER_MIN_HEALTH = env('PROVIDER_FAILOVER_MIN_HEALTH', default=0.5, cast=float)
+
+# Provider adaptive timeouts and hedging
+PROVIDER_LATENCY_SAMPLE_SIZE = env('PROVIDER_LATENCY_SAMPLE_SIZE', default=500, cast=int)  # Latest successful calls kept per operation
+PROVIDER_LATENCY_MIN_SAMPLES = env('PROVIDER_LATENCY_MIN_SAMPLES', default=50, cast=int)  # Samples needed before percentiles are used
+# Adaptive timeouts only apply to reads; purchases keep PROVIDER_HTTP_READ_TIMEOUT
+PROVIDER_ADAPTIVE_TIMEOUTS = env('PROVIDER_ADAPTIVE_TIMEOUTS', default=True, cast=bool)
+PROVIDER_ADAPTIVE_TIMEOUT_MULTIPLIER = env('PROVIDER_ADAPTIVE_TIMEOUT_MULTIPLIER', default=3.0, cast=float)  # Read timeout as a multiple of p99
+PROVIDER_ADAPTIVE_TIMEOUT_MIN = env('PROVIDER_ADAPTIVE_TIMEOUT_MIN', default=2.0, cast=float)  # Seconds
+# Hedging only applies to idempotent calls (verify_transaction, get_balance)
+PROVIDER_HEDGING = env('PROVIDER_HEDGING', default=False, cast=bool)
+PROVIDER_HEDGE_PERCENTILE = env('PROVIDER_HEDGE_PERCENTILE', default=95, cast=float)  # Latency percentile before the second request
+PROVIDER_HEDGE_MAX_WORKERS = env('PROVIDER_HEDGE_MAX_WORKERS', default=32, cast=int)
+
+# Metrics
+METRICS_AUTH_TOKEN = env('METRICS_AUTH_TOKEN', default='')  # Bearer token required by /metrics/
+METRICS_PUBLIC = env('METRICS_PUBLIC', default=False, cast=bool)  # Serve /metrics/ without a token outside DEBUG
+METRICS_SHARED = env('METRICS_SHARED', default=True, cast=bool)  # Aggregate web and Celery processes through Redis
+METRICS_FLUSH_SECONDS = env('METRICS_FLUSH_SECONDS', default=10, cast=float)  # How often each process pushes its values
+METRICS_REDIS_TIMEOUT = env('METRICS_REDIS_TIMEOUT', default=1.0, cast=float)  # Seconds
+
+# Provider float
+PROVIDER_FLOAT_CACHE_TIMEOUT = env('PROVIDER_FLOAT_CACHE_TIMEOUT', default=5 * 60, cast=int)  # Seconds; gating stops if polling stops
+PROVIDER_FLOAT_MINIMUM = env('PROVIDER_FLOAT_MINIMUM', default=0, cast=Decimal)  # Float kept back from purchases
+
+# Provider simulator (load testing and CI only)
+PROVIDER_SIMULATOR_ENABLED = env('PROVIDER_SIMULATOR_ENABLED', default=False, cast=bool)  # Replaces real providers when set
+PROVIDER_SIMULATOR_NETWORKS = env('PROVIDER_SIMULATOR_NETWORKS', default='mtn,vodafone,airteltigo').split(',')
+PROVIDER_SIMULATOR_LATENCY_MS = env('PROVIDER_SIMULATOR_LATENCY_MS', default=200, cast=float)  # Median call latency
+PROVIDER_SIMULATOR_LATENCY_SIGMA = env('PROVIDER_SIMULATOR_LATENCY_SIGMA', default=0.5, cast=float)  # Log-normal spread
+PROVIDER_SIMULATOR_FAILURE_RATE = env('PROVIDER_SIMULATOR_FAILURE_RATE', default=0.02, cast=float)
+PROVIDER_SIMULATOR_TIMEOUT_RATE = env('PROVIDER_SIMULATOR_TIMEOUT_RATE', default=0.005, cast=float)
+PROVIDER_SIMULATOR_BALANCE = env('PROVIDER_SIMULATOR_BALANCE', default=1000000, cast=Decimal)
+# Webhook target, formatted with the provider name; empty disables callbacks
+PROVIDER_SIMULATOR_WEBHOOK_URL = env('PROVIDER_SIMULATOR_WEBHOOK_URL', default='http://localhost:8000/api/digital/webhooks/{provider}/')
+PROVIDER_SIMULATOR_WEBHOOK_DELAY_MS = env('PROVIDER_SIMULATOR_WEBHOOK_DELAY_MS', default=500, cast=float)
+
+# Phone numbers
+PHONE_PORTED_NUMBERS_REFRESH_SECONDS = env('PHONE_PORTED_NUMBERS_REFRESH_SECONDS', default=5 * 60, cast=int)  # Reload of the ported number table
+
+# Provider rate limits
+# Requests per second by provider and operation, '*' for unlisted operations,
+# e.g. {'mtn': {'purchase': 20, '*': 50}}; shared by all workers through Redis
+PROVIDER_RATE_LIMITS = {}
+PROVIDER_RATE_LIMIT_BURST_SECONDS = env('PROVIDER_RATE_LIMIT_BURST_SECONDS', default=1.0, cast=float)  # Bucket size in seconds of quota
+PROVIDER_RATE_LIMIT_MAX_WAIT = env('PROVIDER_RATE_LIMIT_MAX_WAIT', default=30.0, cast=float)  # Seconds a call may wait for quota
+PROVIDER_RATE_LIMIT_REDIS_TIMEOUT = env('PROVIDER_RATE_LIMIT_REDIS_TIMEOUT', default=0.5, cast=float)
+
+# Stuck transaction recovery
+STUCK_TRANSACTION_AGE_SECONDS = env('STUCK_TRANSACTION_AGE_SECONDS', default=5 * 60, cast=int)  # 'processing' for longer than this is stuck
+STUCK_TRANSACTION_BATCH_SIZE = env('STUCK_TRANSACTION_BATCH_SIZE', default=500, cast=int)  # Transactions verified and settled together
+STUCK_TRANSACTION_VERIFY_CONCURRENCY = env('STUCK_TRANSACTION_VERIFY_CONCURRENCY', default=20, cast=int)
+STUCK_TRANSACTION_MAX_PER_SWEEP = env('STUCK_TRANSACTION_MAX_PER_SWEEP', default=20000, cast=int)
+STUCK_TRANSACTION_SWEEP_LOCK_SECONDS = env('STUCK_TRANSACTION_SWEEP_LOCK_SECONDS', default=30 * 60, cast=int)  # Lock expiry if a sweep dies
+
+# Settlement reconciliation
+SETTLEMENT_BATCH_SIZE = env('SETTLEMENT_BATCH_SIZE', default=2000, cast=int)  # Settlement lines matched per IN lookup
+
+# Webhook inbox
+WEBHOOK_INBOX_BATCH_SIZE = env('WEBHOOK_INBOX_BATCH_SIZE', default=500, cast=int)  # Webhooks applied per bulk update
+WEBHOOK_INBOX_MAX_ATTEMPTS = env('WEBHOOK_INBOX_MAX_ATTEMPTS', default=5, cast=int)  # Drains a webhook waits for its transaction
+WEBHOOK_INBOX_DRAIN_DELAY = env('WEBHOOK_INBOX_DRAIN_DELAY', default=1, cast=int)  # Seconds webhooks are collected before a drain
+
+# Customer webhooks
+CUSTOMER_WEBHOOK_BATCH_SIZE = env('CUSTOMER_WEBHOOK_BATCH_SIZE', default=500, cast=int)  # Deliveries sent per batch
+CUSTOMER_WEBHOOK_POOL_SIZE = env('CUSTOMER_WEBHOOK_POOL_SIZE', default=100, cast=int)  # Connections shared by a batch
+CUSTOMER_WEBHOOK_TIMEOUT = env('CUSTOMER_WEBHOOK_TIMEOUT', default=10.0, cast=float)  # Seconds per delivery attempt
+CUSTOMER_WEBHOOK_MAX_ATTEMPTS = env('CUSTOMER_WEBHOOK_MAX_ATTEMPTS', default=10, cast=int)
+CUSTOMER_WEBHOOK_RETRY_BASE_SECONDS = env('CUSTOMER_WEBHOOK_RETRY_BASE_SECONDS', default=30, cast=int)  # Doubled after each failure
+CUSTOMER_WEBHOOK_RETRY_MAX_SECONDS = env('CUSTOMER_WEBHOOK_RETRY_MAX_SECONDS', default=6 * 60 * 60, cast=int)
+CUSTOMER_WEBHOOK_LEASE_SECONDS = env('CUSTOMER_WEBHOOK_LEASE_SECONDS', default=5 * 60, cast=int)  # Claim expiry if a worker dies
+CUSTOMER_WEBHOOK_DISPATCH_DELAY = env('CUSTOMER_WEBHOOK_DISPATCH_DELAY', default=1, cast=int)  # Seconds events are collected before a delivery
+CUSTOMER_WEBHOOK_SUBSCRIPTION_CACHE_SECONDS = env('CUSTOMER_WEBHOOK_SUBSCRIPTION_CACHE_SECONDS', default=5 * 60, cast=int)
+
+# Price book
+PRICE_BOOK_CACHE_SECONDS = env('PRICE_BOOK_CACHE_SECONDS', default=24 * 60 * 60, cast=int)  # Redis entries; changes delete them
+PRICE_BOOK_LOCAL_SIZE = env('PRICE_BOOK_LOCAL_SIZE', default=10000, cast=int)  # (user, product) prices held per process
+PRICE_BOOK_LOCAL_SECONDS = env('PRICE_BOOK_LOCAL_SECONDS', default=30, cast=int)  # Delay before other processes see a price change
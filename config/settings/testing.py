@@ -12,4 +12,14 @@ DATABASES = {
 
 # Use in-memory broker for testing
 CELERY_TASK_ALWAYS_EAGER = True
-CELERY_TASK_EAGER_PROPAGATES = True
\ No newline at end of file
+CELERY_TASK_EAGER_PROPAGATES = True
+
+# Use local memory cache for testing
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Keep metrics in process; there is no Redis to aggregate them in
+METRICS_SHARED = False
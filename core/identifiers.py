@@ -0,0 +1,87 @@
+import os
+import threading
+import time
+import uuid
+
+
+# Crockford's base32 alphabet used by ULIDs
+ULID_ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+
+_lock = threading.Lock()
+_last_timestamp = 0
+_last_random = 0
+
+
+def _next_components():
+    """
+    Return a (milliseconds, 80-bit random) pair that is strictly increasing
+    within this process.
+
+    When two identifiers are generated in the same millisecond the random
+    part of the previous one is incremented instead of drawn again, so
+    identifiers from one process always sort in creation order.
+    """
+    global _last_timestamp, _last_random
+
+    with _lock:
+        timestamp = time.time_ns() // 1_000_000
+
+        if timestamp <= _last_timestamp:
+            timestamp = _last_timestamp
+            randomness = _last_random + 1
+            if randomness >= 1 << 80:
+                # Random part exhausted for this millisecond, borrow the next one
+                timestamp += 1
+                randomness = int.from_bytes(os.urandom(10), 'big')
+        else:
+            randomness = int.from_bytes(os.urandom(10), 'big')
+
+        _last_timestamp = timestamp
+        _last_random = randomness
+
+        return timestamp, randomness
+
+
+def ulid() -> str:
+    """
+    Generate a ULID: a 26 character, time-sortable identifier.
+
+    The first 10 characters encode the millisecond timestamp and the last 16
+    carry 80 bits of randomness, so new values land at the tail of a B-tree
+    index instead of at random positions.
+
+    Returns:
+        ULID string in Crockford base32
+    """
+    timestamp, randomness = _next_components()
+    value = (timestamp << 80) | randomness
+
+    chars = []
+    for _ in range(26):
+        chars.append(ULID_ALPHABET[value & 0x1F])
+        value >>= 5
+
+    return ''.join(reversed(chars))
+
+
+def uuid7() -> uuid.UUID:
+    """
+    Generate a version 7 UUID (RFC 9562): a 48-bit millisecond timestamp
+    followed by random bits, usable as a time-ordered UUIDField default.
+
+    Returns:
+        UUID object
+    """
+    timestamp, randomness = _next_components()
+
+    # rand_a and rand_b take the low 74 bits of the monotonic random part
+    rand_a = (randomness >> 62) & 0xFFF
+    rand_b = randomness & ((1 << 62) - 1)
+
+    value = (timestamp & ((1 << 48) - 1)) << 80
+    value |= 0x7 << 76
+    value |= rand_a << 64
+    value |= 0b10 << 62
+    value |= rand_b
+
+    return uuid.UUID(int=value)
@@ -0,0 +1,424 @@
+import atexit
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, from fast cache hits to slow provider calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry: List['Metric'] = []
+_registry_lock = threading.Lock()
+
+# Flat sample values: (label values, part) -> value. The part tells the
+# samples of one label set apart, e.g. the buckets, sum and count of a histogram.
+FlatValues = Dict[Tuple[Tuple[str, ...], str], float]
+
+_shared_store: Optional['SharedStore'] = None
+
+
+class Metric:
+    """
+    Base class for in-process metrics rendered in the Prometheus text format.
+    
+    Values live in a dict keyed by label values and are guarded by one lock per
+    metric, so recording costs a dict lookup and an addition. Each process
+    (web worker, Celery worker) records its own values; when a SharedStore is
+    configured they are aggregated across processes before rendering.
+    """
+    
+    type_name = None
+    
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        
+        with _registry_lock:
+            _registry.append(self)
+
+    def _key(self, labels: Dict[str, object]) -> Tuple[str, ...]:
+        """
+        Get the label values of a sample in labelnames order.
+        """
+        # Every recording goes through here, so this is where a process
+        # starts pushing its values to the shared store
+        if _shared_store is not None:
+            _shared_store.ensure_flusher()
+        
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def _format_labels(self, key: Tuple[str, ...], extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+        """
+        Render label pairs as {name="value",...}.
+        """
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        
+        if not pairs:
+            return ''
+        
+        return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+    def export(self) -> FlatValues:
+        """
+        Get this process's values as flat samples.
+        """
+        with self._lock:
+            values = list(self._values.items())
+        return {(key, ''): value for key, value in values}
+
+    def samples(self, values: Optional[FlatValues] = None) -> List[str]:
+        """
+        Render the metric's sample lines.
+        
+        Args:
+            values: Flat samples to render, defaults to this process's values
+        """
+        if values is None:
+            values = self.export()
+        return [f'{self.name}{self._format_labels(key)} {value}' for (key, _), value in values.items()]
+
+    def render(self, values: Optional[FlatValues] = None) -> str:
+        """
+        Render the metric with its HELP and TYPE lines.
+        """
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.type_name}',
+        ]
+        lines.extend(self.samples(values))
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    """
+    Monotonically increasing count.
+    """
+    
+    type_name = 'counter'
+    
+    def inc(self, amount: float = 1, **labels):
+        """
+        Increase the counter of a label set.
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """
+    Value that can go up and down, such as calls in flight.
+    """
+    
+    type_name = 'gauge'
+    
+    def inc(self, amount: float = 1, **labels):
+        """
+        Increase the gauge of a label set.
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        """
+        Decrease the gauge of a label set.
+        """
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        """
+        Set the gauge of a label set.
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    @contextmanager
+    def track_inprogress(self, **labels):
+        """
+        Count the enclosed block as in progress while it runs.
+        """
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(Metric):
+    """
+    Distribution of observed values over fixed buckets.
+    """
+    
+    type_name = 'histogram'
+    
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        """
+        Record one observation for a label set.
+        """
+        key = self._key(labels)
+        
+        with self._lock:
+            state = self._values.get(key)
+            
+            if state is None:
+                # Per-bucket counts, then sum and count
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][index] += 1
+                    break
+            
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        Observe the duration of the enclosed block in seconds.
+        """
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - started, **labels)
+
+    def export(self) -> FlatValues:
+        """
+        Get this process's values as flat samples: the non-cumulative count
+        of each bucket (part is the bucket's upper bound), then sum and count.
+        """
+        with self._lock:
+            values = [(key, list(state[0]), state[1], state[2]) for key, state in self._values.items()]
+        
+        flat = {}
+        for key, bucket_counts, total, count in values:
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                flat[(key, repr(float(bound)))] = bucket_count
+            flat[(key, 'sum')] = total
+            flat[(key, 'count')] = count
+        
+        return flat
+
+    def samples(self, values: Optional[FlatValues] = None) -> List[str]:
+        if values is None:
+            values = self.export()
+        
+        by_key = defaultdict(dict)
+        for (key, part), value in values.items():
+            by_key[key][part] = value
+        
+        lines = []
+        for key, parts in by_key.items():
+            cumulative = 0
+            for bound in self.buckets:
+                cumulative += parts.get(repr(float(bound)), 0)
+                labels = self._format_labels(key, (('le', repr(float(bound))),))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            
+            count = parts.get('count', 0)
+            labels = self._format_labels(key, (('le', '+Inf'),))
+            lines.append(f'{self.name}_bucket{labels} {count}')
+            lines.append(f'{self.name}_sum{self._format_labels(key)} {parts.get("sum", 0)}')
+            lines.append(f'{self.name}_count{self._format_labels(key)} {count}')
+        
+        return lines
+
+
+class SharedStore:
+    """
+    Aggregates the metrics of every process through Redis.
+    
+    A background thread in each recording process pushes what its counters
+    and histograms gained since the last flush into one shared hash with
+    HINCRBYFLOAT, so the totals cover web and Celery processes alike, survive
+    restarts and never go backwards. Gauges describe a live process, so each
+    process replaces its own gauge hash, which expires once the process stops
+    flushing. A scrape flushes its own process and then reads the totals.
+    """
+    
+    TOTALS_KEY = 'metrics:totals'
+    PROCESSES_KEY = 'metrics:processes'
+    GAUGES_KEY = 'metrics:gauges:{}'
+    
+    def __init__(self, client, flush_seconds: float):
+        self.client = client
+        self.flush_seconds = flush_seconds
+        # Processes that have not flushed for this long are dropped
+        self.ttl = int(flush_seconds * 3) + 1
+        self._flushed: Dict[str, float] = {}
+        self._flush_lock = threading.Lock()
+        self._flusher_pid = None
+        self._flusher_lock = threading.Lock()
+
+    def ensure_flusher(self):
+        """
+        Start the flush thread of the current process, once per process.
+        
+        Threads do not survive fork, so the process ID is checked rather than
+        a flag; prefork Celery children and gunicorn workers each start their own.
+        """
+        if self._flusher_pid == os.getpid():
+            return
+        
+        with self._flusher_lock:
+            if self._flusher_pid == os.getpid():
+                return
+            
+            if self._flusher_pid is None:
+                atexit.register(self._flush_quietly)
+            
+            self._flusher_pid = os.getpid()
+            threading.Thread(target=self._run, name='metrics-flush', daemon=True).start()
+
+    def flush(self):
+        """
+        Push this process's counter and histogram increments and its gauges.
+        """
+        process_id = f'{socket.gethostname()}:{os.getpid()}'
+        
+        with self._flush_lock:
+            increments = {}
+            gauges = {}
+            
+            with _registry_lock:
+                metrics = list(_registry)
+            
+            for metric in metrics:
+                for (key, part), value in metric.export().items():
+                    field = json.dumps([metric.name, list(key), part])
+                    
+                    if metric.type_name == 'gauge':
+                        gauges[field] = value
+                        continue
+                    
+                    increment = value - self._flushed.get(field, 0)
+                    if increment:
+                        increments[field] = (increment, value)
+            
+            pipe = self.client.pipeline(transaction=False)
+            for field, (increment, _) in increments.items():
+                pipe.hincrbyfloat(self.TOTALS_KEY, field, increment)
+            
+            gauges_key = self.GAUGES_KEY.format(process_id)
+            pipe.delete(gauges_key)
+            if gauges:
+                pipe.hset(gauges_key, mapping=gauges)
+                pipe.expire(gauges_key, self.ttl)
+            
+            pipe.zadd(self.PROCESSES_KEY, {process_id: time.time()})
+            pipe.execute()
+            
+            for field, (_, value) in increments.items():
+                self._flushed[field] = value
+
+    def collect(self) -> Dict[str, FlatValues]:
+        """
+        Read the aggregated values of every process.
+        
+        Returns:
+            Metric name -> flat samples
+        """
+        pipe = self.client.pipeline(transaction=False)
+        pipe.zremrangebyscore(self.PROCESSES_KEY, '-inf', time.time() - self.ttl)
+        pipe.zrange(self.PROCESSES_KEY, 0, -1)
+        pipe.hgetall(self.TOTALS_KEY)
+        _, processes, totals = pipe.execute()
+        
+        pipe = self.client.pipeline(transaction=False)
+        for process_id in processes:
+            pipe.hgetall(self.GAUGES_KEY.format(process_id.decode()))
+        hashes = [totals] + pipe.execute()
+        
+        values = defaultdict(lambda: defaultdict(float))
+        for fields in hashes:
+            for field, value in fields.items():
+                name, key, part = json.loads(field)
+                values[name][(tuple(key), part)] += float(value)
+        
+        return values
+
+    def _run(self):
+        failing = False
+        
+        while True:
+            time.sleep(self.flush_seconds)
+            
+            try:
+                self.flush()
+                failing = False
+            except Exception as e:
+                # Values keep accumulating locally and go out with the next flush
+                if not failing:
+                    logger.warning(f"Could not flush metrics: {str(e)}")
+                failing = True
+
+    def _flush_quietly(self):
+        try:
+            self.flush()
+        except Exception:
+            pass
+
+
+def configure_shared_store(client, flush_seconds: float):
+    """
+    Aggregate metrics across processes through Redis.
+    
+    Args:
+        client: redis.Redis client
+        flush_seconds: How often each process pushes its values
+    """
+    global _shared_store
+    _shared_store = SharedStore(client, flush_seconds)
+
+
+def _escape(value: str) -> str:
+    """
+    Escape a label value for the Prometheus text format.
+    """
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def render_metrics() -> str:
+    """
+    Render every registered metric in the Prometheus text exposition format.
+    
+    With a shared store the values of every process are rendered; if Redis
+    cannot be reached, only this process's values are.
+    
+    Returns:
+        Exposition text ending with a newline
+    """
+    with _registry_lock:
+        metrics = list(_registry)
+    
+    shared = None
+    if _shared_store is not None:
+        try:
+            _shared_store.flush()
+            shared = _shared_store.collect()
+        except Exception as e:
+            logger.warning(f"Could not read shared metrics, rendering this process only: {str(e)}")
+    
+    if shared is None:
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+    
+    return '\n'.join(metric.render(shared.get(metric.name, {})) for metric in metrics) + '\n'